@@ -1 +1,3 @@
 """Hiccup crashreport_stats application."""
+
+default_app_config = "crashreport_stats.apps.CrashreportStatsConfig"
@@ -0,0 +1,21 @@
+"""Configuration of the Hiccup crashreport_stats application."""
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class CrashreportStatsConfig(AppConfig):
+    """Configuration of the Hiccup crashreport_stats application."""
+
+    name = "crashreport_stats"
+
+    def ready(self):
+        """Start accumulating stats in real time if enabled."""
+        if settings.HICCUP_STATS_REALTIME:
+            # pylint: disable=import-outside-toplevel
+            from crashreport_stats.realtime import accumulate_created_reports
+            from crashreports.models import reports_created
+
+            reports_created.connect(
+                accumulate_created_reports,
+                dispatch_uid="crashreport_stats_realtime",
+            )
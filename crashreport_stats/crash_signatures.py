@@ -0,0 +1,251 @@
+"""Extraction and daily counts of the crash signatures of crash reports.
+
+The signature of a crash report is extracted from its first log file by the
+`crash_signatures` management command, see `crashreports.crash_signatures`.
+Log files are parsed in a pool of worker processes, once per distinct log
+file content. Assigning the signatures and adding them to the daily counts
+per version (`CrashSignatureDaily`) is done by the parent process, in the
+same transaction, so that each crash report is counted exactly once.
+
+Only crash reports of versions that have been counted by the stats are
+handled. The other ones are left for a later update, after the stats command
+has created their version.
+
+The top crash signatures of a version are then found with a single query
+using the index of the daily counts, without looking at the crash reports.
+
+Counting is serialised with resetting the stats with the lock on the stats
+metadata, see `crashreport_stats.realtime`. Resetting the stats deletes the
+versions and thus the daily counts, which are recounted by `recount()`.
+Crash reports of versions that have not been counted again lose their
+signature so that they are handled by a later update.
+"""
+import functools
+import itertools
+import logging
+import zipfile
+from collections import Counter, OrderedDict
+from multiprocessing import Pool
+
+from django.db import connections, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+
+from crashreport_stats.models import CrashSignatureDaily, Version
+from crashreport_stats.realtime import lock_stats_metadata
+from crashreports import crash_signatures
+from crashreports.models import Crashreport, CrashSignature, LogFile
+
+LOGGER = logging.getLogger(__name__)
+
+
+def add_to_counts(signature, build_fingerprint, report_day, count):
+    """Add a number of crash reports to the daily count of a signature.
+
+    Args:
+        signature: The crash signature of the crash reports.
+        build_fingerprint: The version the crash reports have been sent from.
+            The version must have been counted by the stats already.
+        report_day: The day the crash reports have been sent on.
+        count: The number of crash reports.
+
+    """
+    version = Version.objects.get(build_fingerprint=build_fingerprint)
+    daily_count, _ = CrashSignatureDaily.objects.get_or_create(
+        signature=signature, version=version, date=report_day
+    )
+    daily_count.count = F("count") + count
+    daily_count.save()
+
+
+def assign_signature(crashreport_ids, kind, signature):
+    """Assign a crash signature to crash reports and count them.
+
+    Crash reports that have a signature already or whose version has not been
+    counted by the stats are left untouched.
+
+    Args:
+        crashreport_ids: The IDs of the crash reports.
+        kind: The kind of the crash signature.
+        signature: The normalised crash signature.
+
+    Returns: The number of crash reports the signature has been assigned to.
+
+    """
+    crash_signature, _ = CrashSignature.objects.get_or_create(
+        kind=kind, signature=signature
+    )
+    with transaction.atomic():
+        lock_stats_metadata()
+        crashreports = list(
+            Crashreport.objects.select_for_update()
+            .filter(
+                id__in=crashreport_ids,
+                signature__isnull=True,
+                build_fingerprint__in=_counted_versions(),
+            )
+            .annotate(_report_day=TruncDate("date"))
+            .values_list("id", "build_fingerprint", "_report_day")
+        )
+        Crashreport.objects.filter(
+            id__in=[crashreport_id for crashreport_id, _, _ in crashreports]
+        ).update(signature=crash_signature)
+        counts = Counter(
+            (build_fingerprint, report_day)
+            for _, build_fingerprint, report_day in crashreports
+        )
+        for (build_fingerprint, report_day), count in counts.items():
+            add_to_counts(crash_signature, build_fingerprint, report_day, count)
+    return len(crashreports)
+
+
+def _counted_versions():
+    """Get the build fingerprints of the versions counted by the stats."""
+    return Version.objects.values("build_fingerprint")
+
+
+def recount():
+    """Recompute the daily counts of all crash signatures.
+
+    Crash reports of versions that have not been counted by the stats lose
+    their signature, so that they are counted by a later update.
+
+    Returns: The number of daily counts.
+
+    """
+    with transaction.atomic():
+        lock_stats_metadata(exclusive=True)
+        CrashSignatureDaily.objects.all().delete()
+        Crashreport.objects.filter(signature__isnull=False).exclude(
+            build_fingerprint__in=_counted_versions()
+        ).update(signature=None)
+        counts = (
+            Crashreport.objects.filter(signature__isnull=False)
+            .annotate(_report_day=TruncDate("date"))
+            .values("signature_id", "build_fingerprint", "_report_day")
+            .annotate(count=Count("id"))
+        )
+        daily_counts = 0
+        for count in counts.iterator():
+            add_to_counts(
+                CrashSignature(id=count["signature_id"]),
+                count["build_fingerprint"],
+                count["_report_day"],
+                count["count"],
+            )
+            daily_counts += 1
+    return daily_counts
+
+
+def _iter_unparsed_logfiles():
+    """Iterate over the first log file of each crash report to parse.
+
+    Only crash reports of versions counted by the stats are parsed.
+
+    Yields: Tuples of the crash report ID, the stored file name and the
+        checksum of the log file.
+
+    """
+    previous_crashreport_id = None
+    for crashreport_id, name, sha256 in (
+        LogFile.objects.filter(
+            crashreport__signature__isnull=True,
+            crashreport__build_fingerprint__in=_counted_versions(),
+        )
+        .order_by("crashreport_id", "crashreport_local_id")
+        .values_list("crashreport_id", "logfile", "sha256")
+        .iterator()
+    ):
+        if crashreport_id != previous_crashreport_id:
+            previous_crashreport_id = crashreport_id
+            yield crashreport_id, name, sha256
+
+
+def _group_by_content(logfiles):
+    """Group the crash reports of log files by the content of the files.
+
+    Log files without checksum are grouped by their stored file name.
+
+    Returns: An ordered dictionary mapping the stored file names to the IDs
+        of the crash reports.
+
+    """
+    crashreport_ids_by_name = OrderedDict()
+    name_by_sha256 = {}
+    for crashreport_id, name, sha256 in logfiles:
+        name = name_by_sha256.setdefault(sha256, name) if sha256 else name
+        crashreport_ids_by_name.setdefault(name, []).append(crashreport_id)
+    return crashreport_ids_by_name
+
+
+def _parse_logfile(item):
+    """Parse a stored log file, run in the worker processes.
+
+    Args:
+        item: A tuple of the stored file name and the path of the file.
+
+    Returns: A tuple of the file name and the kind and the signature of the
+        crash, or None if the file could not be read.
+
+    """
+    name, path = item
+    try:
+        return name, crash_signatures.parse_logfile(path)
+    except (OSError, zipfile.BadZipFile, NotImplementedError) as error:
+        LOGGER.warning("Could not parse log file %s: %s", name, error)
+        return name, None
+
+
+def _assign_signatures(map_function, batch_size):
+    """Parse the unparsed log files and assign their signatures.
+
+    Args:
+        map_function: The function mapping `_parse_logfile` over the log
+            files to parse, either `map` or that of a process pool.
+        batch_size: The number of crash reports handled at once.
+
+    Returns: The number of crash reports a signature has been assigned to.
+
+    """
+    # pylint: disable=protected-access
+    storage = LogFile._meta.get_field("logfile").storage
+    logfiles = _iter_unparsed_logfiles()
+    assigned = 0
+    while True:
+        crashreport_ids_by_name = _group_by_content(
+            list(itertools.islice(logfiles, batch_size))
+        )
+        if not crashreport_ids_by_name:
+            break
+        items = [(name, storage.path(name)) for name in crashreport_ids_by_name]
+        for name, crash_signature in map_function(_parse_logfile, items):
+            if crash_signature is not None:
+                assigned += assign_signature(
+                    crashreport_ids_by_name[name], *crash_signature
+                )
+    return assigned
+
+
+def update(jobs=1, batch_size=1000):
+    """Extract the signatures of the crash reports that have none yet.
+
+    Crash reports whose log file cannot be read keep no signature and are
+    retried by the next update.
+
+    Args:
+        jobs: The number of worker processes parsing log files.
+        batch_size: The number of crash reports handled at once.
+
+    Returns: The number of crash reports a signature has been assigned to.
+
+    """
+    if jobs > 1:
+        # The worker processes must not share the database connections
+        # of this process, so they open their own ones.
+        connections.close_all()
+        with Pool(jobs) as pool:
+            return _assign_signatures(
+                functools.partial(pool.imap_unordered, chunksize=16),
+                batch_size,
+            )
+    return _assign_signatures(map, batch_size)
@@ -0,0 +1,223 @@
+"""Streaming access to log file archives and their members.
+
+The members of a log file archive are decompressed chunk by chunk while they
+are sent, so that the memory used for a request does not depend on the size
+of the archive or its members. Whole archives are sent by the front-end web
+server or the WSGI server without being read by the application, see
+`file_response`.
+"""
+import os
+import re
+import zipfile
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+
+CHUNK_SIZE = 64 * 2 ** 10
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class MemberNotFound(Exception):
+    """The log file archive or its member does not exist."""
+
+
+def get_members(path):
+    """Get the members of a log file archive.
+
+    Args:
+        path: The path of the zip file.
+
+    Returns: A list of dictionaries with the name, size and compressed size
+        of each member, in the order they are stored in the archive.
+
+    Raises:
+        MemberNotFound: If the file is missing or not a zip file.
+
+    """
+    try:
+        with zipfile.ZipFile(path) as zip_file:
+            return [
+                {
+                    "name": member.filename,
+                    "size": member.file_size,
+                    "compressed_size": member.compress_size,
+                }
+                for member in zip_file.infolist()
+                if not member.is_dir()
+            ]
+    except (OSError, zipfile.BadZipFile):
+        raise MemberNotFound()
+
+
+def get_member_size(path, name):
+    """Get the uncompressed size of a member of a log file archive.
+
+    Args:
+        path: The path of the zip file.
+        name: The name of the member.
+
+    Returns: The size of the member in bytes.
+
+    Raises:
+        MemberNotFound: If the file or the member does not exist.
+
+    """
+    try:
+        with zipfile.ZipFile(path) as zip_file:
+            return zip_file.getinfo(name).file_size
+    except (OSError, zipfile.BadZipFile, KeyError):
+        raise MemberNotFound()
+
+
+def parse_range(header, size):
+    """Parse the value of a Range header for a single byte range.
+
+    Args:
+        header: The value of the Range header.
+        size: The size of the requested content in bytes.
+
+    Returns: The first and last byte positions of the range, both inclusive,
+        or None if the header does not specify a single byte range. Multiple
+        ranges are not supported, so the whole content should be sent for
+        them.
+
+    Raises:
+        ValueError: If the range is not satisfiable.
+
+    """
+    match = _RANGE_PATTERN.match(header.strip())
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range of the last bytes
+        if int(last) == 0 or size == 0:
+            raise ValueError("Empty suffix range.")
+        return max(size - int(last), 0), size - 1
+    if int(first) >= size:
+        raise ValueError("Range starts after the end of the content.")
+    if last == "":
+        return int(first), size - 1
+    if int(last) < int(first):
+        return None
+    return int(first), min(int(last), size - 1)
+
+
+def iter_member(path, name, start=0, length=None):
+    """Iterate over the decompressed content of a member in chunks.
+
+    The archive is closed once the iteration is finished or the iterator is
+    closed.
+
+    Args:
+        path: The path of the zip file.
+        name: The name of the member.
+        start: The position of the first byte to return.
+        length: The number of bytes to return, or None for all bytes up to
+            the end of the member.
+
+    Yields: The chunks of the requested part of the member.
+
+    """
+    with zipfile.ZipFile(path) as zip_file, zip_file.open(name) as member:
+        # Compressed members can only be read sequentially
+        while start > 0:
+            skipped = len(member.read(min(start, CHUNK_SIZE)))
+            if not skipped:
+                return
+            start -= skipped
+        while length is None or length > 0:
+            chunk = member.read(
+                CHUNK_SIZE if length is None else min(length, CHUNK_SIZE)
+            )
+            if not chunk:
+                return
+            if length is not None:
+                length -= len(chunk)
+            yield chunk
+
+
+def preview_member(path, name, max_bytes):
+    """Get the beginning and the end of a member of a log file archive.
+
+    Only `max_bytes` bytes of the beginning and the end are kept in memory
+    while the member is read.
+
+    Args:
+        path: The path of the zip file.
+        name: The name of the member.
+        max_bytes: The maximum number of bytes of the head and of the tail.
+
+    Returns: A dictionary with the size of the member, its head and its tail
+        decoded as UTF-8, and whether content between head and tail has been
+        left out. The tail is empty if the head contains the whole member.
+
+    """
+    head = bytearray()
+    tail = bytearray()
+    size = 0
+    for chunk in iter_member(path, name):
+        size += len(chunk)
+        missing = max_bytes - len(head)
+        if missing > 0:
+            head += chunk[:missing]
+            chunk = chunk[missing:]
+        tail += chunk
+        del tail[:-max_bytes]
+    return {
+        "name": name,
+        "size": size,
+        "head": head.decode("utf-8", "replace"),
+        "tail": tail.decode("utf-8", "replace"),
+        "truncated": size > len(head) + len(tail),
+    }
+
+
+def file_response(path, root, filename, content_type):
+    """Create a response sending a stored file as attachment.
+
+    If `HICCUP_LOGFILE_SENDFILE_HEADER` is set, the response is empty and
+    tells the front-end web server to send the file instead. With
+    X-Accel-Redirect (nginx), the path of the file relative to `root` is
+    appended to `HICCUP_LOGFILE_SENDFILE_PREFIX`, the URL of an internal
+    location serving `root`. With X-Sendfile (Apache, lighttpd), the
+    absolute path of the file is sent.
+
+    Otherwise, the file is sent with a `FileResponse`, which WSGI servers
+    providing `wsgi.file_wrapper` send with `os.sendfile`.
+
+    Args:
+        path: The absolute path of the file.
+        root: The directory the front-end web server serves the file from.
+        filename: The file name to suggest to the client.
+        content_type: The content type of the file.
+
+    Returns: The response.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+
+    """
+    header = settings.HICCUP_LOGFILE_SENDFILE_HEADER
+    if header is not None:
+        size = os.stat(path).st_size
+        response = HttpResponse(content_type=content_type)
+        if header == "X-Accel-Redirect":
+            response[header] = quote(
+                settings.HICCUP_LOGFILE_SENDFILE_PREFIX
+                + os.path.relpath(path, root)
+            )
+        else:
+            response[header] = path
+    else:
+        stored_file = open(path, "rb")
+        size = os.fstat(stored_file.fileno()).st_size
+        response = FileResponse(stored_file, content_type=content_type)
+        response.block_size = CHUNK_SIZE
+    response["Content-Length"] = size
+    response["Content-Disposition"] = 'attachment; filename="{}"'.format(
+        filename
+    )
+    return response
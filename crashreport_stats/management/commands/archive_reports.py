@@ -0,0 +1,131 @@
+"""Archive old heartbeats and crash reports or restore archived ones.
+
+`archive` moves the reports of all complete months older than the retention
+period into compressed archives in the archive directory and deletes them
+from the database, see `crashreports.archive`. Only reports that have been
+counted in the stats are archived, so `stats update` has to run before.
+`restore --month YYYY-MM` imports the archived reports of a month again.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+
+from crashreport_stats.models import StatsMetadata
+from crashreports import archive
+
+
+def _get_counted_until():
+    """Get the latest creation time of reports counted in the stats.
+
+    If the stats are updated in real time, reports are counted once the
+    accumulated stats have been flushed, which happens within twice the
+    flush interval, see `crashreport_stats.realtime`.
+    """
+    if settings.HICCUP_STATS_REALTIME:
+        return timezone.now() - datetime.timedelta(
+            seconds=2 * settings.HICCUP_STATS_REALTIME_FLUSH_INTERVAL
+        )
+    return StatsMetadata.objects.aggregate(Max("updated_at"))[
+        "updated_at__max"
+    ]
+
+
+def _parse_month(value):
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise CommandError("Invalid month {}, use YYYY-MM.".format(value))
+
+
+def _format_counts(counts):
+    return ", ".join(
+        "{} {}s".format(count, type_name)
+        for type_name, count in sorted(counts.items())
+    ) or "nothing"
+
+
+class Command(BaseCommand):
+    """Management command to archive and restore reports."""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add custom arguments to the command."""
+        parser.add_argument("action", choices=["archive", "restore"])
+        parser.add_argument(
+            "--archive-dir",
+            default=settings.HICCUP_REPORTS_ARCHIVE_DIR,
+            help="Directory of the archives.",
+        )
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=settings.HICCUP_REPORTS_RETENTION_DAYS,
+            help="Archive the months that ended this many days ago.",
+        )
+        parser.add_argument(
+            "--month", help="Month to restore, formatted as YYYY-MM."
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Maximum number of rows read, deleted or inserted at once.",
+        )
+
+    def handle(self, *args, **options):
+        """Carry out the command executive logic."""
+        if not options["archive_dir"]:
+            raise CommandError(
+                "Set --archive-dir or HICCUP_REPORTS_ARCHIVE_DIR."
+            )
+        if options["action"] == "archive":
+            self._archive(options)
+        else:
+            if not options["month"]:
+                raise CommandError("--month is required to restore reports.")
+            self._restore(options)
+
+    def _success(self, msg):
+        # pylint: disable=no-member
+        # Members of Style are generated and cannot be statically inferred.
+        self.stdout.write(self.style.SUCCESS(msg))
+
+    def _archive(self, options):
+        counted_until = _get_counted_until()
+        if counted_until is None:
+            raise CommandError(
+                "The stats have never been computed, run stats update first."
+            )
+        older_than = datetime.date.today() - datetime.timedelta(
+            days=options["older_than_days"]
+        )
+        for month in archive.get_archivable_months(older_than):
+            path, deleted = archive.archive_month(
+                options["archive_dir"],
+                month,
+                counted_until,
+                options["chunk_size"],
+            )
+            if path and options["verbosity"]:
+                self._success(
+                    "{:%Y-%m}: archived to {}, deleted {}".format(
+                        month, path, _format_counts(deleted)
+                    )
+                )
+
+    def _restore(self, options):
+        month = _parse_month(options["month"])
+        try:
+            restored = archive.restore_month(
+                options["archive_dir"], month, options["chunk_size"]
+            )
+        except archive.ArchiveError as error:
+            raise CommandError(str(error))
+        if options["verbosity"]:
+            self._success(
+                "{:%Y-%m}: restored {}".format(month, _format_counts(restored))
+            )
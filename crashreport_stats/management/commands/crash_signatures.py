@@ -0,0 +1,44 @@
+"""Extract and count the crash signatures of crash reports.
+
+`update` extracts the signatures of the crash reports that have none yet
+from their log files, using a pool of worker processes, and adds them to the
+daily counts per version. Only versions counted by the `stats` command are
+handled. `recount` recomputes the daily counts from the
+signatures of all crash reports. See `crashreport_stats.crash_signatures`.
+"""
+import os
+
+from django.core.management.base import BaseCommand
+
+from crashreport_stats import crash_signatures
+
+
+class Command(BaseCommand):
+    """Management command to extract and count crash signatures."""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add custom arguments to the command."""
+        parser.add_argument("action", choices=["update", "recount"])
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of worker processes parsing log files.",
+        )
+
+    def handle(self, *args, **options):
+        """Carry out the command executive logic."""
+        if options["action"] == "update":
+            count = crash_signatures.update(jobs=options["jobs"])
+            msg = "{} crash reports assigned a crash signature"
+        else:
+            count = crash_signatures.recount()
+            msg = "{} daily crash signature counts recomputed"
+
+        if options["verbosity"]:
+            # pylint: disable=no-member
+            # Members of Style are generated and cannot be statically
+            # inferred.
+            self.stdout.write(self.style.SUCCESS(msg.format(count)))
@@ -2,27 +2,68 @@
 
 This module provides a command to compute statistics of
 heartbeats, crashes, and versions sent from Hiccup clients.
+
+The `watch` action keeps running and updates the stats every `--interval`
+seconds, until it is stopped with SIGINT or SIGTERM. An update in progress
+is finished before the command exits.
+
+The `reset` action rebuilds the stats in windows of the creation time of the
+reports, with one transaction per window and unit of work. The progress is
+saved as `StatsRebuildCheckpoint` in the same transactions, so that running
+the `reset` action again after it has been interrupted resumes the rebuild
+where it stopped. The stats are not updated while a rebuild is in progress.
 """
 import datetime
-from typing import Dict, List, Optional
-
-from django.core.management.base import BaseCommand
-from django.db import transaction
-from django.db.models import Count, F, Model, Q, QuerySet
+import itertools
+import logging
+import signal
+import threading
+from collections import Counter, OrderedDict
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import (
+    close_old_connections,
+    connection,
+    connections,
+    transaction,
+)
+from django.db.models import (
+    Aggregate,
+    Case,
+    Count,
+    DateField,
+    F,
+    IntegerField,
+    Min,
+    Model,
+    Q,
+    QuerySet,
+    Value,
+    When,
+)
 from django.db.models.functions import TruncDate
 import pytz
 
+from crashreport_stats import crash_signatures
 from crashreport_stats.models import (
     RadioVersion,
     RadioVersionDaily,
     StatsMetadata,
+    StatsRebuildCheckpoint,
+    StatsUnitMetadata,
     Version,
     VersionDaily,
     _VersionStats,
     _DailyVersionStats,
 )
+from crashreport_stats.realtime import lock_stats_metadata
 from crashreports.models import Crashreport, HeartBeat
 
+LOGGER = logging.getLogger(__name__)
+
 
 # pylint: disable=too-few-public-methods
 # Classes in this file inherit from each other and are not method containers.
@@ -54,6 +95,17 @@ class _ReportCounterFilter:
         self.name = name
         self.field_name = field_name
 
+    def condition(self) -> Q:
+        """Get the condition on the reports matching the requirements.
+
+        Returns:
+            The condition, empty if all reports of the model match.
+
+        """
+        # pylint: disable=no-self-use
+        # self is potentially used by subclasses.
+        return Q()
+
     def filter(self, query_objects: QuerySet) -> QuerySet:
         """Filter the reports.
 
@@ -63,9 +115,38 @@ class _ReportCounterFilter:
             The reports matching this report counter requirements.
 
         """
-        # pylint: disable=no-self-use
-        # self is potentially used by subclasses.
-        return query_objects
+        return query_objects.filter(self.condition())
+
+    def count(self) -> Aggregate:
+        """Get the aggregate counting the reports matching the requirements.
+
+        Reports not matching the requirements are not counted, so that all
+        the counters of a report model can be computed in a single query.
+
+        Returns:
+            The aggregate counting the matching reports.
+
+        """
+        condition = self.condition()
+        if not condition:
+            return Count("date")
+        return Count(
+            Case(When(condition, then=1), output_field=IntegerField())
+        )
+
+    def matches(self, report: Model) -> bool:
+        """Check whether a single report matches the requirements.
+
+        This is the equivalent of `filter` for report instances that have
+        not been queried from the database.
+
+        Args:
+            report: The report to check.
+        Returns:
+            True if the report matches this report counter requirements.
+
+        """
+        return isinstance(report, self.model)
 
 
 class HeartBeatCounterFilter(_ReportCounterFilter):
@@ -162,21 +243,141 @@ class CrashreportCounterFilter(_ReportCounterFilter):
             query = query | Q(boot_reason=reason)
         return query
 
-    def filter(self, query_objects: QuerySet) -> QuerySet:
-        """Filter the reports according to the inclusive and exclusive fitlers.
+    def condition(self) -> Q:
+        """Combine the inclusive and exclusive filters into one condition.
 
-        Args:
-            query_objects: The reports to filter.
         Returns:
-            The reports matching this report counter requirements.
+            The condition on the reports matching this report counter
+            requirements.
 
         """
+        condition = Q()
         if self.inclusive_filter:
-            query_objects = query_objects.filter(self.inclusive_filter)
+            condition &= self.inclusive_filter
         if self.exclusive_filter:
-            query_objects = query_objects.exclude(self.exclusive_filter)
+            condition &= ~self.exclusive_filter
 
-        return query_objects
+        return condition
+
+    def matches(self, report: Model) -> bool:
+        """Check whether a single report matches the boot reasons filters.
+
+        Args:
+            report: The report to check.
+        Returns:
+            True if the report matches this report counter requirements.
+
+        """
+        if not super(CrashreportCounterFilter, self).matches(report):
+            return False
+        if (
+            self.include_boot_reasons
+            and report.boot_reason not in self.include_boot_reasons
+        ):
+            return False
+        return not (
+            self.exclude_boot_reasons
+            and report.boot_reason in self.exclude_boot_reasons
+        )
+
+
+_COUNTER_FIELD_NAMES = ["heartbeats", "prob_crashes", "smpl", "other"]
+_UPSERT_BATCH_SIZE = 1000
+
+
+def _default_values(model: Model) -> Dict[str, object]:
+    """Get the default values of the fields of a model but the primary key."""
+    # pylint: disable=protected-access
+    meta = model._meta
+    return {
+        field.name: field.get_default()
+        for field in meta.concrete_fields
+        if field != meta.pk
+    }
+
+
+def _upsert(
+    model: Model,
+    rows: List[Dict[str, object]],
+    unique_field_names: List[str],
+    assignments: Dict[str, str],
+) -> List[Tuple[int, Tuple, bool]]:
+    """Insert stats entries or update the stored ones with one statement.
+
+    The entries are inserted with a single `INSERT ... ON CONFLICT DO UPDATE`
+    statement on a unique key, so that entries inserted concurrently are
+    updated instead of raising an `IntegrityError`.
+
+    Args:
+        model: The stats model.
+        rows: The values per field name of the entries, for all fields but
+            the primary key. The unique key values must differ between rows.
+        unique_field_names: The names of the fields of the unique key.
+        assignments: The SQL expressions assigned to the fields of stored
+            entries per field name. They are formatted with the quoted column
+            names per field name and can reference the stored entry as
+            `stats` and the entry to insert as `EXCLUDED`.
+    Returns:
+        Tuples of the primary key, the unique key values and whether the
+        entry has been inserted, per entry.
+
+    """
+    # pylint: disable=protected-access
+    meta = model._meta
+    quote_name = connection.ops.quote_name
+    fields = [field for field in meta.concrete_fields if field != meta.pk]
+    columns = {field.name: quote_name(field.column) for field in fields}
+
+    values = []
+    for row in rows:
+        values.extend(
+            field.get_db_prep_save(row[field.name], connection)
+            for field in fields
+        )
+    placeholders = "({})".format(", ".join(["%s"] * len(fields)))
+    unique_columns = ", ".join(columns[name] for name in unique_field_names)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO {table} AS stats ({columns}) VALUES {rows} "
+            "ON CONFLICT ({unique_columns}) DO UPDATE SET {assignments} "
+            # xmax is only 0 for inserted rows
+            "RETURNING {pk}, {unique_columns}, xmax = 0".format(
+                table=quote_name(meta.db_table),
+                columns=", ".join(columns[field.name] for field in fields),
+                rows=", ".join([placeholders] * len(rows)),
+                unique_columns=unique_columns,
+                assignments=", ".join(
+                    "{} = {}".format(columns[name], template.format(**columns))
+                    for name, template in assignments.items()
+                ),
+                pk=quote_name(meta.pk.column),
+            ),
+            values,
+        )
+        return [
+            (result[0], tuple(result[1:-1]), result[-1])
+            for result in cursor.fetchall()
+        ]
+
+
+def _increment(field_name: str) -> str:
+    """Get the assignment adding the inserted value to the stored value."""
+    column = "{" + field_name + "}"
+    return "stats.{0} + EXCLUDED.{0}".format(column)
+
+
+def _row_counts(
+    row: Dict, report_counters: List[_ReportCounterFilter]
+) -> Dict[str, int]:
+    """Get the report counts of a row returned by `_count_per_day`."""
+    return {
+        counter.field_name: row["_count_" + counter.field_name]
+        for counter in report_counters
+    }
+
+
+def _action(created: bool) -> str:
+    return "created" if created else "updated"
 
 
 class _StatsModelsEngine:
@@ -216,6 +417,17 @@ class _StatsModelsEngine:
         # self is potentially used by subclasses.
         return query_objects
 
+    def is_valid(self, report: Model) -> bool:
+        """Check whether a single report is valid, see `_valid_objects`.
+
+        Returns:
+            True if the report is valid.
+
+        """
+        # pylint: disable=no-self-use,unused-argument
+        # self and report are potentially used by subclasses.
+        return True
+
     def _objects_within_period(
         self,
         query_objects: QuerySet,
@@ -245,18 +457,31 @@ class _StatsModelsEngine:
 
         return query_objects
 
-    def _unique_objects_per_day(self, query_objects: QuerySet) -> QuerySet:
-        """Count the unique reports per version per day.
+    def _count_per_day(
+        self,
+        query_objects: QuerySet,
+        report_counters: List[_ReportCounterFilter],
+    ) -> QuerySet:
+        """Count the reports per version per day for multiple counters.
 
         Args:
             query_objects: The reports to count.
-        Returns: The unique reports grouped per version per day.
+            report_counters: The report counters to count the reports for.
+        Returns: The reports grouped per version per day, with the count of
+            each report counter annotated as `_count_<field name>`.
 
         """
         return (
             query_objects.annotate(_report_day=TruncDate("date"))
             .values(self.version_field_name, "_report_day")
-            .annotate(count=Count("date"))
+            # Update the stats entries in a consistent order
+            .order_by(self.version_field_name, "_report_day")
+            .annotate(
+                **{
+                    "_count_" + counter.field_name: counter.count()
+                    for counter in report_counters
+                }
+            )
         )
 
     def delete_stats(self) -> Dict[str, int]:
@@ -270,12 +495,139 @@ class _StatsModelsEngine:
         _, count_per_model = self.stats_model.objects.all().delete()
         return count_per_model
 
+    def _upsert_stats(
+        self, version_counts: Dict[str, Tuple[datetime.date, Dict[str, int]]]
+    ) -> Dict[str, Tuple[int, bool]]:
+        """Add the numbers of reports of versions to the general stats.
+
+        The first seen and release dates are moved to an older report day
+        the same way as done by `add_counts_to_stats`.
+
+        Args:
+            version_counts:
+                The first report day and the number of reports per counter
+                field name, per version.
+        Returns:
+            The primary key of the general stats entry and whether it has
+            been created, per version.
+
+        """
+        rows = []
+        for version, (report_day, counts) in version_counts.items():
+            row = _default_values(self.stats_model)
+            row.update(counts)
+            row[self.version_field_name] = version
+            row["first_seen_on"] = row["released_on"] = report_day
+            rows.append(row)
+
+        assignments = OrderedDict(
+            (field_name, _increment(field_name))
+            for field_name in _COUNTER_FIELD_NAMES
+        )
+        # Only a release date equal to the first seen date is the default
+        # value, other values have been set manually.
+        assignments["released_on"] = (
+            "CASE WHEN stats.{released_on} = stats.{first_seen_on} "
+            "AND EXCLUDED.{first_seen_on} < stats.{first_seen_on} "
+            "THEN EXCLUDED.{first_seen_on} ELSE stats.{released_on} END"
+        )
+        assignments["first_seen_on"] = (
+            "LEAST(stats.{first_seen_on}, EXCLUDED.{first_seen_on})"
+        )
+
+        return {
+            version: (pk, created)
+            for pk, (version,), created in _upsert(
+                self.stats_model, rows, [self.version_field_name], assignments
+            )
+        }
+
+    def _upsert_daily_stats(
+        self, daily_counts: List[Tuple[int, datetime.date, Dict[str, int]]]
+    ) -> Dict[Tuple[int, datetime.date], bool]:
+        """Add the numbers of reports of versions per day to the daily stats.
+
+        Args:
+            daily_counts:
+                Tuples of the primary key of the general stats entry, the
+                report day and the number of reports per counter field name.
+        Returns:
+            Whether the daily stats entry has been created, per primary key
+            of the general stats entry and report day.
+
+        """
+        rows = []
+        for version_id, report_day, counts in daily_counts:
+            row = _default_values(self.daily_stats_model)
+            row.update(counts)
+            row["version"] = version_id
+            row["date"] = report_day
+            rows.append(row)
+
+        assignments = {
+            field_name: _increment(field_name)
+            for field_name in _COUNTER_FIELD_NAMES
+        }
+        return {
+            unique_key: created
+            for _, unique_key, created in _upsert(
+                self.daily_stats_model, rows, ["version", "date"], assignments
+            )
+        }
+
+    def _add_batch(
+        self, batch: List[Dict], report_counters: List[_ReportCounterFilter]
+    ) -> Tuple[Dict[str, bool], Dict[Tuple[str, datetime.date], bool]]:
+        """Add a batch of report counts per version per day to the stats.
+
+        Args:
+            batch: The report counts as returned by `_count_per_day`.
+            report_counters: The report counters the reports were counted for.
+        Returns:
+            Whether the general stats entry has been created per version, and
+            whether the daily stats entry has been created per version and
+            report day.
+
+        """
+        version_counts = OrderedDict()
+        for row in batch:
+            version = row[self.version_field_name]
+            report_day, counts = version_counts.get(
+                version, (row["_report_day"], Counter())
+            )
+            counts.update(_row_counts(row, report_counters))
+            version_counts[version] = (
+                min(report_day, row["_report_day"]),
+                counts,
+            )
+
+        stats = self._upsert_stats(version_counts)
+        version_ids = {version: pk for version, (pk, _) in stats.items()}
+        daily_stats = self._upsert_daily_stats(
+            [
+                (
+                    version_ids[row[self.version_field_name]],
+                    row["_report_day"],
+                    _row_counts(row, report_counters),
+                )
+                for row in batch
+            ]
+        )
+        versions = {pk: version for version, pk in version_ids.items()}
+        return (
+            {version: created for version, (_, created) in stats.items()},
+            {
+                (versions[version_id], report_day): created
+                for (version_id, report_day), created in daily_stats.items()
+            },
+        )
+
     def update_stats(
         self,
-        report_counter: _ReportCounterFilter,
+        report_counters: List[_ReportCounterFilter],
         up_to: datetime.datetime,
         starting_from: Optional[datetime.datetime] = None,
-    ) -> Dict[Model, Dict[str, int]]:
+    ) -> Dict[str, Dict[Model, Dict[str, int]]]:
         """Update the statistics of the general and daily stats entries.
 
         The algorithm works as follow:
@@ -283,90 +635,166 @@ class _StatsModelsEngine:
             allow for comparable results between subclasses. The lower bound
             should be omitted for the first update but always set for later
             calls. The upper bound must be specified to avoid race conditions.
-        2. The report counter requirements are applied to the reports.
-        3. The reports are grouped per day and per version, a counter is
-            generated.
-        4. Each report group count is used to update specific daily stats,
-            while the sum of them per version updates the general stats.
+        2. The reports are grouped per day and per version and the reports
+            matching each report counter requirements are counted per group,
+            so that the reports are scanned only once for all counters.
+        3. The counts are added to the stats in batches. The sums of the
+            counts per version are added to the general stats and the counts
+            are added to the daily stats, with one `INSERT ... ON CONFLICT DO
+            UPDATE` statement per batch and model each.
 
         Args:
-            report_counter: The report counter to update the stats with.
+            report_counters:
+                The report counters to update the stats with. All of them
+                must count reports of the same model.
             up_to: The maximum timestamp to consider (inclusive).
             starting_from: The minimum timestamp to consider (exclusive).
         Returns:
             The number of added entries and the number of updated entries
             bundled in a dict, respectively hashed with the keys 'created'
-            and 'updated', per model name.
+            and 'updated', per model per report counter name. Entries of
+            both models are counted once per version and report day.
 
         """
-        counts_per_model = {
-            self.stats_model: {"created": 0, "updated": 0},
-            self.daily_stats_model: {"created": 0, "updated": 0},
-        }
-
-        query_objects = self._valid_objects(report_counter.model.objects.all())
+        query_objects = self._valid_objects(
+            report_counters[0].model.objects.all()
+        )
         # Only include reports from the interesting period of time
         query_objects = self._objects_within_period(
             query_objects, up_to, starting_from
         )
-        # Apply the report counter requirements
-        query_objects = report_counter.filter(query_objects)
-        # Chain our own filters
-        query_objects = self._unique_objects_per_day(query_objects)
+        # Count the reports of all counters at once
+        query_objects = self._count_per_day(query_objects, report_counters)
 
         # Explicitly use the iterator() method to avoid caching as we will
         # not re-use the QuerySet
-        for query_object in query_objects.iterator():
-            report_day = query_object["_report_day"]
-            # Use a dict to be able to dereference the field name
-            stats, created = self.stats_model.objects.get_or_create(
-                **{
-                    self.version_field_name: query_object[
-                        self.version_field_name
-                    ],
-                    "defaults": {
-                        "first_seen_on": report_day,
-                        "released_on": report_day,
-                    },
+        rows = (
+            row
+            for row in query_objects.iterator()
+            if any(_row_counts(row, report_counters).values())
+        )
+        counts_per_counter = {
+            report_counter.name: {
+                self.stats_model: {"created": 0, "updated": 0},
+                self.daily_stats_model: {"created": 0, "updated": 0},
+            }
+            for report_counter in report_counters
+        }
+        while True:
+            batch = list(itertools.islice(rows, _UPSERT_BATCH_SIZE))
+            if not batch:
+                break
+            created, created_daily = self._add_batch(batch, report_counters)
+            for row in batch:
+                version = row[self.version_field_name]
+                # Each row counts as an entry of the general stats. Only the
+                # first row of a created version counts as created.
+                actions = {
+                    self.stats_model: _action(created.pop(version, False)),
+                    self.daily_stats_model: _action(
+                        created_daily[(version, row["_report_day"])]
+                    ),
                 }
+                for report_counter in report_counters:
+                    if not row["_count_" + report_counter.field_name]:
+                        continue
+                    counts_per_model = counts_per_counter[report_counter.name]
+                    for model, action in actions.items():
+                        counts_per_model[model][action] += 1
+        return counts_per_counter
+
+    def add_to_stats(
+        self,
+        version: str,
+        report_day: datetime.date,
+        field_name: str,
+        count: int,
+    ) -> Tuple[bool, bool]:
+        """Add a number of reports to the general and daily stats entries.
+
+        Args:
+            version: The version the reports have been sent from.
+            report_day: The day the reports have been sent on.
+            field_name: The name of the counter field to increment.
+            count: The number of reports.
+        Returns:
+            Whether the general stats entry and whether the daily stats entry
+            have been created.
+
+        """
+        return self.add_counts_to_stats(
+            version, report_day, {field_name: count}
+        )
+
+    def add_counts_to_stats(
+        self, version: str, report_day: datetime.date, counts: Dict[str, int]
+    ) -> Tuple[bool, bool]:
+        """Add the numbers of reports of counters to the stats entries.
+
+        The entries are only changed with `UPDATE` statements incrementing
+        the counters and moving the first seen and release dates in the
+        database, so that concurrent updates do not get lost and fields
+        that are changed concurrently, for example manually, are never
+        overwritten with stale values.
+
+        Args:
+            version: The version the reports have been sent from.
+            report_day: The day the reports have been sent on.
+            counts: The number of reports per counter field name.
+        Returns:
+            Whether the general stats entry and whether the daily stats entry
+            have been created.
+
+        """
+        # Use a dict to be able to dereference the field name
+        stats, created_stats = self.stats_model.objects.get_or_create(
+            **{
+                self.version_field_name: version,
+                "defaults": {
+                    "first_seen_on": report_day,
+                    "released_on": report_day,
+                },
+            }
+        )
+
+        # Reports are coming in an unordered manner, a late report can
+        # be older (device time wise). Make sure that the current reports
+        # creation date is taken into account in the version history.
+        if not created_stats:
+            self.stats_model.objects.filter(
+                pk=stats.pk, first_seen_on__gt=report_day
+            ).update(
+                first_seen_on=report_day,
+                # Avoid changing the released_on field if it is different
+                # than the default value (i.e. equals to the value of
+                # first_seen_on) since it indicates that it was manually
+                # changed.
+                released_on=Case(
+                    When(
+                        released_on=F("first_seen_on"), then=Value(report_day)
+                    ),
+                    default=F("released_on"),
+                    output_field=DateField(),
+                ),
             )
-            counts_per_model[self.stats_model][
-                ("created" if created else "updated")
-            ] += 1
-
-            # Reports are coming in an unordered manner, a late report can
-            # be older (device time wise). Make sure that the current reports
-            # creation date is taken into account in the version history.
-            if not created and stats.first_seen_on > report_day:
-                # Avoid changing the released_on field if it is different than
-                # the default value (i.e. equals to the value of first_seen_on)
-                # since it indicates that it was manually changed.
-                if stats.released_on == stats.first_seen_on:
-                    stats.released_on = report_day
-                stats.first_seen_on = report_day
-
-            daily_stats, created = self.daily_stats_model.objects.get_or_create(
+
+        daily_stats, created_daily_stats = (
+            self.daily_stats_model.objects.get_or_create(
                 version=stats, date=report_day
             )
-            counts_per_model[self.daily_stats_model][
-                ("created" if created else "updated")
-            ] += 1
-
-            setattr(
-                stats,
-                report_counter.field_name,
-                F(report_counter.field_name) + query_object["count"],
-            )
-            setattr(
-                daily_stats,
-                report_counter.field_name,
-                F(report_counter.field_name) + query_object["count"],
-            )
-
-            stats.save()
-            daily_stats.save()
+        )
 
-        return counts_per_model
+        increments = {
+            field_name: F(field_name) + count
+            for field_name, count in counts.items()
+            if count
+        }
+        if increments:
+            self.stats_model.objects.filter(pk=stats.pk).update(**increments)
+            self.daily_stats_model.objects.filter(pk=daily_stats.pk).update(
+                **increments
+            )
+        return created_stats, created_daily_stats
 
 
 class VersionStatsEngine(_StatsModelsEngine):
@@ -404,6 +832,10 @@ class RadioVersionStatsEngine(_StatsModelsEngine):
         # For legacy reasons, the version field might be null
         return query_objects.filter(radio_version__isnull=False)
 
+    def is_valid(self, report):
+        # For legacy reasons, the version field might be null
+        return report.radio_version is not None
+
 
 class Command(BaseCommand):
     """Management command to compute Hiccup statistics."""
@@ -434,9 +866,61 @@ class Command(BaseCommand):
 
     help = __doc__
 
+    def __init__(self, *args, **kwargs):
+        """Initialise the command.
+
+        Attributes:
+            stopped: Event stopping the watch action once it is set.
+
+        """
+        super(Command, self).__init__(*args, **kwargs)
+        self.stopped = threading.Event()
+
     def add_arguments(self, parser):
         """Add custom arguments to the command."""
-        parser.add_argument("action", choices=["reset", "update"])
+        parser.add_argument("action", choices=["reset", "update", "watch"])
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=60,
+            help="Number of seconds between two updates of the watch action.",
+        )
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=1,
+            help="Number of worker processes updating the stats of the "
+            "stats engines and report tables in parallel. Ignored if the "
+            "stats are updated in real time.",
+        )
+        parser.add_argument(
+            "--window-days",
+            type=int,
+            default=7,
+            help="Number of days of report creation time counted in one "
+            "transaction when the stats are reset.",
+        )
+
+    @classmethod
+    def stats_units(cls):
+        """Get the independent units of work of a stats update.
+
+        Each unit updates the stats of one stats engine from one report
+        table, scanning the table once for all of its report counters.
+
+        Returns: A list of tuples of the stats engine and the report counters.
+
+        """
+        report_counters_per_model = OrderedDict()
+        for filter_ in cls._REPORT_COUNTER_FILTERS:
+            report_counters_per_model.setdefault(filter_.model, []).append(
+                filter_
+            )
+        return [
+            (engine, report_counters)
+            for engine in cls._STATS_MODELS_ENGINES
+            for report_counters in report_counters_per_model.values()
+        ]
 
     def handle(self, *args, **options):
         """Carry out the command executive logic."""
@@ -444,11 +928,68 @@ class Command(BaseCommand):
         # self.debug is only ever read through calls of handle().
         self.debug = int(options["verbosity"]) >= 2
 
-        if options["action"] == "reset":
-            self.delete_all_stats()
-            self.update_all_stats()
+        if options["window_days"] < 1:
+            raise CommandError("--window-days must be at least 1.")
+
+        if settings.HICCUP_STATS_REALTIME:
+            self._handle_realtime(options["action"])
+        elif options["action"] == "reset":
+            self.rebuild_all_stats(
+                options["jobs"], datetime.timedelta(days=options["window_days"])
+            )
+            self.recount_crash_signatures()
         elif options["action"] == "update":
+            self.update_all_stats(options["jobs"])
+        elif options["action"] == "watch":
+            self.watch(options["interval"], options["jobs"])
+
+    def _handle_realtime(self, action):
+        """Carry out the command if the stats are updated in real time.
+
+        New reports are counted as they are created, so only resetting the
+        stats has any effect. The stats are reset while holding an exclusive
+        lock on the stats metadata so that no accumulated stats are flushed
+        in the meantime, see `crashreport_stats.realtime`.
+        """
+        if action in ["update", "watch"]:
+            self._success("The stats are updated in real time.")
+            return
+        with transaction.atomic():
+            lock_stats_metadata(exclusive=True)
+            self.delete_all_stats()
             self.update_all_stats()
+            self.recount_crash_signatures()
+
+    def watch(self, interval, jobs=1):
+        """Update the stats repeatedly until the command is stopped.
+
+        Each update only counts the reports created since the previous one,
+        see `update_all_stats`. Failed updates are logged and retried after
+        the interval. SIGINT and SIGTERM stop the command once the current
+        update has finished.
+
+        Args:
+            interval: The number of seconds between two updates.
+            jobs: The number of worker processes of each update.
+
+        """
+        previous_handlers = {
+            signum: signal.signal(signum, lambda *args: self.stopped.set())
+            for signum in [signal.SIGINT, signal.SIGTERM]
+        }
+        try:
+            while True:
+                # Reconnect if the database connection has been lost
+                close_old_connections()
+                try:
+                    self.update_all_stats(jobs)
+                except Exception:  # pylint: disable=broad-except
+                    LOGGER.exception("Could not update the stats.")
+                if self.stopped.wait(interval):
+                    break
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
 
     def _success(self, msg, *args, **kwargs):
         # pylint: disable=no-member
@@ -475,9 +1016,68 @@ class Command(BaseCommand):
             count, _ = StatsMetadata.objects.all().delete()
             if self.debug:
                 self._success("{} StatsMetadata deleted".format(count))
+            StatsUnitMetadata.objects.all().delete()
+            StatsRebuildCheckpoint.objects.all().delete()
+
+    def recount_crash_signatures(self):
+        """Recount the crash signatures deleted along with the versions."""
+        count = crash_signatures.recount()
+        if self.debug:
+            self._success("{} CrashSignatureDaily recounted".format(count))
+
+    def _print_counts(self, counts_per_counter):
+        for counter_name, counts_per_model in counts_per_counter.items():
+            for model, counts in counts_per_model.items():
+                for action, count in counts.items():
+                    msg = "{} {} {} for counter {}".format(
+                        count, model.__name__, action, counter_name
+                    )
+                    self._success(msg)
 
-    def update_all_stats(self):
-        """Update the statistics from all stats models."""
+    def _run_units(self, function, units, jobs):
+        """Run the units of work of the stats and print their counts.
+
+        Args:
+            function: The module-level function running a unit of work.
+            units: The arguments of the function for each unit of work.
+            jobs: The number of worker processes.
+
+        """
+        if jobs > 1 and units:
+            # The worker processes must not share the database connections
+            # of this process, so they open their own ones.
+            connections.close_all()
+            with Pool(min(jobs, len(units))) as pool:
+                results = pool.map(function, units)
+        else:
+            results = map(function, units)
+
+        for counts_per_counter in results:
+            if self.debug:
+                self._print_counts(counts_per_counter)
+
+    def update_all_stats(self, jobs=1):
+        """Update the statistics from all stats models.
+
+        The units of work, see `stats_units`, are run in their own
+        transactions, in a pool of worker processes if `jobs` is greater than
+        1. Each unit saves the creation time up to which it counted reports
+        in its transaction, so that the units that have committed do not
+        count the same reports again when a failed update is retried. The
+        stats metadata is only saved once all of them have committed.
+
+        Args:
+            jobs: The number of worker processes.
+
+        Raises:
+            CommandError: If a rebuild of the stats is in progress.
+
+        """
+        if StatsRebuildCheckpoint.objects.exists():
+            raise CommandError(
+                "The stats are being rebuilt, run the reset action to resume "
+                "the rebuild."
+            )
         try:
             previous_update = StatsMetadata.objects.latest("updated_at")
             starting_from = previous_update.updated_at
@@ -487,18 +1087,163 @@ class Command(BaseCommand):
         # while we are updating the different statistics
         up_to = datetime.datetime.now(tz=pytz.utc)
 
-        for engine in self._STATS_MODELS_ENGINES:
+        self._run_units(
+            _update_stats_unit,
+            [
+                (index, up_to, starting_from)
+                for index in range(len(self.stats_units()))
+            ],
+            jobs,
+        )
+
+        _save_stats_metadata(up_to)
+
+    def rebuild_all_stats(self, jobs=1, window=datetime.timedelta(days=7)):
+        """Delete and recompute the statistics from all stats models.
+
+        The reports are counted in windows of their creation time, see
+        `_rebuild_stats_unit`. If a previous rebuild has been interrupted, it
+        is resumed instead of deleting the stats. The stats metadata is only
+        saved once all units of work have counted all windows.
+
+        Args:
+            jobs: The number of worker processes.
+            window: The length of the windows of the report creation time.
+
+        """
+        if StatsRebuildCheckpoint.objects.exists():
+            if self.debug:
+                self._success("Resuming the interrupted rebuild of the stats")
+        else:
             with transaction.atomic():
-                for filter_ in self._REPORT_COUNTER_FILTERS:
-                    counts_per_model = engine.update_stats(
-                        filter_, up_to, starting_from
-                    )
-                    if self.debug:
-                        for model, counts in counts_per_model.items():
-                            for action, count in counts.items():
-                                msg = "{} {} {} for counter {}".format(
-                                    count, model.__name__, action, filter_.name
-                                )
-                                self._success(msg)
-
-        StatsMetadata(updated_at=up_to).save()
+                self.delete_all_stats()
+                # Fix the upper limit to avoid race conditions with new
+                # reports sent while we are rebuilding the statistics
+                up_to = datetime.datetime.now(tz=pytz.utc)
+                StatsRebuildCheckpoint.objects.bulk_create(
+                    StatsRebuildCheckpoint(unit=index, up_to=up_to)
+                    for index in range(len(self.stats_units()))
+                )
+
+        self._run_units(
+            _rebuild_stats_unit,
+            [
+                (checkpoint.unit, window)
+                for checkpoint in StatsRebuildCheckpoint.objects.all()
+            ],
+            jobs,
+        )
+
+        with transaction.atomic():
+            checkpoints = StatsRebuildCheckpoint.objects.select_for_update()
+            up_to = checkpoints.values_list("up_to", flat=True).first()
+            if up_to is None:
+                # There are no units of work, nothing has been counted
+                up_to = datetime.datetime.now(tz=pytz.utc)
+            _save_stats_metadata(up_to)
+            checkpoints.delete()
+
+
+def _save_stats_metadata(updated_at):
+    """Save the time up to which the stats have been updated.
+
+    Only the latest update is kept, so that the stats metadata does not grow
+    with every update of the watch action.
+
+    Args:
+        updated_at: The creation time up to which reports have been counted.
+
+    """
+    with transaction.atomic():
+        StatsMetadata.objects.all().delete()
+        StatsMetadata(updated_at=updated_at).save()
+
+
+def _update_stats_unit(unit):
+    """Update the stats of a unit of work, run in the worker processes.
+
+    The reports are counted from the creation time up to which the unit
+    counted reports in its last update, if any, and this time is advanced in
+    the same transaction.
+
+    Args:
+        unit: A tuple of the index of the unit in `Command.stats_units()`,
+            the upper bound of the report creation time and the lower bound
+            used if the unit has not been updated yet.
+
+    Returns: The counts of created and updated entries, see
+        `_StatsModelsEngine.update_stats`.
+
+    """
+    index, up_to, starting_from = unit
+    engine, report_counters = Command.stats_units()[index]
+    with transaction.atomic():
+        # Serialise concurrent updates of the same unit
+        unit_metadata = (
+            StatsUnitMetadata.objects.select_for_update()
+            .filter(unit=index)
+            .first()
+        )
+        if unit_metadata is None:
+            unit_metadata = StatsUnitMetadata(unit=index)
+        else:
+            starting_from = unit_metadata.updated_at
+        counts_per_counter = engine.update_stats(
+            report_counters, up_to, starting_from
+        )
+        unit_metadata.updated_at = up_to
+        unit_metadata.save()
+    return counts_per_counter
+
+
+def _merge_counts(counts_per_counter, other_counts_per_counter):
+    """Add counts of created and updated entries to other ones in place."""
+    for counter_name, counts_per_model in other_counts_per_counter.items():
+        for model, counts in counts_per_model.items():
+            for action, count in counts.items():
+                counts_per_counter[counter_name][model][action] += count
+
+
+def _rebuild_stats_unit(unit):
+    """Count all reports of a unit of work, run in the worker processes.
+
+    The reports are counted from the oldest one in windows of their creation
+    time, each in its own transaction that also advances the checkpoint of
+    the unit of work, so that the size of the transactions does not depend
+    on the number of reports.
+
+    Args:
+        unit: A tuple of the index of the unit in `Command.stats_units()` and
+            the length of the windows.
+
+    Returns: The counts of created and updated entries, see
+        `_StatsModelsEngine.update_stats`. Entries counted in multiple
+        windows are counted as updated for each of the later windows.
+
+    """
+    index, window = unit
+    engine, report_counters = Command.stats_units()[index]
+    checkpoint = StatsRebuildCheckpoint.objects.get(unit=index)
+    counts_per_counter = None
+    while checkpoint.counted_up_to != checkpoint.up_to:
+        if checkpoint.counted_up_to is None:
+            oldest = report_counters[0].model.objects.aggregate(
+                oldest=Min("created_at")
+            )["oldest"]
+            window_end = checkpoint.up_to if oldest is None else oldest + window
+        else:
+            window_end = checkpoint.counted_up_to + window
+        window_end = min(window_end, checkpoint.up_to)
+
+        with transaction.atomic():
+            counts = engine.update_stats(
+                report_counters, window_end, checkpoint.counted_up_to
+            )
+            checkpoint.counted_up_to = window_end
+            checkpoint.save()
+
+        if counts_per_counter is None:
+            counts_per_counter = counts
+        else:
+            _merge_counts(counts_per_counter, counts)
+    return counts_per_counter or {}
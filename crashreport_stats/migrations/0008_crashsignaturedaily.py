@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+"""Migration to add the daily counts of crash signatures."""
+# pylint: disable=invalid-name
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """Add the daily counts of crash signatures per version."""
+
+    dependencies = [
+        ("crashreports", "0012_crashsignature"),
+        ("crashreport_stats", "0007_add_google_socialaccount"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CrashSignatureDaily",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "signature",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_stats",
+                        to="crashreports.CrashSignature",
+                    ),
+                ),
+                (
+                    "version",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="crash_signature_daily_stats",
+                        to="crashreport_stats.Version",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name="crashsignaturedaily",
+            unique_together=set([("version", "date", "signature")]),
+        ),
+    ]
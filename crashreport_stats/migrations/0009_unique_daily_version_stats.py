@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""Migration to make the daily stats unique per version and day."""
+# pylint: disable=invalid-name
+import logging
+
+from django.db import migrations
+from django.db.models import Count, F, Min
+
+LOGGER = logging.getLogger(__name__)
+
+COUNTER_FIELD_NAMES = ["heartbeats", "prob_crashes", "smpl", "other"]
+
+
+def merge_duplicates(apps, schema_editor):
+    """Merge the daily stats of the same version and day into one entry."""
+    # pylint: disable=unused-argument
+    for model_name in ["VersionDaily", "RadioVersionDaily"]:
+        model = apps.get_model("crashreport_stats", model_name)
+        duplicates = (
+            model.objects.values("version", "date")
+            .order_by()
+            .annotate(min_id=Min("id"), num_duplicates=Count("id"))
+            .filter(num_duplicates__gt=1)
+        )
+        LOGGER.info(
+            "Found %d %s instances that have duplicates. These will be merged.",
+            duplicates.count(),
+            model_name,
+        )
+        for duplicate in duplicates:
+            others = model.objects.filter(
+                version=duplicate["version"], date=duplicate["date"]
+            ).exclude(id=duplicate["min_id"])
+            for other in others:
+                model.objects.filter(id=duplicate["min_id"]).update(
+                    **{
+                        name: F(name) + getattr(other, name)
+                        for name in COUNTER_FIELD_NAMES
+                    }
+                )
+            others.delete()
+
+
+class Migration(migrations.Migration):
+    """Merge duplicate daily stats and add their unique constraints."""
+
+    dependencies = [("crashreport_stats", "0008_crashsignaturedaily")]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicates, reverse_code=migrations.RunPython.noop
+        ),
+        migrations.AlterUniqueTogether(
+            name="radioversiondaily",
+            unique_together=set([("version", "date")]),
+        ),
+        migrations.AlterUniqueTogether(
+            name="versiondaily", unique_together=set([("version", "date")])
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+"""Migration to add the checkpoints of rebuilds of the stats."""
+# pylint: disable=invalid-name
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Add the checkpoints of the units of work of rebuilds of the stats."""
+
+    dependencies = [("crashreport_stats", "0009_unique_daily_version_stats")]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatsRebuildCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("unit", models.PositiveSmallIntegerField(unique=True)),
+                ("up_to", models.DateTimeField()),
+                ("counted_up_to", models.DateTimeField(null=True)),
+            ],
+        )
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+"""Migration to add the stats metadata of the units of work of updates."""
+# pylint: disable=invalid-name
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Add the stats metadata per unit of work of the stats command."""
+
+    dependencies = [("crashreport_stats", "0010_statsrebuildcheckpoint")]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatsUnitMetadata",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("unit", models.PositiveSmallIntegerField(unique=True)),
+                ("updated_at", models.DateTimeField()),
+            ],
+        )
+    ]
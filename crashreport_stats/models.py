@@ -8,8 +8,11 @@ from django.db.models import (
     ForeignKey,
     IntegerField,
     Model,
+    PositiveSmallIntegerField,
 )
 
+from crashreports.models import CrashSignature
+
 
 class _VersionStats(Model):
     """The base class for all-time stats of a version.
@@ -74,6 +77,8 @@ class _DailyVersionStats(Model):
 
     class Meta:
         abstract = True
+        # The stats are upserted on this key by the stats command
+        unique_together = ("version", "date")
 
 
 class Version(_VersionStats):
@@ -138,6 +143,36 @@ class RadioVersionDaily(_DailyVersionStats):
     )
 
 
+class CrashSignatureDaily(Model):
+    """The daily number of crash reports with a crash signature per version.
+
+    The counts are maintained as the signatures of crash reports are
+    extracted, see `crashreport_stats.crash_signatures`.
+
+    Attributes:
+        signature: The crash signature (`CrashSignature`) counted.
+        version:
+            The software version object (`Version`) of the crash reports.
+        date: Day considered for the count.
+        count: The number of crash reports with the signature on the day.
+
+    """
+
+    signature = ForeignKey(
+        CrashSignature, related_name="daily_stats", on_delete=CASCADE
+    )
+    version = ForeignKey(
+        Version, related_name="crash_signature_daily_stats", on_delete=CASCADE
+    )
+    date = DateField()
+    count = IntegerField(default=0)
+
+    class Meta:  # noqa: D106
+        # Starts with the version, so that the signatures of a version are
+        # found with the index.
+        unique_together = ("version", "date", "signature")
+
+
 class StatsMetadata(Model):
     """The stats metadata.
 
@@ -147,3 +182,47 @@ class StatsMetadata(Model):
     """
 
     updated_at = DateTimeField()
+
+
+class StatsUnitMetadata(Model):
+    """The stats metadata of a unit of work of the stats command.
+
+    The units of work of a stats update commit in their own transactions,
+    each along with its metadata, so that a unit that has committed does not
+    count the same reports again if another unit of the update fails.
+
+    Attributes:
+        unit:
+            The index of the unit of work, see
+            `crashreport_stats.management.commands.stats.Command.stats_units`.
+        updated_at: The creation time up to which the unit counted reports.
+
+    """
+
+    unit = PositiveSmallIntegerField(unique=True)
+    updated_at = DateTimeField()
+
+
+class StatsRebuildCheckpoint(Model):
+    """The progress of a unit of work of a rebuild of the stats.
+
+    The stats are rebuilt by the stats command in windows of the creation
+    time of the reports. The checkpoint of a unit of work is advanced in the
+    transaction counting each window, so that an interrupted rebuild resumes
+    after the last counted window. The checkpoints are deleted once the
+    rebuild is complete.
+
+    Attributes:
+        unit:
+            The index of the unit of work, see
+            `crashreport_stats.management.commands.stats.Command.stats_units`.
+        up_to: The creation time up to which the rebuild counts reports.
+        counted_up_to:
+            The creation time up to which reports have been counted, or None
+            if none have been counted yet.
+
+    """
+
+    unit = PositiveSmallIntegerField(unique=True)
+    up_to = DateTimeField()
+    counted_up_to = DateTimeField(null=True)
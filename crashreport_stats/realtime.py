@@ -0,0 +1,213 @@
+"""Real-time accumulation of the stats of incoming reports.
+
+When `HICCUP_STATS_REALTIME` is enabled, every created heartbeat and crash
+report is classified right away, using the same report counter filters and
+stats engines as the `stats` management command. Each process accumulates
+the counts per version, day and counter in memory and a background thread
+adds them to the stats models every `HICCUP_STATS_REALTIME_FLUSH_INTERVAL`
+seconds.
+
+The `stats update` command does not count any reports in this mode. Reports
+created before the latest `StatsMetadata.updated_at` are not accumulated as
+they have already been counted by the last run of the `stats` command. To
+switch to the real-time mode, enable it and run `stats reset` once. Flushing
+and resetting the stats are serialised with a lock on the `StatsMetadata`
+table so that no report is counted twice.
+
+Counts that have not been flushed when a process is killed are lost. Running
+`stats reset` recomputes all stats from scratch.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from crashreport_stats.models import StatsMetadata
+
+LOGGER = logging.getLogger(__name__)
+
+
+def lock_stats_metadata(exclusive=False):
+    """Lock the stats metadata until the end of the current transaction.
+
+    Flushes of the accumulated stats take a shared lock, so that they can run
+    concurrently. Resetting the stats takes an exclusive lock.
+
+    Args:
+        exclusive: Whether to take an exclusive lock.
+
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "LOCK TABLE {} IN {} MODE".format(
+                connection.ops.quote_name(StatsMetadata._meta.db_table),
+                "EXCLUSIVE" if exclusive else "SHARE",
+            )
+        )
+
+
+def _report_day(report):
+    """Get the day of a report as computed by `TruncDate` in the database."""
+    if hasattr(report.date, "tzinfo"):
+        return timezone.localtime(report.date).date()
+    return report.date
+
+
+class StatsAccumulator:
+    """Accumulator for the stats of reports created by the current process.
+
+    Attributes:
+        flush_interval: The number of seconds between two flushes.
+
+    """
+
+    def __init__(self, flush_interval):
+        """Initialise the accumulator.
+
+        Args:
+            flush_interval: The number of seconds between two flushes.
+
+        """
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    @staticmethod
+    def _classify(report):
+        """Get the stats entries a report has to be counted for.
+
+        Returns:
+            A list of tuples of the stats engine, the version, the day and
+            the counter field name.
+
+        """
+        # pylint: disable=protected-access
+        # The classification must be the one of the stats command.
+        from crashreport_stats.management.commands.stats import Command
+
+        day = _report_day(report)
+        return [
+            (
+                engine,
+                getattr(report, engine.version_field_name),
+                day,
+                counter_filter.field_name,
+            )
+            for engine in Command._STATS_MODELS_ENGINES
+            if engine.is_valid(report)
+            for counter_filter in Command._REPORT_COUNTER_FILTERS
+            if counter_filter.matches(report)
+        ]
+
+    def add(self, reports):
+        """Add created reports to the accumulated stats.
+
+        Args:
+            reports: The created reports.
+
+        """
+        entries = [
+            (report.created_at, entry)
+            for report in reports
+            for entry in self._classify(report)
+        ]
+        with self._lock:
+            self._pending.extend(entries)
+            self._start()
+
+    def _start(self):
+        """Start the flushing thread unless it is already running."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="stats-accumulator", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("Could not flush the accumulated stats.")
+            finally:
+                connection.close()
+
+    def stop(self):
+        """Stop the flushing thread and flush the remaining stats."""
+        self._stopped.set()
+        self.flush()
+
+    def flush(self):
+        """Add the accumulated stats to the stats models.
+
+        Counts of reports created before the last run of the stats command
+        are dropped as they have been counted by that run already. If adding
+        the counts fails, they are kept for the next flush.
+
+        Returns: The number of reports per stats entry that have been added.
+
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return Counter()
+
+        try:
+            with transaction.atomic():
+                lock_stats_metadata()
+                last_update = (
+                    StatsMetadata.objects.order_by("-updated_at")
+                    .values_list("updated_at", flat=True)
+                    .first()
+                )
+                counts = Counter(
+                    entry
+                    for created_at, entry in pending
+                    if last_update is None or created_at > last_update
+                )
+                # Update the entries in a consistent order across processes
+                # to avoid deadlocks
+                for (engine, version, day, field_name), count in sorted(
+                    counts.items(),
+                    key=lambda item: (item[0][0].stats_model.__name__,)
+                    + item[0][1:],
+                ):
+                    engine.add_to_stats(version, day, field_name, count)
+        except Exception:
+            with self._lock:
+                self._pending[:0] = pending
+            raise
+        return counts
+
+
+_ACCUMULATOR = None
+_ACCUMULATOR_LOCK = threading.Lock()
+
+
+def get_accumulator():
+    """Get the stats accumulator of the current process."""
+    # pylint: disable=global-statement
+    global _ACCUMULATOR
+
+    with _ACCUMULATOR_LOCK:
+        if _ACCUMULATOR is None:
+            _ACCUMULATOR = StatsAccumulator(
+                settings.HICCUP_STATS_REALTIME_FLUSH_INTERVAL
+            )
+            atexit.register(_ACCUMULATOR.stop)
+        return _ACCUMULATOR
+
+
+def accumulate_created_reports(sender, reports, **kwargs):
+    """Accumulate the stats of created reports once they are committed.
+
+    Receiver of the `crashreports.models.reports_created` signal.
+    """
+    # pylint: disable=unused-argument
+    transaction.on_commit(lambda: get_accumulator().add(reports))
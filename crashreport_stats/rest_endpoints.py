@@ -1,18 +1,24 @@
 """REST API for accessing the crashreports statistics."""
 import operator
+import os
 import zipfile
 from collections import OrderedDict
 
+import pytz
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import generics, status
 from rest_framework import serializers
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Sum
 from django.db.models.expressions import F
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
 from django.utils.decorators import method_decorator
 
 from django_filters.rest_framework import (
@@ -23,12 +29,16 @@ from django_filters.rest_framework import (
     BooleanFilter,
 )
 
+from crashreport_stats import logfiles
 from crashreport_stats.models import (
+    CrashSignatureDaily,
     Version,
     VersionDaily,
     RadioVersion,
     RadioVersionDaily,
+    StatsMetadata,
 )
+from crashreports import logfile_search
 from crashreports.models import Device, Crashreport, HeartBeat, LogFile
 from crashreports.permissions import (
     HasStatsAccess,
@@ -36,6 +46,8 @@ from crashreports.permissions import (
     SWAGGER_SECURITY_REQUIREMENTS_OAUTH,
 )
 from crashreports.response_descriptions import default_desc
+from crashreports.serializers import CrashReportSerializer
+from hiccup import metrics
 
 _RESPONSE_STATUS_200_DESCRIPTION = "OK"
 
@@ -347,13 +359,14 @@ class DeviceStat(APIView):
         """
         device = Device.objects.filter(uuid=uuid)
 
-        heartbeat_instances = HeartBeat.objects.filter(device=device)
-        if heartbeat_instances.exists():
-            last_active = heartbeat_instances.order_by("-date")[0].date
+        # The date of the last heartbeat is kept up to date on ingestion
+        last_heartbeat = device.values_list("last_heartbeat", flat=True)[0]
+        if last_heartbeat is not None:
+            last_active = last_heartbeat.astimezone(pytz.utc).date()
         else:
             last_active = device[0].board_date
 
-        heartbeats = heartbeat_instances.count()
+        heartbeats = HeartBeat.objects.filter(device=device).count()
         crashreports = (
             Crashreport.objects.filter(device=device)
             .filter(boot_reason__in=Crashreport.CRASH_BOOT_REASONS)
@@ -386,7 +399,12 @@ _LOG_FILE_SCHEMA = openapi.Schema(title="LogFile", type=openapi.TYPE_FILE)
 
 
 class LogFileDownload(APIView):
-    """View for downloading log files."""
+    """View for downloading log files.
+
+    All members of the log file are read into memory. Use the streaming
+    `LogFileMembers`, `LogFileMemberDownload` and `LogFileMemberPreview`
+    views for large log files instead.
+    """
 
     permission_classes = (HasStatsAccess,)
 
@@ -427,6 +445,401 @@ class LogFileDownload(APIView):
         return Response(ret)
 
 
+def _get_logfile_path(id_logfile):
+    try:
+        return LogFile.objects.get(id=id_logfile).logfile.path
+    except ObjectDoesNotExist:
+        raise NotFound(detail="Logfile does not exist.")
+
+
+def _get_member_size(path, member):
+    try:
+        return logfiles.get_member_size(path, member)
+    except logfiles.MemberNotFound:
+        raise NotFound(detail="Logfile member does not exist.")
+
+
+class LogFileRawDownload(APIView):
+    """View for downloading the stored zip files of log files.
+
+    The file is sent by the front-end web server or the WSGI server, see
+    `crashreport_stats.logfiles.file_response`.
+    """
+
+    permission_classes = (HasStatsAccess,)
+
+    @swagger_auto_schema(
+        operation_description="Get the zip file of a log file as uploaded.",
+        security=SWAGGER_SECURITY_REQUIREMENTS_ALL,
+        responses=dict(
+            [
+                default_desc(NotFound),
+                (
+                    status.HTTP_200_OK,
+                    openapi.Response(
+                        _RESPONSE_STATUS_200_DESCRIPTION, _LOG_FILE_SCHEMA
+                    ),
+                ),
+            ]
+        ),
+    )
+    def get(self, request, id_logfile):
+        """Get the zip file of a logfile.
+
+        Args:
+            request: Http request
+            id_logfile: The id of the log file
+
+        Returns: The zip file of the log file with the corresponding id.
+
+        """
+        try:
+            logfile = LogFile.objects.get(id=id_logfile)
+        except ObjectDoesNotExist:
+            raise NotFound(detail="Logfile does not exist.")
+        try:
+            return logfiles.file_response(
+                logfile.logfile.path,
+                logfile.logfile.storage.location,
+                "{}_{}.zip".format(logfile.logfile_type, logfile.id),
+                "application/zip",
+            )
+        except FileNotFoundError:
+            raise NotFound(detail="Logfile does not exist.")
+
+
+_LOG_FILE_MEMBERS_SCHEMA = openapi.Schema(
+    type=openapi.TYPE_ARRAY,
+    items=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        title="LogFileMember",
+        properties=OrderedDict(
+            [
+                ("name", openapi.Schema(type=openapi.TYPE_STRING)),
+                ("size", openapi.Schema(type=openapi.TYPE_INTEGER)),
+                ("compressed_size", openapi.Schema(type=openapi.TYPE_INTEGER)),
+            ]
+        ),
+    ),
+)
+
+
+class LogFileMembers(APIView):
+    """View for listing the members of log files."""
+
+    permission_classes = (HasStatsAccess,)
+
+    @swagger_auto_schema(
+        operation_description="List the members of a log file archive.",
+        security=SWAGGER_SECURITY_REQUIREMENTS_ALL,
+        responses=dict(
+            [
+                default_desc(NotFound),
+                (
+                    status.HTTP_200_OK,
+                    openapi.Response(
+                        _RESPONSE_STATUS_200_DESCRIPTION,
+                        _LOG_FILE_MEMBERS_SCHEMA,
+                    ),
+                ),
+            ]
+        ),
+    )
+    def get(self, request, id_logfile):
+        """Get the members of a log file.
+
+        Args:
+            request: Http request
+            id_logfile: The id of the log file
+
+        Returns: The names and sizes of the members of the log file.
+
+        """
+        try:
+            members = logfiles.get_members(_get_logfile_path(id_logfile))
+        except logfiles.MemberNotFound:
+            raise NotFound(detail="Logfile does not exist.")
+        return Response(members)
+
+
+class LogFileMemberDownload(APIView):
+    """View for downloading single members of log files.
+
+    The member is decompressed while it is sent. Single byte ranges can be
+    requested with the Range header.
+    """
+
+    permission_classes = (HasStatsAccess,)
+
+    @swagger_auto_schema(
+        operation_description="Get a member of a log file archive. A single "
+        "byte range of the member can be requested with the Range header.",
+        security=SWAGGER_SECURITY_REQUIREMENTS_ALL,
+        responses=dict(
+            [
+                default_desc(NotFound),
+                (
+                    status.HTTP_200_OK,
+                    openapi.Response(
+                        _RESPONSE_STATUS_200_DESCRIPTION, _LOG_FILE_SCHEMA
+                    ),
+                ),
+                (
+                    status.HTTP_206_PARTIAL_CONTENT,
+                    openapi.Response("Partial Content", _LOG_FILE_SCHEMA),
+                ),
+                (
+                    status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                    openapi.Response("Requested Range Not Satisfiable"),
+                ),
+            ]
+        ),
+    )
+    def get(self, request, id_logfile, member):
+        """Get a member of a logfile.
+
+        Args:
+            request: Http request
+            id_logfile: The id of the log file
+            member: The name of the member
+
+        Returns: The content of the member or of the requested byte range.
+
+        """
+        path = _get_logfile_path(id_logfile)
+        size = _get_member_size(path, member)
+        try:
+            byte_range = logfiles.parse_range(
+                request.META.get("HTTP_RANGE", ""), size
+            )
+        except ValueError:
+            response = HttpResponse(
+                status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+            )
+            response["Content-Range"] = "bytes */{}".format(size)
+            return response
+
+        first, last = byte_range or (0, size - 1)
+        response = StreamingHttpResponse(
+            logfiles.iter_member(path, member, first, last - first + 1),
+            content_type="text/plain",
+        )
+        if byte_range is not None:
+            response.status_code = status.HTTP_206_PARTIAL_CONTENT
+            response["Content-Range"] = "bytes {}-{}/{}".format(
+                first, last, size
+            )
+        response["Content-Length"] = max(last - first + 1, 0)
+        response["Accept-Ranges"] = "bytes"
+        response["Content-Disposition"] = 'inline; filename="{}"'.format(
+            os.path.basename(member).replace('"', "")
+        )
+        return response
+
+
+_LOG_FILE_PREVIEW_SCHEMA = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    title="LogFileMemberPreview",
+    properties=OrderedDict(
+        [
+            ("name", openapi.Schema(type=openapi.TYPE_STRING)),
+            ("size", openapi.Schema(type=openapi.TYPE_INTEGER)),
+            ("head", openapi.Schema(type=openapi.TYPE_STRING)),
+            ("tail", openapi.Schema(type=openapi.TYPE_STRING)),
+            ("truncated", openapi.Schema(type=openapi.TYPE_BOOLEAN)),
+        ]
+    ),
+)
+
+_PREVIEW_DEFAULT_BYTES = 16 * 2 ** 10
+_PREVIEW_MAX_BYTES = 2 ** 20
+
+
+class LogFileMemberPreview(APIView):
+    """View for previewing the beginning and end of log file members."""
+
+    permission_classes = (HasStatsAccess,)
+
+    @swagger_auto_schema(
+        operation_description="Get the beginning and the end of a member of "
+        "a log file archive.",
+        security=SWAGGER_SECURITY_REQUIREMENTS_ALL,
+        manual_parameters=[
+            openapi.Parameter(
+                "bytes",
+                openapi.IN_QUERY,
+                description="Maximum number of bytes of the beginning and "
+                "of the end (default {}, at most {}).".format(
+                    _PREVIEW_DEFAULT_BYTES, _PREVIEW_MAX_BYTES
+                ),
+                type=openapi.TYPE_INTEGER,
+            )
+        ],
+        responses=dict(
+            [
+                default_desc(NotFound),
+                default_desc(ValidationError),
+                (
+                    status.HTTP_200_OK,
+                    openapi.Response(
+                        _RESPONSE_STATUS_200_DESCRIPTION,
+                        _LOG_FILE_PREVIEW_SCHEMA,
+                    ),
+                ),
+            ]
+        ),
+    )
+    def get(self, request, id_logfile, member):
+        """Get a preview of a member of a logfile.
+
+        Args:
+            request: Http request
+            id_logfile: The id of the log file
+            member: The name of the member
+
+        Returns: The size, head and tail of the member.
+
+        """
+        try:
+            max_bytes = int(
+                request.query_params.get("bytes", _PREVIEW_DEFAULT_BYTES)
+            )
+        except ValueError:
+            raise ValidationError({"bytes": "A valid integer is required."})
+        if not 0 < max_bytes <= _PREVIEW_MAX_BYTES:
+            raise ValidationError(
+                {
+                    "bytes": "Must be between 1 and {}.".format(
+                        _PREVIEW_MAX_BYTES
+                    )
+                }
+            )
+        path = _get_logfile_path(id_logfile)
+        _get_member_size(path, member)
+        return Response(logfiles.preview_member(path, member, max_bytes))
+
+
+def _render_stats_lag():
+    """Render the lag of the stats computed by the stats command as metric.
+
+    The lag is the time since the creation time up to which reports have
+    been counted. The metric is left out if no stats have been computed yet
+    or if they are updated in real time, as that time is not advanced then.
+    """
+    if settings.HICCUP_STATS_REALTIME:
+        return ""
+    updated_at = (
+        StatsMetadata.objects.order_by("-updated_at")
+        .values_list("updated_at", flat=True)
+        .first()
+    )
+    if updated_at is None:
+        return ""
+    return metrics.render_gauge(
+        "hiccup_stats_lag_seconds",
+        "Seconds since the creation time up to which reports have been "
+        "counted by the stats command.",
+        (timezone.now() - updated_at).total_seconds(),
+    )
+
+
+class Metrics(APIView):
+    """View the request metrics in the Prometheus text format."""
+
+    permission_classes = (HasStatsAccess,)
+
+    @swagger_auto_schema(
+        operation_description="Get the latency, the number of SQL queries "
+        "and the SQL time of the requests per URL name, and the lag of the "
+        "stats, in the Prometheus text format.",
+        security=SWAGGER_SECURITY_REQUIREMENTS_ALL,
+        responses=dict(
+            [
+                (
+                    status.HTTP_200_OK,
+                    openapi.Response(
+                        _RESPONSE_STATUS_200_DESCRIPTION,
+                        openapi.Schema(type=openapi.TYPE_STRING),
+                    ),
+                )
+            ]
+        ),
+    )
+    def get(self, request):
+        """Get the request metrics.
+
+        Args:
+            request: Http request
+
+        Returns: The metrics of all recorded requests.
+
+        """
+        return HttpResponse(
+            metrics.render(metrics.REGISTRY.collect()) + _render_stats_lag(),
+            content_type=metrics.CONTENT_TYPE,
+        )
+
+
+class LogFileSearchFilter(FilterSet):
+    """Filter for crash reports found by a log file search."""
+
+    build_fingerprint = CharFilter()
+    date_start = DateFilter(field_name="date", lookup_expr="date__gte")
+    date_end = DateFilter(field_name="date", lookup_expr="date__lte")
+
+    class Meta:  # noqa: D106
+        model = Crashreport
+        fields = ("build_fingerprint",)
+
+
+@method_decorator(
+    name="get",
+    decorator=swagger_auto_schema(
+        operation_description="List the crash reports with a log file "
+        "containing a text. The words of the text are looked up in the "
+        "full-text search index, so only texts consisting of whole words "
+        "within one line are found.",
+        security=SWAGGER_SECURITY_REQUIREMENTS_ALL,
+        manual_parameters=[
+            openapi.Parameter(
+                "q",
+                openapi.IN_QUERY,
+                description="The text to search for.",
+                type=openapi.TYPE_STRING,
+                required=True,
+            )
+        ],
+        responses=dict([default_desc(ValidationError)]),
+    ),
+)
+class LogFileSearchView(generics.ListAPIView):
+    """View for searching crash reports by the contents of their log files."""
+
+    permission_classes = (HasStatsAccess,)
+    filter_backends = (DjangoFilterBackend,)
+    filter_class = LogFileSearchFilter
+    serializer_class = CrashReportSerializer
+
+    def get_queryset(self):
+        """Get the crash reports with a log file containing the text.
+
+        Raises:
+            ValidationError: If no text to search for is given.
+
+        """
+        text = self.request.query_params.get("q", "").strip()
+        if not text:
+            raise ValidationError({"q": "This parameter is required."})
+        return (
+            Crashreport.objects.filter(
+                id__in=logfile_search.search(text).values("crashreport_id")
+            )
+            .select_related("device")
+            .prefetch_related("logfiles")
+            .order_by("-date")
+        )
+
+
 class _VersionStatsFilter(FilterSet):
     first_seen_before = DateFilter(
         field_name="first_seen_on", lookup_expr="lte"
@@ -595,3 +1008,55 @@ class RadioVersionDailyListView(_DailyVersionStatsListView):
         "version__is_beta_release",
     )
     serializer_class = RadioVersionDailySerializer
+
+
+class CrashSignatureFilter(_DailyVersionStatsFilter):
+    """Filter for the daily counts summed up per crash signature."""
+
+    version__build_fingerprint = CharFilter()
+    signature__kind = CharFilter()
+
+    class Meta:  # noqa: D106
+        model = CrashSignatureDaily
+        fields = ("version__build_fingerprint", "signature__kind")
+
+
+class CrashSignatureCountSerializer(serializers.Serializer):
+    """Serializer for the number of crash reports with a crash signature."""
+
+    # pylint: disable=abstract-method
+    # The serializer is read-only.
+
+    id = serializers.IntegerField(source="signature_id")
+    kind = serializers.CharField(source="signature__kind")
+    signature = serializers.CharField(source="signature__signature")
+    count = serializers.IntegerField()
+
+
+@method_decorator(
+    name="get",
+    decorator=swagger_auto_schema(
+        operation_description="List the crash signatures ordered by the "
+        "number of crash reports with them, for example the top crashes of a "
+        "version.",
+        security=SWAGGER_SECURITY_REQUIREMENTS_OAUTH,
+    ),
+)
+class CrashSignatureListView(generics.ListAPIView):
+    """View for listing the crash signatures by their number of crashes."""
+
+    permission_classes = (HasStatsAccess,)
+    filter_backends = (DjangoFilterBackend,)
+    queryset = CrashSignatureDaily.objects.all()
+    filter_class = CrashSignatureFilter
+    serializer_class = CrashSignatureCountSerializer
+
+    def filter_queryset(self, queryset):
+        """Sum up the filtered daily counts per crash signature."""
+        return (
+            super(CrashSignatureListView, self)
+            .filter_queryset(queryset)
+            .values("signature_id", "signature__kind", "signature__signature")
+            .annotate(count=Sum("count"))
+            .order_by("-count", "signature_id")
+        )
@@ -0,0 +1,285 @@
+"""Tests for the extraction and daily counts of crash signatures."""
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import datetime, timedelta
+
+import pytz
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from crashreport_stats import crash_signatures
+from crashreport_stats.models import CrashSignatureDaily, Version
+from crashreport_stats.tests.utils import Dummy, HiccupStatsAPITestCase
+from crashreports.models import Crashreport, CrashSignature
+from crashreports.tests.test_crash_signatures import KERNEL_PANIC_LINES
+
+NULL_POINTER_SIGNATURE = "NULL pointer dereference at msm_vidc_open"
+MODEM_LINES = [b"modem subsystem failure reason: mcfg_nv.c:1090:Assertion."]
+
+
+class _CrashSignaturesTestMixin:
+    """Create crash reports with log files containing crashes."""
+
+    def _create_crashreport(self, lines, index=0, **kwargs):
+        crashreport = Dummy.create_report(
+            Crashreport,
+            self.device,
+            date=datetime(2018, 3, 19, 12, tzinfo=pytz.utc)
+            + timedelta(minutes=index),
+            **kwargs
+        )
+        name = "{}.zip".format(crashreport.id)
+        with zipfile.ZipFile(
+            os.path.join(settings.MEDIA_ROOT, name), "w"
+        ) as zip_file:
+            zip_file.writestr("last_kmsg", b"\n".join(lines))
+        Dummy.create_log_file(crashreport, logfile=name)
+        return crashreport
+
+    @staticmethod
+    def _update():
+        """Count the versions of the crash reports and their signatures."""
+        call_command("stats", "update")
+        return crash_signatures.update()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(".hiccup-tests"))
+class CrashSignaturesTestCase(_CrashSignaturesTestMixin, TestCase):
+    """Test extracting and counting the crash signatures."""
+
+    def setUp(self):
+        """Create a device."""
+        self.addCleanup(shutil.rmtree, settings.MEDIA_ROOT, True)
+        self.device = Dummy.create_device(Dummy.create_user())
+
+    def _assert_daily_counts_are(self, expected_counts):
+        self.assertEqual(
+            {
+                (
+                    daily_count.signature.signature,
+                    daily_count.version.build_fingerprint,
+                    daily_count.date,
+                ): daily_count.count
+                for daily_count in CrashSignatureDaily.objects.all()
+            },
+            expected_counts,
+        )
+
+    def test_update(self):
+        """Test that signatures are assigned to crash reports and counted."""
+        for index in range(3):
+            self._create_crashreport(KERNEL_PANIC_LINES, index)
+        self._create_crashreport(
+            KERNEL_PANIC_LINES,
+            3,
+            build_fingerprint=Dummy.BUILD_FINGERPRINTS[1],
+        )
+        self._create_crashreport(MODEM_LINES, 4)
+
+        self.assertEqual(self._update(), 5)
+
+        self.assertFalse(
+            Crashreport.objects.filter(signature__isnull=True).exists()
+        )
+        self._assert_daily_counts_are(
+            {
+                (
+                    NULL_POINTER_SIGNATURE,
+                    Dummy.BUILD_FINGERPRINTS[0],
+                    Dummy.DATES[0],
+                ): 3,
+                (
+                    NULL_POINTER_SIGNATURE,
+                    Dummy.BUILD_FINGERPRINTS[1],
+                    Dummy.DATES[0],
+                ): 1,
+                (
+                    "mcfg_nv.c:<n>:Assertion",
+                    Dummy.BUILD_FINGERPRINTS[0],
+                    Dummy.DATES[0],
+                ): 1,
+            }
+        )
+
+    def test_update_counts_crashreports_once(self):
+        """Test that crash reports with a signature are not counted again."""
+        self._create_crashreport(KERNEL_PANIC_LINES)
+        self._update()
+        self._create_crashreport(KERNEL_PANIC_LINES, 1)
+
+        self.assertEqual(self._update(), 1)
+        self.assertEqual(self._update(), 0)
+
+        self._assert_daily_counts_are(
+            {
+                (
+                    NULL_POINTER_SIGNATURE,
+                    Dummy.BUILD_FINGERPRINTS[0],
+                    Dummy.DATES[0],
+                ): 2
+            }
+        )
+
+    def test_update_unreadable_logfile(self):
+        """Test that crash reports with missing log files are retried."""
+        crashreport = self._create_crashreport(KERNEL_PANIC_LINES)
+        os.remove(crashreport.logfiles.get().logfile.path)
+
+        self.assertEqual(self._update(), 0)
+
+        self.assertFalse(CrashSignatureDaily.objects.exists())
+        crashreport.refresh_from_db()
+        self.assertIsNone(crashreport.signature)
+
+    def test_update_skips_uncounted_versions(self):
+        """Test that crash reports of uncounted versions are left for later."""
+        crashreport = self._create_crashreport(KERNEL_PANIC_LINES)
+
+        self.assertEqual(crash_signatures.update(), 0)
+
+        self.assertFalse(Version.objects.exists())
+        crashreport.refresh_from_db()
+        self.assertIsNone(crashreport.signature)
+        self.assertEqual(self._update(), 1)
+
+    def test_recount(self):
+        """Test that the daily counts are recomputed from crash reports."""
+        for index in range(2):
+            self._create_crashreport(KERNEL_PANIC_LINES, index)
+        self._update()
+        CrashSignatureDaily.objects.all().delete()
+
+        self.assertEqual(crash_signatures.recount(), 1)
+
+        self._assert_daily_counts_are(
+            {
+                (
+                    NULL_POINTER_SIGNATURE,
+                    Dummy.BUILD_FINGERPRINTS[0],
+                    Dummy.DATES[0],
+                ): 2
+            }
+        )
+
+    def test_recount_uncounted_versions(self):
+        """Test that crash reports of uncounted versions lose the signature."""
+        crashreport = self._create_crashreport(KERNEL_PANIC_LINES)
+        self._update()
+        Version.objects.all().delete()
+
+        self.assertEqual(crash_signatures.recount(), 0)
+
+        crashreport.refresh_from_db()
+        self.assertIsNone(crashreport.signature)
+
+    def test_stats_reset_recounts(self):
+        """Test that resetting the stats keeps the crash signature counts."""
+        self._create_crashreport(KERNEL_PANIC_LINES)
+        self._update()
+
+        call_command("stats", "reset")
+
+        self._assert_daily_counts_are(
+            {
+                (
+                    NULL_POINTER_SIGNATURE,
+                    Dummy.BUILD_FINGERPRINTS[0],
+                    Dummy.DATES[0],
+                ): 1
+            }
+        )
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(".hiccup-tests"))
+class CrashSignaturesJobsTestCase(
+    _CrashSignaturesTestMixin, TransactionTestCase
+):
+    """Test extracting the crash signatures with worker processes."""
+
+    def setUp(self):
+        """Create a device."""
+        self.addCleanup(shutil.rmtree, settings.MEDIA_ROOT, True)
+        self.device = Dummy.create_device(Dummy.create_user())
+
+    def test_command(self):
+        """Test extracting signatures with worker processes."""
+        self._create_crashreport(KERNEL_PANIC_LINES)
+        call_command("stats", "update")
+
+        call_command("crash_signatures", "update", jobs=2, verbosity=0)
+
+        self.assertEqual(
+            Crashreport.objects.get().signature,
+            CrashSignature.objects.get(
+                kind=CrashSignature.KIND_KERNEL_PANIC,
+                signature=NULL_POINTER_SIGNATURE,
+            ),
+        )
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(".hiccup-tests"))
+class CrashSignatureListViewTestCase(
+    _CrashSignaturesTestMixin, HiccupStatsAPITestCase
+):
+    """Test listing the top crash signatures."""
+
+    crash_signatures_url = reverse("hiccup_stats_api_v1_crash_signatures")
+
+    def setUp(self):
+        """Create crash reports with signatures."""
+        self.addCleanup(shutil.rmtree, settings.MEDIA_ROOT, True)
+        self.device = Dummy.create_device(Dummy.create_user())
+        for index in range(2):
+            self._create_crashreport(KERNEL_PANIC_LINES, index)
+        self._create_crashreport(MODEM_LINES, 2)
+        self._create_crashreport(
+            MODEM_LINES, 3, build_fingerprint=Dummy.BUILD_FINGERPRINTS[3]
+        )
+        self._update()
+
+    def _get_signatures(self, **params):
+        response = self.fp_staff_client.get(
+            self.crash_signatures_url, params
+        )
+        return [
+            (result["signature"], result["count"])
+            for result in response.data["results"]
+        ]
+
+    def test_list_top_signatures(self):
+        """Test that signatures are ordered by their number of crashes."""
+        self.assertEqual(
+            self._get_signatures(),
+            [(NULL_POINTER_SIGNATURE, 2), ("mcfg_nv.c:<n>:Assertion", 2)],
+        )
+
+    def test_list_top_signatures_of_version(self):
+        """Test listing the top signatures of a version."""
+        self.assertEqual(
+            self._get_signatures(
+                version__build_fingerprint=Dummy.BUILD_FINGERPRINTS[3]
+            ),
+            [("mcfg_nv.c:<n>:Assertion", 1)],
+        )
+
+    def test_list_signatures_of_kind_and_dates(self):
+        """Test filtering the signatures by kind and date."""
+        self.assertEqual(
+            self._get_signatures(
+                signature__kind=CrashSignature.KIND_KERNEL_PANIC,
+                date_start=Dummy.DATES[0],
+                date_end=Dummy.DATES[0],
+            ),
+            [(NULL_POINTER_SIGNATURE, 2)],
+        )
+        self.assertEqual(self._get_signatures(date_start=Dummy.DATES[1]), [])
+
+    def test_list_signatures_without_authentication(self):
+        """Test that the signatures cannot be listed anonymously."""
+        self._assert_get_without_authentication_fails(
+            self.crash_signatures_url
+        )
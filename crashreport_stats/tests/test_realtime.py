@@ -0,0 +1,95 @@
+"""Tests for the real-time accumulation of stats."""
+from datetime import datetime, timedelta
+
+import pytz
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from crashreport_stats.models import (
+    RadioVersion,
+    RadioVersionDaily,
+    StatsMetadata,
+    Version,
+    VersionDaily,
+)
+from crashreport_stats.realtime import StatsAccumulator
+from crashreport_stats.tests.utils import Dummy
+from crashreports.models import Crashreport, HeartBeat
+
+
+class StatsAccumulatorTestCase(TestCase):
+    """Test the real-time accumulation of stats."""
+
+    STATS_MODELS = [Version, VersionDaily, RadioVersion, RadioVersionDaily]
+    COUNTER_FIELDS = ["heartbeats", "prob_crashes", "smpl", "other"]
+
+    def setUp(self):
+        """Create reports of different types, versions and days."""
+        device = Dummy.create_device(Dummy.create_user())
+        first_date = datetime(2018, 3, 19, 23, 30, tzinfo=pytz.utc)
+        self.reports = []
+        for i, boot_reason in enumerate(
+            Crashreport.CRASH_BOOT_REASONS
+            + Crashreport.SMPL_BOOT_REASONS
+            + ["other boot reason"]
+        ):
+            report_date = first_date + timedelta(days=i, hours=i)
+            self.reports.append(
+                Dummy.create_report(
+                    HeartBeat,
+                    device,
+                    date=report_date.date(),
+                    build_fingerprint=Dummy.BUILD_FINGERPRINTS[i % 2],
+                    radio_version=[None, Dummy.RADIO_VERSIONS[0]][i % 2],
+                )
+            )
+            self.reports.append(
+                Dummy.create_report(
+                    Crashreport,
+                    device,
+                    date=report_date,
+                    boot_reason=boot_reason,
+                    build_fingerprint=Dummy.BUILD_FINGERPRINTS[i % 3],
+                )
+            )
+
+    def _get_stats(self):
+        return {
+            model: sorted(
+                model.objects.values_list(*self.COUNTER_FIELDS).order_by()
+            )
+            for model in self.STATS_MODELS
+        }
+
+    def test_same_stats_as_stats_command(self):
+        """Test that the accumulated stats match the computed ones."""
+        accumulator = StatsAccumulator(flush_interval=60)
+        accumulator.add(self.reports)
+        accumulator.flush()
+        accumulated_stats = self._get_stats()
+        self.assertEqual(Version.objects.count(), 3)
+
+        call_command("stats", "reset")
+        self.assertEqual(accumulated_stats, self._get_stats())
+
+    def test_counted_reports_skipped(self):
+        """Test that reports counted by the stats command are skipped."""
+        call_command("stats", "update")
+        computed_stats = self._get_stats()
+
+        accumulator = StatsAccumulator(flush_interval=60)
+        accumulator.add(self.reports)
+        self.assertFalse(accumulator.flush())
+        self.assertEqual(computed_stats, self._get_stats())
+
+    def test_counts_kept_until_flushed(self):
+        """Test that the counts are flushed only once."""
+        StatsMetadata.objects.create(
+            updated_at=datetime.now(pytz.utc) - timedelta(days=1)
+        )
+        accumulator = StatsAccumulator(flush_interval=60)
+        accumulator.add(self.reports[:1])
+        self.assertEqual(sum(accumulator.flush().values()), 1)
+        self.assertFalse(accumulator.flush())
+        self.assertEqual(Version.objects.get().heartbeats, 1)
@@ -1,5 +1,6 @@
 """Tests for the rest_endpoints module."""
 import operator
+import os
 from datetime import datetime, timedelta
 
 import pytz
@@ -13,6 +14,7 @@ from rest_framework import status
 from crashreport_stats.models import RadioVersion
 from crashreport_stats.tests.utils import Dummy, HiccupStatsAPITestCase
 
+from crashreports import logfile_search
 from crashreports.models import Crashreport, HeartBeat, LogFile
 
 # pylint: disable=too-many-public-methods
@@ -348,10 +350,15 @@ class DeviceStatsTestCase(HiccupStatsAPITestCase):
     device_report_history_url = "hiccup_stats_api_v1_device_report_history"
     device_update_history_url = "hiccup_stats_api_v1_device_update_history"
     device_logfile_download_url = "hiccup_stats_api_v1_logfile_download"
+    logfile_members_url = "hiccup_stats_api_v1_logfile_members"
+    logfile_member_url = "hiccup_stats_api_v1_logfile_member"
+    logfile_preview_url = "hiccup_stats_api_v1_logfile_preview"
+    logfile_raw_url = "hiccup_stats_api_v1_logfile_raw"
+    logfile_search_url = "hiccup_stats_api_v1_logfile_search"
 
-    def _get_with_params(self, url, params):
+    def _get_with_params(self, url, params, **kwargs):
         url = reverse(url, kwargs=params)
-        return self.fp_staff_client.get(url)
+        return self.fp_staff_client.get(url, **kwargs)
 
     def _assert_device_stats_response_is(
         self,
@@ -907,3 +914,186 @@ class DeviceStatsTestCase(HiccupStatsAPITestCase):
         self.assertEqual(
             response.data[Dummy.DEFAULT_LOG_FILE_NAME], expected_logfile_content
         )
+
+    def _create_logfile_with_contents(self):
+        device = Dummy.create_device(Dummy.create_user())
+        crashreport = Dummy.create_report(Crashreport, device)
+        logfile = Dummy.create_log_file(crashreport)
+        contents = Dummy.read_logfile_contents(
+            logfile.logfile.path, Dummy.DEFAULT_LOG_FILE_NAME
+        )
+        return logfile, contents
+
+    def test_list_logfile_members(self):
+        """Test listing the members of a log file."""
+        logfile, contents = self._create_logfile_with_contents()
+
+        response = self._get_with_params(
+            self.logfile_members_url, {"id_logfile": logfile.id}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(member["name"], member["size"]) for member in response.data],
+            [(Dummy.DEFAULT_LOG_FILE_NAME, len(contents))],
+        )
+
+    def test_download_logfile_member(self):
+        """Test streaming a member of a log file."""
+        logfile, contents = self._create_logfile_with_contents()
+
+        response = self._get_with_params(
+            self.logfile_member_url,
+            {"id_logfile": logfile.id, "member": Dummy.DEFAULT_LOG_FILE_NAME},
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), contents)
+        self.assertEqual(response["Content-Length"], str(len(contents)))
+
+    def test_download_logfile_member_range(self):
+        """Test streaming a byte range of a member of a log file."""
+        logfile, contents = self._create_logfile_with_contents()
+
+        response = self._get_with_params(
+            self.logfile_member_url,
+            {"id_logfile": logfile.id, "member": Dummy.DEFAULT_LOG_FILE_NAME},
+            HTTP_RANGE="bytes=-10",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b"".join(response.streaming_content), contents[-10:])
+        self.assertEqual(
+            response["Content-Range"],
+            "bytes {}-{}/{}".format(
+                len(contents) - 10, len(contents) - 1, len(contents)
+            ),
+        )
+
+    def test_download_logfile_member_unsatisfiable_range(self):
+        """Test requesting a byte range after the end of a member."""
+        logfile, contents = self._create_logfile_with_contents()
+
+        response = self._get_with_params(
+            self.logfile_member_url,
+            {"id_logfile": logfile.id, "member": Dummy.DEFAULT_LOG_FILE_NAME},
+            HTTP_RANGE="bytes={}-".format(len(contents)),
+        )
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+        )
+
+    def test_download_non_existing_logfile_member(self):
+        """Test streaming a member that does not exist."""
+        logfile, _ = self._create_logfile_with_contents()
+
+        response = self._get_with_params(
+            self.logfile_member_url,
+            {"id_logfile": logfile.id, "member": "does_not_exist"},
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_preview_logfile_member(self):
+        """Test getting the beginning and the end of a log file member."""
+        logfile, contents = self._create_logfile_with_contents()
+
+        response = self._get_with_params(
+            self.logfile_preview_url,
+            {"id_logfile": logfile.id, "member": Dummy.DEFAULT_LOG_FILE_NAME},
+            data={"bytes": 10},
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["size"], len(contents))
+        self.assertEqual(response.data["head"], contents[:10].decode())
+        self.assertEqual(response.data["tail"], contents[-10:].decode())
+        self.assertTrue(response.data["truncated"])
+
+    def test_download_raw_logfile(self):
+        """Test downloading the zip file of a log file."""
+        logfile, _ = self._create_logfile_with_contents()
+
+        response = self._get_with_params(
+            self.logfile_raw_url, {"id_logfile": logfile.id}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with open(logfile.logfile.path, "rb") as stored_file:
+            self.assertEqual(
+                b"".join(response.streaming_content), stored_file.read()
+            )
+        self.assertEqual(
+            response["Content-Length"],
+            str(os.path.getsize(logfile.logfile.path)),
+        )
+
+    @override_settings(
+        HICCUP_LOGFILE_SENDFILE_HEADER="X-Accel-Redirect",
+        HICCUP_LOGFILE_SENDFILE_PREFIX="/protected/",
+    )
+    def test_download_raw_logfile_accel_redirect(self):
+        """Test that nginx is told to send the zip file of a log file."""
+        logfile, _ = self._create_logfile_with_contents()
+
+        response = self._get_with_params(
+            self.logfile_raw_url, {"id_logfile": logfile.id}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response["X-Accel-Redirect"],
+            "/protected/" + Dummy.DEFAULT_LOG_FILE_FILENAMES[0],
+        )
+        self.assertEqual(response.content, b"")
+
+    @override_settings(HICCUP_LOGFILE_SENDFILE_HEADER="X-Sendfile")
+    def test_download_raw_logfile_sendfile(self):
+        """Test that the web server is told to send the zip file."""
+        logfile, _ = self._create_logfile_with_contents()
+
+        response = self._get_with_params(
+            self.logfile_raw_url, {"id_logfile": logfile.id}
+        )
+
+        self.assertEqual(response["X-Sendfile"], logfile.logfile.path)
+
+    def test_search_logfiles(self):
+        """Test searching crash reports by the contents of log files."""
+        device = Dummy.create_device(Dummy.create_user())
+        crashreports = [
+            Dummy.create_report(
+                Crashreport,
+                device,
+                date=report_date,
+                build_fingerprint=build_fingerprint,
+            )
+            for report_date, build_fingerprint in zip(
+                Dummy.DATES[:2], Dummy.BUILD_FINGERPRINTS[:2]
+            )
+        ]
+        for crashreport in crashreports:
+            logfile_search.index_logfile(Dummy.create_log_file(crashreport))
+
+        response = self.fp_staff_client.get(
+            reverse(self.logfile_search_url),
+            {
+                "q": "Kernel MPM Clock frequency",
+                "build_fingerprint": Dummy.BUILD_FINGERPRINTS[1],
+            },
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 1)
+        self.assertEqual(
+            response.data["results"][0]["device_local_id"],
+            crashreports[1].device_local_id,
+        )
+
+    def test_search_logfiles_without_text(self):
+        """Test that a text to search for is required."""
+        response = self.fp_staff_client.get(reverse(self.logfile_search_url))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
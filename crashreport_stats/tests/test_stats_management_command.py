@@ -5,14 +5,17 @@ from datetime import datetime, timedelta
 import pytz
 
 from django.core.management import call_command
-from django.test import TestCase
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase
 
+from crashreport_stats.management.commands.stats import Command
 from crashreport_stats.models import (
     Version,
     VersionDaily,
     RadioVersion,
     RadioVersionDaily,
     StatsMetadata,
+    StatsRebuildCheckpoint,
 )
 from crashreport_stats.tests.utils import Dummy
 
@@ -688,6 +691,161 @@ class StatsCommandVersionsTestCase(TestCase):
             Crashreport
         )
 
+    def test_all_counters_of_a_day_are_counted(self):
+        """Test counting reports of all counters on the same day."""
+        device = Dummy.create_device(Dummy.create_user())
+        boot_reasons = [
+            Crashreport.BOOT_REASON_UNKOWN,
+            Crashreport.BOOT_REASON_KEYBOARD_POWER_ON,
+            Crashreport.BOOT_REASON_RTC_ALARM,
+            "random boot reason",
+        ]
+        report_date = datetime(2018, 3, 19, 12, tzinfo=pytz.utc)
+        for i, boot_reason in enumerate(boot_reasons):
+            Dummy.create_report(
+                Crashreport,
+                device=device,
+                date=report_date + timedelta(minutes=i),
+                boot_reason=boot_reason,
+            )
+        Dummy.create_report(HeartBeat, device=device)
+
+        call_command("stats", "update")
+
+        version = self.version_class.objects.get()
+        daily_version = version.daily_stats.get()
+        for stats in [version, daily_version]:
+            self.assertEqual(stats.heartbeats, 1)
+            self.assertEqual(stats.prob_crashes, 2)
+            self.assertEqual(stats.smpl, 1)
+            self.assertEqual(stats.other, 1)
+
+
+class StatsCommandJobsTestCase(TransactionTestCase):
+    """Test updating the stats with worker processes."""
+
+    def test_update_with_jobs(self):
+        """Test that all stats are updated by the worker processes."""
+        device = Dummy.create_device(Dummy.create_user())
+        Dummy.create_report(HeartBeat, device)
+        Dummy.create_report(
+            Crashreport, device, boot_reason=Crashreport.BOOT_REASON_UNKOWN
+        )
+
+        call_command("stats", "update", jobs=2)
+
+        for version_class in [Version, RadioVersion]:
+            version = version_class.objects.get()
+            self.assertEqual(version.heartbeats, 1)
+            self.assertEqual(version.prob_crashes, 1)
+        self.assertTrue(StatsMetadata.objects.exists())
+
+
+class StatsCommandWatchTestCase(TestCase):
+    """Test updating the stats continuously with the watch action."""
+
+    def test_watch_updates_stats_until_stopped(self):
+        """Test that the stats are updated before the command is stopped."""
+        device = Dummy.create_device(Dummy.create_user())
+        Dummy.create_report(HeartBeat, device)
+        command = Command()
+        # The command still updates the stats once before it stops
+        command.stopped.set()
+
+        call_command(command, "watch", interval=0)
+
+        self.assertEqual(Version.objects.get().heartbeats, 1)
+        self.assertTrue(StatsMetadata.objects.exists())
+
+    def test_committed_units_are_not_counted_again(self):
+        """Test that retrying a failed update counts each report once."""
+        device = Dummy.create_device(Dummy.create_user())
+        Dummy.create_report(HeartBeat, device)
+        call_command("stats", "update")
+        # The stats metadata is not saved if any unit of the update fails
+        StatsMetadata.objects.all().delete()
+
+        call_command("stats", "update")
+
+        self.assertEqual(Version.objects.get().heartbeats, 1)
+        self.assertEqual(VersionDaily.objects.get().heartbeats, 1)
+
+    def test_only_latest_update_is_kept(self):
+        """Test that repeated updates keep a single stats metadata row."""
+        for _ in range(3):
+            call_command("stats", "update")
+
+        self.assertEqual(StatsMetadata.objects.count(), 1)
+
+
+class StatsCommandRebuildTestCase(TestCase):
+    """Test rebuilding the stats in windows of the report creation time."""
+
+    def setUp(self):
+        """Create heartbeats created on different days."""
+        self.device = Dummy.create_device(Dummy.create_user())
+        self.now = datetime.now(tz=pytz.utc)
+        for days_ago in [30, 20, 10]:
+            self._create_heartbeat(self.now - timedelta(days=days_ago))
+
+    def _create_heartbeat(self, created_at):
+        heartbeat = Dummy.create_report(
+            HeartBeat, self.device, date=created_at.date()
+        )
+        HeartBeat.objects.filter(id=heartbeat.id).update(created_at=created_at)
+
+    def test_reset_counts_reports_of_all_windows(self):
+        """Test that the reports of all windows are counted once."""
+        call_command("stats", "reset", window_days=1)
+
+        self.assertEqual(Version.objects.get().heartbeats, 3)
+        self.assertEqual(VersionDaily.objects.count(), 3)
+        self.assertFalse(StatsRebuildCheckpoint.objects.exists())
+        self.assertTrue(StatsMetadata.objects.exists())
+
+    def test_reset_resumes_interrupted_rebuild(self):
+        """Test that an interrupted rebuild resumes after its checkpoint."""
+        call_command("stats", "reset")
+        # Interrupt the rebuild after counting the existing reports
+        StatsMetadata.objects.all().delete()
+        for index in range(len(Command.stats_units())):
+            StatsRebuildCheckpoint.objects.create(
+                unit=index,
+                up_to=self.now + timedelta(days=2),
+                counted_up_to=self.now,
+            )
+        self._create_heartbeat(self.now + timedelta(days=1))
+
+        call_command("stats", "reset", window_days=1)
+
+        self.assertEqual(Version.objects.get().heartbeats, 4)
+        self.assertFalse(StatsRebuildCheckpoint.objects.exists())
+        self.assertEqual(
+            StatsMetadata.objects.get().updated_at,
+            self.now + timedelta(days=2),
+        )
+
+    def test_reset_without_units(self):
+        """Test that a rebuild without any unit of work completes."""
+
+        class CommandWithoutEngines(Command):
+            """The stats command without any stats engine."""
+
+            _STATS_MODELS_ENGINES = []
+
+        call_command(CommandWithoutEngines(), "reset", jobs=2)
+
+        self.assertFalse(StatsRebuildCheckpoint.objects.exists())
+        self.assertTrue(StatsMetadata.objects.exists())
+
+    def test_update_during_rebuild_fails(self):
+        """Test that the stats are not updated while they are rebuilt."""
+        StatsRebuildCheckpoint.objects.create(unit=0, up_to=self.now)
+
+        with self.assertRaises(CommandError):
+            call_command("stats", "update")
+        self.assertFalse(Version.objects.exists())
+
 
 # pylint: disable=too-many-ancestors
 class StatsCommandRadioVersionsTestCase(StatsCommandVersionsTestCase):
@@ -773,3 +931,27 @@ class CommandDebugOutputTestCase(TestCase):
         self._assert_command_output_matches(
             "reset", 1, ["deleted"], self._ALL_MODELS
         )
+
+    def _get_command_output(self, command):
+        buffer = StringIO()
+        call_command("stats", command, *self._CMD_ARGS, stdout=buffer)
+        return buffer.getvalue().splitlines()
+
+    def test_update_command_counts_created_and_updated_entries(self):
+        """Test the created and updated entries reported by the update."""
+        device = Dummy.create_device(Dummy.create_user())
+        for report_date in Dummy.DATES[:2]:
+            Dummy.create_report(HeartBeat, device, date=report_date)
+
+        output = self._get_command_output("update")
+        # The general stats are counted once per version and report day
+        self.assertIn("1 Version created for counter heartbeats", output)
+        self.assertIn("1 Version updated for counter heartbeats", output)
+        self.assertIn("2 VersionDaily created for counter heartbeats", output)
+
+        Dummy.create_report(HeartBeat, device, date=Dummy.DATES[2])
+
+        output = self._get_command_output("update")
+        self.assertIn("1 Version updated for counter heartbeats", output)
+        self.assertIn("1 VersionDaily created for counter heartbeats", output)
+        self.assertIn("0 VersionDaily updated for counter heartbeats", output)
@@ -38,6 +38,31 @@ urlpatterns = [
         rest_endpoints.LogFileDownload.as_view(),
         name="hiccup_stats_api_v1_logfile_download",
     ),
+    url(
+        r"^api/v1/logfile_raw/(?P<id_logfile>[0-9]+)/$",
+        rest_endpoints.LogFileRawDownload.as_view(),
+        name="hiccup_stats_api_v1_logfile_raw",
+    ),
+    url(
+        r"^api/v1/logfile_members/(?P<id_logfile>[0-9]+)/$",
+        rest_endpoints.LogFileMembers.as_view(),
+        name="hiccup_stats_api_v1_logfile_members",
+    ),
+    url(
+        r"^api/v1/logfile_member/(?P<id_logfile>[0-9]+)/(?P<member>.+)$",
+        rest_endpoints.LogFileMemberDownload.as_view(),
+        name="hiccup_stats_api_v1_logfile_member",
+    ),
+    url(
+        r"^api/v1/logfile_preview/(?P<id_logfile>[0-9]+)/(?P<member>.+)$",
+        rest_endpoints.LogFileMemberPreview.as_view(),
+        name="hiccup_stats_api_v1_logfile_preview",
+    ),
+    url(
+        r"^api/v1/logfile_search/$",
+        rest_endpoints.LogFileSearchView.as_view(),
+        name="hiccup_stats_api_v1_logfile_search",
+    ),
     # Version statistics API
     url(
         r"^api/v1/versions/$",
@@ -59,10 +84,20 @@ urlpatterns = [
         rest_endpoints.RadioVersionDailyListView.as_view(),
         name="hiccup_stats_api_v1_radio_version_daily",
     ),
+    url(
+        r"^api/v1/crash_signatures/$",
+        rest_endpoints.CrashSignatureListView.as_view(),
+        name="hiccup_stats_api_v1_crash_signatures",
+    ),
     # General statistics API
     url(
         r"^api/v1/status/$",
         rest_endpoints.Status.as_view(),
         name="hiccup_stats_api_v1_status",
     ),
+    url(
+        r"^api/v1/metrics/$",
+        rest_endpoints.Metrics.as_view(),
+        name="hiccup_stats_api_v1_metrics",
+    ),
 ]
@@ -1 +1,3 @@
 """Hiccup crashreports application."""
+
+default_app_config = "crashreports.apps.CrashreportsConfig"
@@ -2,6 +2,7 @@
 
 from django.contrib import admin
 from crashreports.models import Crashreport
+from crashreports.models import CrashSignature
 from crashreports.models import Device
 from crashreports.models import HeartBeat
 from crashreports.models import LogFile
@@ -10,3 +11,4 @@ admin.site.register(Crashreport)
 admin.site.register(HeartBeat)
 admin.site.register(LogFile)
 admin.site.register(Device)
+admin.site.register(CrashSignature)
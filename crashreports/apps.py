@@ -0,0 +1,13 @@
+"""Configuration of the Hiccup crashreports application."""
+from django.apps import AppConfig
+
+
+class CrashreportsConfig(AppConfig):
+    """Configuration of the Hiccup crashreports application."""
+
+    name = "crashreports"
+
+    def ready(self):
+        """Connect the signal receivers of the application."""
+        # pylint: disable=unused-import
+        import crashreports.authentication  # noqa: F401
@@ -0,0 +1,540 @@
+"""Archival of old heartbeats and crash reports.
+
+Reports are archived per month of their date. The heartbeats, crash reports
+and log file entries of a month are written to a gzip-compressed archive
+file with one JSON record per line, followed by a manifest with the number of
+records per type and the SHA-256 checksum of the archive. The log files
+themselves are copied to the archive directory. Only after the archive has
+been written and verified, the archived rows are deleted from the database
+in chunks. The rows are deleted with plain SQL statements, so no instances
+are loaded into memory and no signals are sent. The copied log files are
+deleted once their rows have been deleted.
+
+Months are only archived once they are complete and older than the
+retention period. Only reports created until a given time are archived. The
+`archive_reports` management command passes the time until which reports
+have been counted in the stats, so the stats models stay complete. Running
+`stats reset` after archiving reports drops the counts of the archived
+reports, though.
+
+Reports that are stored after their month has been archived, for example
+because a device sent them late, are archived to an additional part of the
+month by the next run.
+
+An archived month can be restored. Restored reports keep their IDs and
+local IDs. They are not counted in the stats again.
+"""
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+from collections import Counter, OrderedDict
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Min
+from django.utils import timezone
+from taggit.models import TaggedItem
+
+from crashreports import partitioning
+from crashreports.models import (
+    Crashreport,
+    Device,
+    HeartBeat,
+    LogFile,
+    delete_unreferenced_logfile,
+    delete_unreferenced_text,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+ARCHIVE_FORMAT_VERSION = 1
+
+ARCHIVE_FILE_EXTENSION = ".jsonl.gz"
+MANIFEST_FILE_EXTENSION = ".manifest.json"
+LOGFILES_DIRECTORY = "logfiles"
+
+# The order in which the reports are archived and deleted. Log files are
+# deleted before the crash reports they belong to.
+REPORT_TYPES = OrderedDict(
+    [
+        ("heartbeat", HeartBeat),
+        ("logfile", LogFile),
+        ("crashreport", Crashreport),
+    ]
+)
+
+_READ_BLOCK_SIZE = 1024 * 1024
+
+
+class ArchiveError(Exception):
+    """An archive is invalid or does not match its manifest."""
+
+
+def get_archivable_months(older_than):
+    """Get the months that are complete and older than the given date.
+
+    Args:
+        older_than: The date before which the months have to end.
+
+    Returns: The first day of each month that contains any reports.
+
+    """
+    first_dates = [
+        report_type.objects.aggregate(Min("date"))["date__min"]
+        for report_type in (HeartBeat, Crashreport)
+    ]
+    first_dates = [
+        date.date() if isinstance(date, datetime.datetime) else date
+        for date in first_dates
+        if date is not None
+    ]
+    if not first_dates:
+        return []
+    months = []
+    month = partitioning.month_start(min(first_dates))
+    while partitioning.next_month(month) <= older_than:
+        months.append(month)
+        month = partitioning.next_month(month)
+    return months
+
+
+def _month_filter(report_type, month):
+    """Get the lookups selecting the reports of a month."""
+    prefix = "crashreport__" if report_type == LogFile else ""
+    model = Crashreport if report_type == LogFile else report_type
+    return {
+        prefix + "date__gte": partitioning.month_bound_value(model, month),
+        prefix + "date__lt": partitioning.month_bound_value(
+            model, partitioning.next_month(month)
+        ),
+    }
+
+
+def _iter_rows(report_type, month, counted_until, chunk_size):
+    """Iterate over chunks of the rows of a month, ordered by ID.
+
+    Each chunk is queried separately, so no long-running transaction or
+    cursor is needed.
+
+    Yields: Lists of the field values of the rows.
+
+    """
+    # pylint: disable=protected-access
+    fields = [field.attname for field in report_type._meta.concrete_fields]
+    prefix = "crashreport__" if report_type == LogFile else ""
+    queryset = report_type.objects.filter(
+        **_month_filter(report_type, month),
+        **{prefix + "created_at__lte": counted_until}
+    ).order_by("id")
+    last_id = 0
+    while True:
+        rows = list(
+            queryset.filter(id__gt=last_id).values(*fields)[:chunk_size]
+        )
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]["id"]
+
+
+def _get_tags(crashreport_ids):
+    """Get the tag names per crash report ID."""
+    tags = {}
+    for object_id, name in TaggedItem.objects.filter(
+        content_type=ContentType.objects.get_for_model(Crashreport),
+        object_id__in=crashreport_ids,
+    ).values_list("object_id", "tag__name"):
+        tags.setdefault(object_id, []).append(name)
+    return tags
+
+
+def _get_logfile_storage():
+    # pylint: disable=protected-access
+    return LogFile._meta.get_field("logfile").storage
+
+
+def _get_archived_logfile_path(archive_dir, name):
+    return os.path.join(archive_dir, LOGFILES_DIRECTORY, name.lstrip(os.sep))
+
+
+def _copy_logfile(name, archive_dir):
+    """Copy a log file to the archive directory.
+
+    Returns: True if the file has been copied, False if it is missing.
+
+    """
+    source = _get_logfile_storage().path(name)
+    if not os.path.isfile(source):
+        LOGGER.warning("Log file %s to archive is missing.", source)
+        return False
+    target = _get_archived_logfile_path(archive_dir, name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.copy2(source, target)
+    return True
+
+
+def _records(month, counted_until, chunk_size, archive_dir):
+    """Iterate over the archive records of the reports of a month."""
+    for type_name, report_type in REPORT_TYPES.items():
+        for rows in _iter_rows(report_type, month, counted_until, chunk_size):
+            tags = {}
+            if report_type == Crashreport:
+                tags = _get_tags([row["id"] for row in rows])
+            for row in rows:
+                record = {"type": type_name, "data": row}
+                if report_type == Crashreport:
+                    record["tags"] = tags.get(row["id"], [])
+                elif report_type == LogFile and row["logfile"]:
+                    record["file"] = _copy_logfile(row["logfile"], archive_dir)
+                yield record
+
+
+def _get_archive_path(archive_dir, month, part):
+    return os.path.join(
+        archive_dir,
+        "reports-{:%Y-%m}{}{}".format(
+            month, ".{}".format(part) if part else "", ARCHIVE_FILE_EXTENSION
+        ),
+    )
+
+
+def _get_manifest_path(archive_path):
+    end = -len(ARCHIVE_FILE_EXTENSION)
+    return archive_path[:end] + MANIFEST_FILE_EXTENSION
+
+
+def _sha256(path):
+    checksum = hashlib.sha256()
+    with open(path, "rb") as archive_file:
+        for block in iter(lambda: archive_file.read(_READ_BLOCK_SIZE), b""):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+
+def get_archives(archive_dir, month):
+    """Get the archives of all parts of a month.
+
+    Args:
+        archive_dir: The archive directory.
+        month: The first day of the month.
+
+    Returns: A list of the path and the manifest of each archive.
+
+    """
+    archives = []
+    part = 0
+    while True:
+        path = _get_archive_path(archive_dir, month, part)
+        try:
+            with open(_get_manifest_path(path)) as manifest_file:
+                archives.append((path, json.load(manifest_file)))
+        except FileNotFoundError:
+            return archives
+        part += 1
+
+
+def _read_records(path):
+    with gzip.open(path, "rt") as archive_file:
+        for line in archive_file:
+            yield json.loads(line)
+
+
+def verify(path, manifest):
+    """Verify that an archive matches its manifest.
+
+    Args:
+        path: The path of the archive.
+        manifest: The manifest of the archive.
+
+    Raises:
+        ArchiveError: If the checksum or the number of records differ.
+
+    """
+    if manifest["format_version"] != ARCHIVE_FORMAT_VERSION:
+        raise ArchiveError("Unsupported format version of {}.".format(path))
+    if _sha256(path) != manifest["sha256"]:
+        raise ArchiveError("Checksum mismatch of {}.".format(path))
+    try:
+        counts = Counter(record["type"] for record in _read_records(path))
+    except (OSError, EOFError, ValueError, KeyError):
+        raise ArchiveError("Could not read {}.".format(path))
+    if counts != Counter(manifest["counts"]):
+        raise ArchiveError("Record count mismatch of {}.".format(path))
+
+
+def _write_archive(path, month, counted_until, chunk_size):
+    """Write the archive of a month and its manifest.
+
+    Returns: The manifest, or None if there is nothing to archive.
+
+    """
+    archive_dir = os.path.dirname(path)
+    counts = Counter()
+    temp_path = path + ".tmp"
+    with gzip.open(temp_path, "wt") as archive_file:
+        for record in _records(month, counted_until, chunk_size, archive_dir):
+            archive_file.write(json.dumps(record, cls=DjangoJSONEncoder))
+            archive_file.write("\n")
+            counts[record["type"]] += 1
+    if not counts:
+        os.remove(temp_path)
+        return None
+
+    with open(temp_path, "rb") as archive_file:
+        os.fsync(archive_file.fileno())
+    os.replace(temp_path, path)
+    manifest = {
+        "format_version": ARCHIVE_FORMAT_VERSION,
+        "month": "{:%Y-%m}".format(month),
+        "archive": os.path.basename(path),
+        "sha256": _sha256(path),
+        "size": os.path.getsize(path),
+        "counts": dict(counts),
+        "counted_until": counted_until.isoformat(),
+        "archived_at": timezone.now().isoformat(),
+    }
+    manifest_path = _get_manifest_path(path)
+    with open(manifest_path + ".tmp", "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+        manifest_file.flush()
+        os.fsync(manifest_file.fileno())
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return manifest
+
+
+def _delete_rows(report_type, ids, month):
+    """Delete rows of a month by ID without loading or signalling them.
+
+    Returns: The number of deleted rows.
+
+    """
+    # pylint: disable=protected-access
+    quote_name = connection.ops.quote_name
+    params = [ids]
+    month_condition = ""
+    if report_type != LogFile:
+        month_condition = " AND {date} >= %s AND {date} < %s".format(
+            date=quote_name(report_type._meta.get_field("date").column)
+        )
+        params += [
+            partitioning.month_bound_value(report_type, month),
+            partitioning.month_bound_value(
+                report_type, partitioning.next_month(month)
+            ),
+        ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM {} WHERE id = ANY(%s){}".format(
+                quote_name(report_type._meta.db_table), month_condition
+            ),
+            params,
+        )
+        return cursor.rowcount
+
+
+def _delete_chunk(type_name, records, month):
+    """Delete the rows of a chunk of archived records of one type."""
+    report_type = REPORT_TYPES[type_name]
+    ids = [record["data"]["id"] for record in records]
+    with transaction.atomic():
+        if report_type == Crashreport:
+            TaggedItem.objects.filter(
+                content_type=ContentType.objects.get_for_model(Crashreport),
+                object_id__in=ids,
+            ).delete()
+        deleted = _delete_rows(report_type, ids, month)
+        if report_type == LogFile:
+            # The indexed texts are shared with other log files
+            for sha256 in {record["data"].get("sha256") for record in records}:
+                if sha256:
+                    delete_unreferenced_text(sha256)
+    if report_type == LogFile:
+        # Files with identical content are shared with other log files
+        for record in records:
+            if record.get("file"):
+                delete_unreferenced_logfile(record["data"]["logfile"])
+    return deleted
+
+
+def _delete_archived(path, month, chunk_size):
+    """Delete the rows of all records of an archive from the database."""
+    deleted = Counter()
+    chunk = []
+    for record in _read_records(path):
+        if chunk and (
+            chunk[0]["type"] != record["type"] or len(chunk) >= chunk_size
+        ):
+            deleted[chunk[0]["type"]] += _delete_chunk(
+                chunk[0]["type"], chunk, month
+            )
+            chunk = []
+        chunk.append(record)
+    if chunk:
+        deleted[chunk[0]["type"]] += _delete_chunk(
+            chunk[0]["type"], chunk, month
+        )
+    return deleted
+
+
+def archive_month(archive_dir, month, counted_until, chunk_size=5000):
+    """Archive the reports of a month and delete them from the database.
+
+    Args:
+        archive_dir: The directory to store the archive in.
+        month: The first day of the month.
+        counted_until: Only reports created until this time are archived.
+        chunk_size: The maximum number of rows read or deleted at once.
+
+    Returns:
+        The path of the created archive and the number of deleted rows per
+        report type, or None and an empty counter if there was nothing to
+        archive.
+
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    path = _get_archive_path(
+        archive_dir, month, len(get_archives(archive_dir, month))
+    )
+    manifest = _write_archive(path, month, counted_until, chunk_size)
+    if manifest is None:
+        return None, Counter()
+    verify(path, manifest)
+    deleted = _delete_archived(path, month, chunk_size)
+
+    for report_type in (HeartBeat, Crashreport):
+        if partitioning.is_partitioned(report_type):
+            partitioning.drop_partition_if_empty(report_type, month)
+    return path, deleted
+
+
+def _insert_rows(model, rows):
+    """Insert rows with their IDs, ignoring rows that already exist.
+
+    Returns: The IDs of the inserted rows.
+
+    """
+    # pylint: disable=protected-access
+    quote_name = connection.ops.quote_name
+    fields = model._meta.concrete_fields
+    values = []
+    for data in rows:
+        # Fields added after the archive was written get their default
+        values.extend(
+            field.get_db_prep_save(
+                field.to_python(data[field.attname])
+                if field.attname in data
+                else field.get_default(),
+                connection,
+            )
+            for field in fields
+        )
+    row = "({})".format(", ".join(["%s"] * len(fields)))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO {table} ({columns}) VALUES {rows} "
+            "ON CONFLICT DO NOTHING RETURNING {pk}".format(
+                table=quote_name(model._meta.db_table),
+                columns=", ".join(quote_name(field.column) for field in fields),
+                rows=", ".join([row] * len(rows)),
+                pk=quote_name(model._meta.pk.column),
+            ),
+            values,
+        )
+        return {pk for pk, in cursor.fetchall()}
+
+
+def _restore_chunk(archive_dir, type_name, records):
+    """Restore a chunk of archived records of one type.
+
+    Reports of deleted devices and log files of missing crash reports are
+    skipped.
+
+    Returns: The number of restored rows.
+
+    """
+    report_type = REPORT_TYPES[type_name]
+    if report_type == LogFile:
+        parent_model, parent_field = Crashreport, "crashreport_id"
+    else:
+        parent_model, parent_field = Device, "device_id"
+    existing = set(
+        parent_model.objects.filter(
+            id__in={record["data"][parent_field] for record in records}
+        ).values_list("id", flat=True)
+    )
+    records = [
+        record
+        for record in records
+        if record["data"][parent_field] in existing
+    ]
+    if not records:
+        return 0
+
+    with transaction.atomic():
+        inserted = _insert_rows(
+            report_type, [record["data"] for record in records]
+        )
+        for record in records:
+            if record["data"]["id"] not in inserted:
+                continue
+            if record.get("tags"):
+                Crashreport.objects.get(id=record["data"]["id"]).tags.add(
+                    *record["tags"]
+                )
+            if record.get("file"):
+                name = record["data"]["logfile"]
+                target = _get_logfile_storage().path(name)
+                if os.path.isfile(target):
+                    # Shared with a log file that has not been archived
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copy2(
+                    _get_archived_logfile_path(archive_dir, name), target
+                )
+    return len(inserted)
+
+
+def restore_month(archive_dir, month, chunk_size=5000):
+    """Restore the archived reports of a month into the database.
+
+    Reports that are already stored are skipped, so a month can be restored
+    repeatedly. The archives are kept.
+
+    Args:
+        archive_dir: The archive directory.
+        month: The first day of the month.
+        chunk_size: The maximum number of rows inserted at once.
+
+    Returns: The number of restored rows per report type.
+
+    Raises:
+        ArchiveError: If an archive does not match its manifest.
+
+    """
+    restored = Counter()
+    for path, manifest in get_archives(archive_dir, month):
+        verify(path, manifest)
+        # Restore the crash reports before their log files
+        for type_names in (("heartbeat", "crashreport"), ("logfile",)):
+            chunks = {type_name: [] for type_name in type_names}
+            for record in _read_records(path):
+                chunk = chunks.get(record["type"])
+                if chunk is None:
+                    continue
+                chunk.append(record)
+                if len(chunk) >= chunk_size:
+                    restored[record["type"]] += _restore_chunk(
+                        archive_dir, record["type"], chunk
+                    )
+                    chunk.clear()
+            for type_name, chunk in chunks.items():
+                if chunk:
+                    restored[type_name] += _restore_chunk(
+                        archive_dir, type_name, chunk
+                    )
+    return restored
@@ -0,0 +1,267 @@
+"""Cached token authentication for requests sent by devices.
+
+Every request sent by a device is authenticated with its token. Resolving the
+token to its user, checking the permissions of that user and looking up the
+device of the user take several queries per request although the results
+hardly ever change. `CachedTokenAuthentication` caches these details per
+token across requests.
+
+By default, the details are cached in an in-process LRU cache. The entries
+expire after `HICCUP_AUTH_CACHE_TIMEOUT` seconds since changes made by other
+processes can not invalidate them. Setting `HICCUP_AUTH_CACHE_ALIAS` to the
+alias of a cache from the `CACHES` setting uses that cache instead. When that
+cache is shared between processes, invalidations are visible to all of them.
+
+Cached entries are invalidated whenever the involved token, user, device or
+staff group membership is changed or deleted.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import signals
+from django.dispatch import receiver
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from crashreports.models import Device
+from crashreports.permissions import (
+    cache_authorization_details,
+    get_owned_device,
+    user_is_hiccup_staff,
+)
+
+_CACHE_KEY_PREFIX = "hiccup-auth-token:"
+
+
+class _LocalLRUCache:
+    """A thread-safe in-process LRU cache with expiring entries.
+
+    The cache implements the subset of the Django cache API that is used for
+    caching the token details.
+    """
+
+    def __init__(self, max_size, timeout):
+        """Initialise the cache.
+
+        Args:
+            max_size: The maximum number of entries.
+            timeout: The number of seconds after which entries expire.
+
+        """
+        self.max_size = max_size
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Get the value of an entry or None if it is missing or expired."""
+        with self._lock:
+            try:
+                expires_at, value = self._entries[key]
+            except KeyError:
+                return None
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Set the value of an entry, evicting the least recently used one."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        """Delete the given entries."""
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        """Delete all entries."""
+        with self._lock:
+            self._entries.clear()
+
+
+_LOCAL_CACHE = None
+_LOCAL_CACHE_LOCK = threading.Lock()
+
+
+def _get_cache():
+    """Get the cache for the token details as configured in the settings."""
+    # pylint: disable=global-statement
+    global _LOCAL_CACHE
+
+    if settings.HICCUP_AUTH_CACHE_ALIAS:
+        return caches[settings.HICCUP_AUTH_CACHE_ALIAS]
+    with _LOCAL_CACHE_LOCK:
+        if _LOCAL_CACHE is None:
+            _LOCAL_CACHE = _LocalLRUCache(
+                settings.HICCUP_AUTH_CACHE_MAX_SIZE,
+                settings.HICCUP_AUTH_CACHE_TIMEOUT,
+            )
+        return _LOCAL_CACHE
+
+
+def _cache_key(token_key):
+    """Get the cache key for a token without exposing the token itself."""
+    return _CACHE_KEY_PREFIX + hashlib.sha256(token_key.encode()).hexdigest()
+
+
+def clear_cache():
+    """Delete all cached token details of the in-process cache."""
+    if not settings.HICCUP_AUTH_CACHE_ALIAS:
+        _get_cache().clear()
+
+
+def _field_values(instance, field_names=None):
+    """Get the values of the concrete fields of a model instance.
+
+    Args:
+        instance: The model instance.
+        field_names:
+            The attribute names of the fields to include. All fields are
+            included if omitted.
+
+    Returns:
+        The values per attribute name, in the order of the model fields.
+
+    """
+    # pylint: disable=protected-access
+    return {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields
+        if field_names is None or field.attname in field_names
+    }
+
+
+def _from_field_values(model, values):
+    """Create a model instance from values retrieved from the cache.
+
+    Fields that are missing from the values are deferred.
+    """
+    return model.from_db(DEFAULT_DB_ALIAS, list(values), list(values.values()))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication caching the details of a token across requests.
+
+    Besides the user of a token, the cache contains whether the user is part
+    of the Hiccup staff and the ID and UUID of the device owned by the user.
+    These details are made available to the permission checks so that they
+    do not have to be queried again.
+
+    Only plain field values are cached. Fresh user, token and device instances
+    are created from them for every request. The device instance only has its
+    ID, UUID and user loaded, all other fields are loaded on access.
+    """
+
+    def authenticate_credentials(self, key):
+        """Authenticate the given token, using cached details if possible."""
+        cache = _get_cache()
+        entry = cache.get(_cache_key(key))
+        if entry is None:
+            user, token = super(
+                CachedTokenAuthentication, self
+            ).authenticate_credentials(key)
+            device = get_owned_device(user)
+            entry = {
+                "user": _field_values(user),
+                "token": _field_values(token),
+                "is_hiccup_staff": user_is_hiccup_staff(user),
+                "device": None
+                if device is None
+                else _field_values(device, {"id", "uuid", "user_id"}),
+            }
+            cache.set(_cache_key(key), entry)
+            return user, token
+
+        user = _from_field_values(User, entry["user"])
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+        token = _from_field_values(Token, entry["token"])
+        token.user = user
+        device = None
+        if entry["device"] is not None:
+            device = _from_field_values(Device, entry["device"])
+            device.user = user
+        cache_authorization_details(user, entry["is_hiccup_staff"], device)
+        return user, token
+
+
+def invalidate_tokens(token_keys):
+    """Delete the cached details of the given tokens.
+
+    The entries are deleted immediately and once more after the current
+    transaction has been committed so that no concurrent request can cache
+    details that are about to be changed.
+    """
+    cache_keys = [_cache_key(token_key) for token_key in token_keys]
+    if not cache_keys:
+        return
+    _get_cache().delete_many(cache_keys)
+    transaction.on_commit(lambda: _get_cache().delete_many(cache_keys))
+
+
+def invalidate_users(user_ids):
+    """Delete the cached details of the tokens of the given users."""
+    invalidate_tokens(
+        Token.objects.filter(user_id__in=user_ids).values_list(
+            "key", flat=True
+        )
+    )
+
+
+@receiver(signals.post_save, sender=Token)
+@receiver(signals.post_delete, sender=Token)
+def _invalidate_token(sender, instance, **kwargs):
+    # pylint: disable=unused-argument
+    invalidate_tokens([instance.key])
+
+
+@receiver(signals.post_save, sender=User)
+@receiver(signals.post_delete, sender=User)
+def _invalidate_user(sender, instance, created=False, **kwargs):
+    # pylint: disable=unused-argument
+    # New users can not have a token yet.
+    if not created:
+        invalidate_users([instance.id])
+
+
+@receiver(signals.post_save, sender=Device)
+@receiver(signals.post_delete, sender=Device)
+def _invalidate_device(sender, instance, **kwargs):
+    # pylint: disable=unused-argument
+    invalidate_users([instance.user_id])
+
+
+@receiver(signals.m2m_changed, sender=User.groups.through)
+def _invalidate_group_members(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    # pylint: disable=unused-argument,too-many-arguments
+    if reverse and action == "pre_clear":
+        # The members are unknown once the group has been cleared
+        invalidate_users(instance.user_set.values_list("id", flat=True))
+    elif not reverse and action in ("post_add", "post_remove", "post_clear"):
+        invalidate_users([instance.id])
+    elif reverse and action in ("post_add", "post_remove"):
+        invalidate_users(pk_set)
+
+
+@receiver(signals.post_save, sender=Group)
+@receiver(signals.pre_delete, sender=Group)
+def _invalidate_group(sender, instance, created=False, **kwargs):
+    # pylint: disable=unused-argument
+    if not created:
+        invalidate_users(instance.user_set.values_list("id", flat=True))
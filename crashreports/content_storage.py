@@ -0,0 +1,101 @@
+"""Content-addressed storage of log files.
+
+Log files are stored under the SHA-256 checksum of their content, so that
+log files with identical content share a single file on disk. A stored file
+is referenced by the name of every log file instance with that content and
+is only deleted once no instance references it anymore.
+
+Adding a reference to a file and deleting an unreferenced file are
+serialised per file name with a transaction-level advisory lock, see
+`lock`. Otherwise, a file could be deleted right after a new upload found
+it to be stored already.
+"""
+import hashlib
+import os
+
+from django.conf import settings
+from django.db import connection
+
+CONTENT_DIRECTORY = "sha256"
+CONTENT_FILE_EXTENSION = ".zip"
+
+_READ_BLOCK_SIZE = 1024 * 1024
+
+
+def content_file_name(sha256):
+    """Get the storage name of a log file from its checksum.
+
+    The name is split up into directories by the first characters of the
+    checksum, so that the number of files in each directory does not get
+    too big.
+
+    Args:
+        sha256: The hex digest of the SHA-256 checksum of the file.
+
+    Returns: The name of the file relative to the storage location.
+
+    """
+    return os.path.join(
+        CONTENT_DIRECTORY,
+        sha256[0:2],
+        sha256[2:4],
+        sha256 + CONTENT_FILE_EXTENSION,
+    )
+
+
+def is_content_file_name(name):
+    """Check whether a storage name is content-addressed."""
+    return name.startswith(CONTENT_DIRECTORY + os.sep)
+
+
+def file_sha256(path):
+    """Compute the SHA-256 checksum of a file.
+
+    Args:
+        path: The path of the file.
+
+    Returns: The hex digest of the checksum.
+
+    """
+    checksum = hashlib.sha256()
+    with open(path, "rb") as stored_file:
+        for block in iter(lambda: stored_file.read(_READ_BLOCK_SIZE), b""):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+
+def lock(name):
+    """Lock a stored file name until the end of the current transaction.
+
+    Args:
+        name: The name of the stored file.
+
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [name])
+
+
+def add_file(storage, path, name):
+    """Add a file to the storage unless a file is stored under the name.
+
+    The file is hard-linked to its storage path, so it has to be on the same
+    file system as the storage location. The caller has to hold the lock of
+    the name, see `lock`.
+
+    Args:
+        storage: The file system storage of the log files.
+        path: The path of the file to add.
+        name: The content-addressed name to store the file under.
+
+    Returns: True if the file has been added, False if it was stored already.
+
+    """
+    target = storage.path(name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(path, target)
+    except FileExistsError:
+        return False
+    if settings.FILE_UPLOAD_PERMISSIONS is not None:
+        os.chmod(target, settings.FILE_UPLOAD_PERMISSIONS)
+    return True
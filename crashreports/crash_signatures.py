@@ -0,0 +1,160 @@
+"""Extraction of crash signatures from log files.
+
+A crash signature is a short normalised description of the cause of a crash
+found in the kernel log of a crash report, for example the function a kernel
+panic happened in or the failure reason reported by the modem. Crashes with
+the same cause on different devices have the same signature, so that they
+can be counted together.
+
+Numbers and addresses differ between crashes with the same cause, so they
+are replaced by placeholders. Signatures are looked up in the following
+order of precedence, from the most to the least specific cause, as a modem
+crash or a watchdog bite usually ends in a kernel panic as well:
+
+1. Modem crashes, with the failure reason reported by the modem subsystem.
+2. Watchdog bites and barks, soft and hard lockups.
+3. Kernel panics and oopses, with the function the program counter was in.
+
+Log files without any of these are given the `KIND_UNKNOWN` signature.
+"""
+import re
+import zipfile
+
+KIND_MODEM_CRASH = "modem_crash"
+KIND_WATCHDOG = "watchdog"
+KIND_KERNEL_PANIC = "kernel_panic"
+KIND_UNKNOWN = "unknown"
+
+MAX_SIGNATURE_LENGTH = 255
+
+_MAX_LINE_LENGTH = 64 * 2 ** 10
+
+_PATTERNS = {
+    name: re.compile(pattern, re.IGNORECASE)
+    for name, pattern in [
+        ("modem_reason", rb"modem subsystem failure reason:\s*(.+)"),
+        ("modem_crashed", rb"subsys-restart:.*(modem) crashed"),
+        ("soft_lockup", rb"BUG: (soft lockup) - CPU#\d+ stuck"),
+        ("hard_lockup", rb"Watchdog detected (hard LOCKUP)"),
+        ("watchdog_bite", rb"(watchdog bite)"),
+        ("watchdog_bark", rb"(watchdog bark)"),
+        ("oops", rb"Unable to handle kernel (.+?) at virtual address"),
+        ("internal_error", rb"Internal error: ([^\[]+)"),
+        ("bug", rb"kernel BUG at ([^!]+)"),
+        ("panic", rb"Kernel panic - not syncing: (.+)"),
+        ("program_counter", rb"PC is at ([\w.]+)"),
+    ]
+}
+_WATCHDOG_MATCHES = [
+    "soft_lockup",
+    "hard_lockup",
+    "watchdog_bite",
+    "watchdog_bark",
+]
+_KERNEL_PANIC_MATCHES = ["oops", "internal_error", "bug", "panic"]
+
+_ADDRESS_PATTERN = re.compile(r"\b(0x)?[0-9a-f]{8,}\b", re.IGNORECASE)
+_HEX_NUMBER_PATTERN = re.compile(r"\b0x[0-9a-f]+\b", re.IGNORECASE)
+_NUMBER_PATTERN = re.compile(r"\b\d+\b")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalise(text):
+    """Normalise the description of a crash cause.
+
+    Addresses and numbers are replaced by placeholders, whitespace is
+    collapsed and trailing punctuation is removed.
+
+    Args:
+        text: The description as found in the log.
+
+    Returns: The normalised description.
+
+    """
+    text = _ADDRESS_PATTERN.sub("<addr>", text)
+    text = _HEX_NUMBER_PATTERN.sub("<n>", text)
+    text = _NUMBER_PATTERN.sub("<n>", text)
+    return _WHITESPACE_PATTERN.sub(" ", text).strip(" .:!")
+
+
+def _find_first_matches(lines):
+    """Find the first match of each pattern in the lines of a log.
+
+    Returns: The decoded first group of the first match per pattern name.
+
+    """
+    matches = {}
+    for line in lines:
+        for name, pattern in _PATTERNS.items():
+            if name in matches:
+                continue
+            match = pattern.search(line)
+            if match:
+                matches[name] = match.group(1).decode("utf-8", "replace")
+        if len(matches) == len(_PATTERNS):
+            break
+    return matches
+
+
+def _with_program_counter(description, matches):
+    if "program_counter" in matches:
+        return "{} at {}".format(description, matches["program_counter"])
+    return description
+
+
+def _compose(matches):
+    """Compose the signature from the matches found in a log."""
+    if "modem_reason" in matches:
+        return KIND_MODEM_CRASH, matches["modem_reason"]
+    if "modem_crashed" in matches:
+        return KIND_MODEM_CRASH, "modem crashed"
+    for name in _WATCHDOG_MATCHES:
+        if name in matches:
+            return (
+                KIND_WATCHDOG,
+                _with_program_counter(matches[name].lower(), matches),
+            )
+    for name in _KERNEL_PANIC_MATCHES:
+        if name in matches:
+            return (
+                KIND_KERNEL_PANIC,
+                _with_program_counter(matches[name], matches),
+            )
+    return KIND_UNKNOWN, ""
+
+
+def parse_lines(lines):
+    """Get the crash signature of the lines of a log.
+
+    Args:
+        lines: An iterable of the lines of the log as bytes.
+
+    Returns: The kind and the normalised signature of the crash.
+
+    """
+    kind, signature = _compose(_find_first_matches(lines))
+    return kind, normalise(signature)[:MAX_SIGNATURE_LENGTH]
+
+
+def _iter_lines(zip_file):
+    for info in zip_file.infolist():
+        if info.is_dir():
+            continue
+        with zip_file.open(info) as member:
+            yield from iter(lambda: member.readline(_MAX_LINE_LENGTH), b"")
+
+
+def parse_logfile(path):
+    """Get the crash signature of a log file archive.
+
+    The members of the archive are read line by line, so that only a single
+    line is held in memory at once.
+
+    Args:
+        path: The path of the zip file.
+
+    Returns: The kind and the normalised signature of the crash.
+
+    """
+    with zipfile.ZipFile(path) as zip_file:
+        return parse_lines(_iter_lines(zip_file))
@@ -0,0 +1,165 @@
+"""Full-text search over the contents of log files.
+
+The text of the members of each log file archive is extracted once and
+stored in parts of at most `TEXT_PART_SIZE` bytes, split at line breaks,
+along with their PostgreSQL full-text search vectors. Log files with
+identical content share their indexed text, which is keyed by the SHA-256
+checksum of the archive.
+
+The search vectors only contain the words of the text without their
+positions, which keeps them well below the size limit of PostgreSQL. A
+search thus first finds the parts containing all words of the searched
+text through the index and then checks that the parts contain the searched
+text literally, ignoring the case. Texts spanning multiple lines cannot be
+found.
+"""
+import itertools
+import zipfile
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchVector,
+    SearchVectorField,
+)
+from django.db import transaction
+from django.db.models import Func
+
+from crashreports import content_storage
+from crashreports.models import LogFile, LogFileText
+
+SEARCH_CONFIG = "simple"
+TEXT_PART_SIZE = 256 * 2 ** 10
+
+_INSERT_BATCH_SIZE = 16
+
+
+def _iter_member_parts(member, part_size):
+    """Iterate over the parts of the content of a member.
+
+    Lines longer than the part size are split.
+
+    Yields: Tuples of the position of the part in bytes and its content.
+
+    """
+    position = size = 0
+    lines = []
+    for line in iter(lambda: member.readline(part_size), b""):
+        if lines and size + len(line) > part_size:
+            yield position, b"".join(lines)
+            position += size
+            lines, size = [], 0
+        lines.append(line)
+        size += len(line)
+    if lines:
+        yield position, b"".join(lines)
+
+
+def iter_text_parts(path, part_size=TEXT_PART_SIZE):
+    """Iterate over the text parts of the members of a log file archive.
+
+    The content is decoded as UTF-8, replacing invalid characters. Null
+    characters are dropped, as PostgreSQL cannot store them in texts.
+
+    Args:
+        path: The path of the zip file.
+        part_size: The maximum size of a part in bytes.
+
+    Yields: Tuples of the member name, the position of the part in bytes
+        and the text of the part.
+
+    """
+    with zipfile.ZipFile(path) as zip_file:
+        for info in zip_file.infolist():
+            if info.is_dir():
+                continue
+            with zip_file.open(info) as member:
+                for position, content in _iter_member_parts(member, part_size):
+                    yield (
+                        info.filename,
+                        position,
+                        content.decode("utf-8", "replace").replace("\x00", ""),
+                    )
+
+
+def _search_vector():
+    """Get the search vector of the text of a part without positions."""
+    return Func(
+        SearchVector("text", config=SEARCH_CONFIG),
+        function="strip",
+        output_field=SearchVectorField(),
+    )
+
+
+def index_logfile(logfile):
+    """Extract and index the text of a log file.
+
+    Nothing is done if a log file with the same content has been indexed
+    already. The checksum of log files uploaded before it was computed on
+    upload is stored along the way.
+
+    Args:
+        logfile: The log file to index.
+
+    Returns: True if the text has been indexed, False if it was indexed
+        already.
+
+    """
+    path = logfile.logfile.path
+    if not logfile.sha256:
+        logfile.sha256 = content_storage.file_sha256(path)
+        LogFile.objects.filter(id=logfile.id).update(sha256=logfile.sha256)
+
+    with transaction.atomic():
+        # Serialises indexing with the deletion of unreferenced texts
+        content_storage.lock(content_storage.content_file_name(logfile.sha256))
+        texts = LogFileText.objects.filter(sha256=logfile.sha256)
+        if texts.exists():
+            return False
+        parts = iter_text_parts(path)
+        while True:
+            batch = list(itertools.islice(parts, _INSERT_BATCH_SIZE))
+            if not batch:
+                break
+            LogFileText.objects.bulk_create(
+                LogFileText(
+                    sha256=logfile.sha256,
+                    member=member,
+                    position=position,
+                    text=text,
+                )
+                for member, position, text in batch
+            )
+        texts.update(search_vector=_search_vector())
+    return True
+
+
+def search(text):
+    """Search the log files containing a text.
+
+    Args:
+        text: The text to search for.
+
+    Returns: A query set of the log files whose contents contain the text.
+
+    """
+    return LogFile.objects.filter(
+        sha256__in=LogFileText.objects.filter(
+            search_vector=SearchQuery(text, config=SEARCH_CONFIG),
+            text__icontains=text,
+        ).values("sha256")
+    )
+
+
+def delete_unreferenced_texts():
+    """Delete the indexed texts not belonging to any log file.
+
+    Texts are left behind if log files are deleted without sending signals
+    and without deleting their texts explicitly.
+
+    Returns: The number of deleted text parts.
+
+    """
+    deleted, _ = LogFileText.objects.exclude(
+        sha256__in=LogFile.objects.values("sha256")
+    ).delete()
+    return deleted
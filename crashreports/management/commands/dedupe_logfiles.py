@@ -0,0 +1,132 @@
+"""Move the stored log files to the content-addressed storage.
+
+Log files uploaded before the content-addressed storage was introduced are
+stored per crash report, see `crashreports.content_storage`. The command
+walks the media directory, computes the checksums of the files referenced by
+log files in parallel and moves every such file to the name derived from its
+checksum. Files with identical content are stored only once afterwards.
+Files not referenced by any log file are left untouched.
+"""
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from crashreports import content_storage
+from crashreports.models import LogFile, delete_unreferenced_logfile
+
+
+def _get_storage():
+    # pylint: disable=protected-access
+    return LogFile._meta.get_field("logfile").storage
+
+
+def _iter_file_names(storage):
+    """Iterate over the names of the files not stored by their content."""
+    for directory, directory_names, file_names in os.walk(storage.location):
+        if directory == storage.location:
+            directory_names[:] = [
+                name
+                for name in directory_names
+                if name != content_storage.CONTENT_DIRECTORY
+            ]
+        for file_name in file_names:
+            yield os.path.relpath(
+                os.path.join(directory, file_name), storage.location
+            )
+
+
+def _iter_referenced_checksums(storage, executor, batch_size=1000):
+    """Iterate over the checksums of the files referenced by log files.
+
+    The file names are processed in batches, so that only the names of a
+    single batch are held in memory at once.
+
+    Yields: Tuples of the file name and the hex digest of its checksum.
+
+    """
+    names = _iter_file_names(storage)
+    while True:
+        batch = list(itertools.islice(names, batch_size))
+        if not batch:
+            return
+        referenced = set(
+            LogFile.objects.filter(logfile__in=batch).values_list(
+                "logfile", flat=True
+            )
+        )
+        referenced_names = [name for name in batch if name in referenced]
+        yield from zip(
+            referenced_names,
+            executor.map(
+                content_storage.file_sha256,
+                [storage.path(name) for name in referenced_names],
+            ),
+        )
+
+
+def deduplicate_file(storage, name, sha256):
+    """Move a stored file to its content-addressed name.
+
+    The log files referencing the file are updated to reference the
+    content-addressed name. The file is linked to that name unless a file
+    with the same content is stored already.
+
+    Args:
+        storage: The file system storage of the log files.
+        name: The name of the stored file.
+        sha256: The hex digest of the SHA-256 checksum of the file.
+
+    Returns: The number of log files that have been updated.
+
+    """
+    content_name = content_storage.content_file_name(sha256)
+    with transaction.atomic():
+        content_storage.lock(content_name)
+        references = LogFile.objects.filter(logfile=name)
+        if not references.exists():
+            return 0
+        content_storage.add_file(storage, storage.path(name), content_name)
+        updated = references.update(logfile=content_name, sha256=sha256)
+    delete_unreferenced_logfile(name)
+    return updated
+
+
+class Command(BaseCommand):
+    """Management command to deduplicate the stored log files."""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add custom arguments to the command."""
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of files to read and hash in parallel.",
+        )
+
+    def handle(self, *args, **options):
+        """Carry out the command executive logic."""
+        storage = _get_storage()
+        files = updated = 0
+        with ThreadPoolExecutor(max_workers=options["jobs"]) as executor:
+            for name, sha256 in _iter_referenced_checksums(storage, executor):
+                files += 1
+                updated += deduplicate_file(storage, name, sha256)
+
+        if options["verbosity"]:
+            # pylint: disable=no-member
+            # Members of Style are generated and cannot be statically
+            # inferred.
+            self.stdout.write(
+                self.style.SUCCESS(
+                    "{} files hashed, {} log files moved to {}".format(
+                        files,
+                        updated,
+                        storage.path(content_storage.CONTENT_DIRECTORY),
+                    )
+                )
+            )
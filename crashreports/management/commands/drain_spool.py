@@ -0,0 +1,60 @@
+"""Store spooled heartbeats in the database.
+
+Reports are only spooled if `HICCUP_INGESTION_SPOOL_DIR` is set. The command
+has to run regularly, for example every minute, or continuously with the
+`--interval` option.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from crashreports import spool
+
+
+class Command(BaseCommand):
+    """Management command to store spooled reports in the database."""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add custom arguments to the command."""
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Maximum number of reports inserted at once.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help=(
+                "Keep draining the spool, waiting the given number of "
+                "seconds between runs. The spool is only drained once if "
+                "omitted."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        """Carry out the command executive logic."""
+        if not settings.HICCUP_INGESTION_SPOOL_DIR:
+            raise CommandError("HICCUP_INGESTION_SPOOL_DIR is not set.")
+
+        verbosity = int(options["verbosity"])
+        while True:
+            created, duplicates = spool.drain(options["batch_size"])
+            if verbosity >= 2 or (verbosity and (created or duplicates)):
+                # pylint: disable=no-member
+                # Members of Style are generated and cannot be statically
+                # inferred.
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        "{} reports created, {} duplicates dropped".format(
+                            created, duplicates
+                        )
+                    )
+                )
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
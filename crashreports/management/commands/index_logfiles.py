@@ -0,0 +1,102 @@
+"""Index the text of log files for full-text search.
+
+Log files are indexed on upload, see `crashreports.logfile_search`. The
+command indexes the log files uploaded before or while indexing on upload
+was disabled, using a pool of worker processes. The indexed texts of log
+files deleted without signals, for example by archiving them, are deleted.
+"""
+import logging
+import os
+import zipfile
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from crashreports import logfile_search
+from crashreports.models import LogFile, LogFileText
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _iter_unindexed_logfile_ids():
+    """Iterate over the IDs of log files whose text has not been indexed.
+
+    Only one log file is returned for log files with identical content.
+    Log files without checksum are always returned.
+    """
+    previous_sha256 = None
+    for logfile_id, sha256 in (
+        LogFile.objects.exclude(
+            sha256__in=LogFileText.objects.values("sha256")
+        )
+        .order_by("sha256", "id")
+        .values_list("id", "sha256")
+        .iterator()
+    ):
+        if sha256 and sha256 == previous_sha256:
+            continue
+        previous_sha256 = sha256
+        yield logfile_id
+
+
+def _index_logfile(logfile_id):
+    """Index the text of a log file.
+
+    Returns: True if the text has been indexed.
+
+    """
+    try:
+        logfile = LogFile.objects.get(id=logfile_id)
+    except LogFile.DoesNotExist:
+        return False
+    try:
+        return logfile_search.index_logfile(logfile)
+    except (OSError, zipfile.BadZipFile, NotImplementedError) as error:
+        LOGGER.warning("Could not index log file %s: %s", logfile_id, error)
+        return False
+
+
+class Command(BaseCommand):
+    """Management command to index the text of log files."""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add custom arguments to the command."""
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of worker processes indexing log files.",
+        )
+
+    def handle(self, *args, **options):
+        """Carry out the command executive logic."""
+        deleted = logfile_search.delete_unreferenced_texts()
+
+        logfile_ids = list(_iter_unindexed_logfile_ids())
+        if options["jobs"] > 1:
+            # The worker processes must not share the database connections
+            # of this process, so they open their own ones.
+            connections.close_all()
+            with Pool(options["jobs"]) as pool:
+                indexed = sum(
+                    pool.imap_unordered(
+                        _index_logfile, logfile_ids, chunksize=16
+                    )
+                )
+        else:
+            indexed = sum(map(_index_logfile, logfile_ids))
+
+        if options["verbosity"]:
+            # pylint: disable=no-member
+            # Members of Style are generated and cannot be statically
+            # inferred.
+            self.stdout.write(
+                self.style.SUCCESS(
+                    "{} log files indexed, {} unused text parts deleted".format(
+                        indexed, deleted
+                    )
+                )
+            )
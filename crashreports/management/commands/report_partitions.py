@@ -0,0 +1,63 @@
+"""Create the monthly partitions of the heartbeat and crash report tables.
+
+Reports are stored in the partition of their month, see
+`crashreports.partitioning`. Reports of months without a partition end up in
+the default partition, so the command has to run at least once a month, for
+example daily, to create the partitions of the upcoming months in advance.
+
+The tables are partitioned on the report date, not on the creation time. The
+creation time ranges counted by the stats command thus scan all partitions
+and only rely on the BRIN index on the creation time of each partition.
+"""
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crashreports import partitioning
+from crashreports.models import Crashreport, HeartBeat
+
+
+class Command(BaseCommand):
+    """Management command to create the partitions of upcoming months."""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Add custom arguments to the command."""
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=3,
+            help="Number of months after the current one to create.",
+        )
+
+    def handle(self, *args, **options):
+        """Carry out the command executive logic."""
+        until = datetime.date.today()
+        for _ in range(options["months_ahead"]):
+            until = partitioning.next_month(partitioning.month_start(until))
+
+        for model in [HeartBeat, Crashreport]:
+            if not partitioning.is_partitioned(model):
+                raise CommandError(
+                    "The table of {} is not partitioned.".format(
+                        model.__name__
+                    )
+                )
+            created = partitioning.ensure_partitions(model, until)
+            if options["verbosity"]:
+                # pylint: disable=no-member
+                # Members of Style are generated and cannot be statically
+                # inferred.
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        "{}: {} partitions created{}".format(
+                            model.__name__,
+                            len(created),
+                            "".join(
+                                "\n  {:%Y-%m}".format(month)
+                                for month in created
+                            ),
+                        )
+                    )
+                )
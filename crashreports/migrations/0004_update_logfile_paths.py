@@ -11,7 +11,7 @@ from django.db import migrations
 from django.conf import settings
 from django.core.files.storage import default_storage
 
-from crashreports.models import LogFile, crashreport_file_name
+from crashreports.models import crashreport_file_name
 
 LOGGER = logging.getLogger(__name__)
 
@@ -20,6 +20,8 @@ def migrate_logfiles(apps, schema_editor):
     """Migrate the logfiles and update the logfile paths in the database."""
     # pylint: disable=unused-argument
     crashreport_uploads_dir = "crashreport_uploads"
+    # The current model has columns that are only added by later migrations
+    LogFile = apps.get_model("crashreports", "LogFile")
 
     if not LogFile.objects.filter(
         logfile__startswith=crashreport_uploads_dir
@@ -7,25 +7,46 @@ import logging
 from django.db import migrations, models, connection
 from django.db.models import Count, Min
 
-from crashreports.models import HeartBeat, Crashreport
-
 LOGGER = logging.getLogger(__name__)
 
 
 def drop_heartbeat_duplicates(apps, schema_editor):
     """Drop duplicate heartbeat entries."""
     # pylint: disable=unused-argument
-    find_and_drop_duplicates(HeartBeat)
+    find_and_drop_duplicates(apps.get_model("crashreports", "HeartBeat"))
 
 
 def drop_crashreport_duplicates(apps, schema_editor):
-    """Drop duplicate crashreport entries."""
+    """Drop duplicate crashreport entries along with their log files."""
     # pylint: disable=unused-argument
-    find_and_drop_duplicates(Crashreport)
+    find_and_drop_duplicates(
+        apps.get_model("crashreports", "Crashreport"),
+        apps.get_model("crashreports", "LogFile"),
+    )
+
+
+def delete_logfile_files(logfiles):
+    """Delete the stored files of log files.
+
+    The historical models do not send the signals deleting the files of
+    deleted log files.
+    """
+    for logfile in logfiles:
+        if logfile.logfile and logfile.logfile.storage.exists(
+            logfile.logfile.name
+        ):
+            logfile.logfile.delete(save=False)
+
+
+def find_and_drop_duplicates(object_type, logfile_type=None):
+    """Drop all duplicates of the given object type.
 
+    Args:
+        object_type: The historical report model.
+        logfile_type:
+            The historical log file model, if the reports have log files.
 
-def find_and_drop_duplicates(object_type):
-    """Drop all duplicates of the given object type."""
+    """
     unique_fields = ("device", "date")
     duplicates = (
         object_type.objects.values(*unique_fields)
@@ -41,13 +62,14 @@ def find_and_drop_duplicates(object_type):
     )
     for duplicate in duplicates:
         LOGGER.debug("Removing duplicates: %s", duplicate)
-        (
-            object_type.objects.filter(
-                device=duplicate["device"], date=duplicate["date"]
+        duplicate_reports = object_type.objects.filter(
+            device=duplicate["device"], date=duplicate["date"]
+        ).exclude(id=duplicate["min_id"])
+        if logfile_type is not None:
+            delete_logfile_files(
+                logfile_type.objects.filter(crashreport__in=duplicate_reports)
             )
-            .exclude(id=duplicate["min_id"])
-            .delete()
-        )
+        duplicate_reports.delete()
 
     # Manually commit the data migration before schema migrations are applied
     connection.cursor().execute("COMMIT;")
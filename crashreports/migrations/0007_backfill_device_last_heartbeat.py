@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+"""Migration to set the date of the last heartbeat of all devices."""
+# pylint: disable=invalid-name
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Set the last heartbeat of each device to its latest heartbeat date."""
+
+    dependencies = [
+        ("crashreports", "0006_add_unique_constraints_and_drop_duplicates")
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            UPDATE crashreports_device AS device
+            SET last_heartbeat = latest.date AT TIME ZONE 'UTC'
+            FROM (
+                SELECT device_id, MAX(date)::timestamp AS date
+                FROM crashreports_heartbeat
+                GROUP BY device_id
+            ) AS latest
+            WHERE device.id = latest.device_id
+            AND (
+                device.last_heartbeat IS NULL
+                OR device.last_heartbeat < latest.date AT TIME ZONE 'UTC'
+            )
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        )
+    ]
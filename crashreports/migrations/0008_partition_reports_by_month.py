@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""Migration to partition the heartbeat and crash report tables by month."""
+# pylint: disable=invalid-name
+from django.db import migrations, models
+import django.db.models.deletion
+
+from crashreports import partitioning
+
+PARTITIONED_MODELS = ["HeartBeat", "Crashreport"]
+
+
+def _alter_logfile_constraint(apps, schema_editor, db_constraint):
+    """Add or drop the foreign key constraint of the log files."""
+    if not partitioning.is_supported(schema_editor.connection):
+        return
+    logfile = apps.get_model("crashreports", "LogFile")
+    old_field = logfile._meta.get_field("crashreport")
+    new_field = old_field.clone()
+    new_field.db_constraint = db_constraint
+    new_field.set_attributes_from_name(old_field.name)
+    new_field.model = logfile
+    schema_editor.alter_field(logfile, old_field, new_field)
+
+
+def drop_logfile_constraint(apps, schema_editor):
+    """Drop the log file constraint if the tables will be partitioned."""
+    _alter_logfile_constraint(apps, schema_editor, db_constraint=False)
+
+
+def restore_logfile_constraint(apps, schema_editor):
+    """Restore the log file constraint if the tables were partitioned."""
+    _alter_logfile_constraint(apps, schema_editor, db_constraint=True)
+
+
+def partition_tables(apps, schema_editor):
+    """Convert the report tables into partitioned tables."""
+    for model_name in PARTITIONED_MODELS:
+        partitioning.partition_table(
+            apps.get_model("crashreports", model_name),
+            schema_editor.connection,
+        )
+
+
+def unpartition_tables(apps, schema_editor):
+    """Convert the partitioned report tables into plain tables."""
+    for model_name in PARTITIONED_MODELS:
+        partitioning.unpartition_table(
+            apps.get_model("crashreports", model_name),
+            schema_editor.connection,
+        )
+
+
+class Migration(migrations.Migration):
+    """Partition the report tables by month on their date column.
+
+    Foreign keys can only reference the whole primary key of a partitioned
+    table, which includes the date. The foreign key constraint of the log
+    files is therefore dropped where the tables get partitioned. Deleting a
+    crash report still deletes its log files as Django cascades the deletion
+    itself. Databases without partitioning support keep the constraint.
+
+    The tables are partitioned on the date rather than on the creation time,
+    so the creation time ranges counted by the stats command do not prune any
+    partition and rely on the BRIN index on the creation time instead.
+    """
+
+    dependencies = [("crashreports", "0007_backfill_device_last_heartbeat")]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(
+                    drop_logfile_constraint,
+                    reverse_code=restore_logfile_constraint,
+                )
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name="logfile",
+                    name="crashreport",
+                    field=models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="logfiles",
+                        to="crashreports.Crashreport",
+                    ),
+                )
+            ],
+        ),
+        migrations.RunPython(
+            partition_tables, reverse_code=unpartition_tables
+        ),
+    ]
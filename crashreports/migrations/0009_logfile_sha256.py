@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+"""Migration to store the checksum of uploaded log files."""
+# pylint: disable=invalid-name
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Add the SHA-256 checksum field to log files."""
+
+    dependencies = [("crashreports", "0008_partition_reports_by_month")]
+
+    operations = [
+        migrations.AddField(
+            model_name="logfile",
+            name="sha256",
+            field=models.CharField(blank=True, default="", max_length=64),
+        )
+    ]
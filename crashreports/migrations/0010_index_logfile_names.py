@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+"""Migration to index the file names of log files."""
+# pylint: disable=invalid-name
+import crashreports.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Index the file names to count the references to stored files."""
+
+    dependencies = [("crashreports", "0009_logfile_sha256")]
+
+    operations = [
+        migrations.AlterField(
+            model_name="logfile",
+            name="logfile",
+            field=models.FileField(
+                db_index=True,
+                max_length=500,
+                upload_to=crashreports.models.crashreport_file_name,
+            ),
+        )
+    ]
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+"""Migration to add the full-text search index of log files."""
+# pylint: disable=invalid-name
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Add the indexed text of log files."""
+
+    dependencies = [("crashreports", "0010_index_logfile_names")]
+
+    operations = [
+        migrations.AlterField(
+            model_name="logfile",
+            name="sha256",
+            field=models.CharField(
+                blank=True, db_index=True, default="", max_length=64
+            ),
+        ),
+        migrations.CreateModel(
+            name="LogFileText",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sha256", models.CharField(max_length=64)),
+                ("member", models.CharField(max_length=255)),
+                ("position", models.PositiveIntegerField()),
+                ("text", models.TextField()),
+                (
+                    "search_vector",
+                    django.contrib.postgres.search.SearchVectorField(
+                        null=True
+                    ),
+                ),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name="logfiletext",
+            unique_together=set([("sha256", "member", "position")]),
+        ),
+        migrations.AddIndex(
+            model_name="logfiletext",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="logfiletext_search_vector_gin"
+            ),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+"""Migration to add the crash signatures of crash reports."""
+# pylint: disable=invalid-name
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """Add crash signatures and reference them from crash reports."""
+
+    dependencies = [("crashreports", "0011_logfiletext")]
+
+    operations = [
+        migrations.CreateModel(
+            name="CrashSignature",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("modem_crash", "Modem crash"),
+                            ("watchdog", "Watchdog"),
+                            ("kernel_panic", "Kernel panic"),
+                            ("unknown", "Unknown"),
+                        ],
+                        max_length=32,
+                    ),
+                ),
+                ("signature", models.CharField(blank=True, max_length=255)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name="crashsignature", unique_together=set([("kind", "signature")])
+        ),
+        migrations.AddField(
+            model_name="crashreport",
+            name="signature",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="crashreports",
+                to="crashreports.CrashSignature",
+            ),
+        ),
+    ]
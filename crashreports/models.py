@@ -1,17 +1,65 @@
 # -*- coding: utf-8 -*-
 """Models for devices, heartbeats, crashreports and log files."""
+import datetime
 import logging
 import os
 import uuid
 
-from django.db import models, transaction, IntegrityError
+from django.db import connection, models, transaction, IntegrityError
 from django.contrib.auth.models import User
-from django.dispatch import receiver
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.dispatch import Signal, receiver
+from django.db.models import Q
 from django.forms import model_to_dict
 from taggit.managers import TaggableManager
 
+from crashreports import content_storage, crash_signatures
+
 LOGGER = logging.getLogger(__name__)
 
+# Sent by the report type after reports have been inserted through
+# `_bulk_create_reports`, which does not send the `post_save` signal.
+reports_created = Signal(providing_args=["device", "reports"])
+
+
+def _reserve_keys(instance, field_name, count):
+    """Reserve a range of keys from an ID-counter field of an instance.
+
+    The counter is incremented and read back with a single atomic statement.
+    In contrast to locking the row, reading and saving the whole instance, no
+    other column is rewritten and the row lock is only held for the duration
+    of the statement unless a surrounding transaction is open. Concurrent
+    reservations thus never hand out the same key.
+
+    The counter value of the given instance is updated as well so that
+    saving the instance later on does not reset the counter.
+
+    Args:
+        instance: The model instance holding the counter.
+        field_name: The name of the counter field.
+        count: The number of keys to reserve.
+
+    Returns: The range of reserved keys.
+
+    """
+    # pylint: disable=protected-access
+    meta = instance._meta
+    column = connection.ops.quote_name(meta.get_field(field_name).column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE {table} SET {column} = {column} + %s "
+            "WHERE {pk} = %s RETURNING {column}".format(
+                table=connection.ops.quote_name(meta.db_table),
+                column=column,
+                pk=connection.ops.quote_name(meta.pk.column),
+            ),
+            [count, instance.pk],
+        )
+        next_key = cursor.fetchone()[0]
+    setattr(instance, field_name, next_key)
+    return range(next_key - count, next_key)
+
 
 class Device(models.Model):
     """A device representing a phone that has been registered on Hiccup."""
@@ -43,23 +91,196 @@ class Device(models.Model):
     next_per_crashreport_key = models.PositiveIntegerField(default=1)
     next_per_heartbeat_key = models.PositiveIntegerField(default=1)
 
-    @transaction.atomic
     def get_crashreport_key(self):
         """Get the next key for a crashreport and update the ID-counter."""
-        device = Device.objects.select_for_update().get(id=self.id)
-        ret = device.next_per_crashreport_key
-        device.next_per_crashreport_key += 1
-        device.save()
-        return ret
+        return self.get_crashreport_keys(1)[0]
+
+    def get_crashreport_keys(self, count):
+        """Reserve a range of keys for crashreports and update the ID-counter.
+
+        Args:
+            count: The number of keys to reserve.
+
+        Returns: The range of reserved keys.
+
+        """
+        return _reserve_keys(self, "next_per_crashreport_key", count)
 
-    @transaction.atomic
     def get_heartbeat_key(self):
         """Get the next key for a heartbeat and update the ID-counter."""
-        device = Device.objects.select_for_update().get(id=self.id)
-        ret = device.next_per_heartbeat_key
-        device.next_per_heartbeat_key += 1
-        device.save()
-        return ret
+        return self.get_heartbeat_keys(1)[0]
+
+    def get_heartbeat_keys(self, count):
+        """Reserve a range of keys for heartbeats and update the ID-counter.
+
+        Args:
+            count: The number of keys to reserve.
+
+        Returns: The range of reserved keys.
+
+        """
+        return _reserve_keys(self, "next_per_heartbeat_key", count)
+
+
+def _insert_ignoring_duplicates(report_type, reports):
+    """Insert reports unless they duplicate a stored report.
+
+    The reports are inserted with a single `INSERT ... ON CONFLICT DO NOTHING`
+    statement on the unique `(device, date)` key. Conflicting reports are
+    skipped by the database instead of raising an `IntegrityError`, so no
+    savepoint has to be created and rolled back. The primary key of each
+    inserted report is set. No signals are sent for the inserted reports.
+
+    Args:
+        report_type: The class of the reports.
+        reports:
+            The unsaved report instances with their device and local ID set.
+
+    Returns: The list of inserted reports.
+
+    """
+    # pylint: disable=protected-access
+    meta = report_type._meta
+    quote_name = connection.ops.quote_name
+    fields = [field for field in meta.concrete_fields if field != meta.pk]
+    date_field = meta.get_field("date")
+
+    values = []
+    for report in reports:
+        values.extend(
+            field.get_db_prep_save(field.pre_save(report, True), connection)
+            for field in fields
+        )
+    row = "({})".format(", ".join(["%s"] * len(fields)))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO {table} ({columns}) VALUES {rows} "
+            "ON CONFLICT ({device}, {date}) DO NOTHING "
+            "RETURNING {pk}, {date}".format(
+                table=quote_name(meta.db_table),
+                columns=", ".join(quote_name(field.column) for field in fields),
+                rows=", ".join([row] * len(reports)),
+                device=quote_name(meta.get_field("device").column),
+                date=quote_name(date_field.column),
+                pk=quote_name(meta.pk.column),
+            ),
+            values,
+        )
+        ids = {date: pk for pk, date in cursor.fetchall()}
+
+    inserted = []
+    for report in reports:
+        pk = ids.get(date_field.get_prep_value(report.date))
+        if pk is not None:
+            report.pk = pk
+            report._state.adding = False
+            report._state.db = connection.alias
+            inserted.append(report)
+    return inserted
+
+
+def _bulk_create_reports(report_type, device, reports, reserve_keys):
+    """Insert multiple reports of a device at once.
+
+    Reports that have the same date as a report that is already stored or as
+    a previous report of the same batch are treated as duplicates and dropped
+    to keep the idempotency of the interface. A single range of local IDs is
+    reserved for all remaining reports, which are then inserted with a single
+    query. Duplicates are detected before reserving local IDs, so no local ID
+    is wasted on them. Only duplicates inserted concurrently by another
+    request are detected on insertion, see `_insert_ignoring_duplicates`.
+
+    The local ID of each dropped duplicate is set to the local ID of the
+    stored report it duplicates. The `reports_created` signal is sent for the
+    created reports.
+
+    Args:
+        report_type: The class of the reports.
+        device: The device that sent the reports.
+        reports: The unsaved report instances.
+        reserve_keys:
+            Function reserving a range of local IDs of the given size.
+
+    Returns:
+        The list of created reports and the list of dropped duplicates.
+
+    """
+    # pylint: disable=protected-access
+    date_field = report_type._meta.get_field("date")
+    local_ids = dict(
+        report_type.objects.filter(
+            device=device,
+            date__in={date_field.get_prep_value(rep.date) for rep in reports},
+        ).values_list("date", "device_local_id")
+    )
+    new_reports = {}
+    duplicates = []
+    for report in reports:
+        report.device = device
+        date = date_field.get_prep_value(report.date)
+        if date in local_ids or date in new_reports:
+            duplicates.append(report)
+        else:
+            new_reports[date] = report
+
+    reports_without_key = [
+        report for report in new_reports.values() if not report.device_local_id
+    ]
+    if reports_without_key:
+        keys = reserve_keys(len(reports_without_key))
+        for report, key in zip(reports_without_key, keys):
+            report.device_local_id = key
+    created = []
+    if new_reports:
+        created = _insert_ignoring_duplicates(
+            report_type, list(new_reports.values())
+        )
+    for date, report in new_reports.items():
+        if report.pk is None:
+            duplicates.append(report)
+        else:
+            local_ids[date] = report.device_local_id
+
+    for duplicate in duplicates:
+        LOGGER.debug(
+            "Duplicate %s received and dropped: device %s, date %s",
+            report_type.__name__,
+            device.uuid,
+            duplicate.date,
+        )
+    _set_local_ids_of_duplicates(report_type, device, duplicates, local_ids)
+
+    if created:
+        reports_created.send(sender=report_type, device=device, reports=created)
+    return created, duplicates
+
+
+def _set_local_ids_of_duplicates(report_type, device, duplicates, local_ids):
+    """Set the local IDs of duplicates to the ones of the stored reports.
+
+    Args:
+        report_type: The class of the reports.
+        device: The device that sent the reports.
+        duplicates: The dropped duplicate report instances.
+        local_ids: The already known local IDs of stored reports per date.
+
+    """
+    # pylint: disable=protected-access
+    date_field = report_type._meta.get_field("date")
+    unknown_dates = {
+        date_field.get_prep_value(duplicate.date)
+        for duplicate in duplicates
+    } - set(local_ids)
+    if unknown_dates:
+        local_ids.update(
+            report_type.objects.filter(
+                device=device, date__in=unknown_dates
+            ).values_list("date", "device_local_id")
+        )
+    for duplicate in duplicates:
+        duplicate.device_local_id = local_ids.get(
+            date_field.get_prep_value(duplicate.date)
+        )
 
 
 def crashreport_file_name(instance, filename):
@@ -85,6 +306,36 @@ def crashreport_file_name(instance, filename):
     )
 
 
+class CrashSignature(models.Model):
+    """The normalised signature of the cause of crashes.
+
+    Signatures are extracted from the log files of crash reports, see
+    `crashreports.crash_signatures`.
+    """
+
+    KIND_MODEM_CRASH = crash_signatures.KIND_MODEM_CRASH
+    KIND_WATCHDOG = crash_signatures.KIND_WATCHDOG
+    KIND_KERNEL_PANIC = crash_signatures.KIND_KERNEL_PANIC
+    KIND_UNKNOWN = crash_signatures.KIND_UNKNOWN
+    KIND_CHOICES = [
+        (KIND_MODEM_CRASH, "Modem crash"),
+        (KIND_WATCHDOG, "Watchdog"),
+        (KIND_KERNEL_PANIC, "Kernel panic"),
+        (KIND_UNKNOWN, "Unknown"),
+    ]
+
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES)
+    signature = models.CharField(
+        max_length=crash_signatures.MAX_SIGNATURE_LENGTH, blank=True
+    )
+
+    class Meta:  # noqa: D106
+        unique_together = ("kind", "signature")
+
+    def __str__(self):  # noqa: D105
+        return "{}: {}".format(self.kind, self.signature)
+
+
 class Crashreport(models.Model):
     """A crashreport that was sent by a device."""
 
@@ -113,18 +364,22 @@ class Crashreport(models.Model):
     device_local_id = models.PositiveIntegerField(blank=True)
     next_logfile_key = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Extracted from the log files after upload, null until they have been
+    # parsed, see crashreport_stats.crash_signatures.
+    signature = models.ForeignKey(
+        CrashSignature,
+        null=True,
+        blank=True,
+        related_name="crashreports",
+        on_delete=models.SET_NULL,
+    )
 
     class Meta:  # noqa: D106
         unique_together = ("device", "date")
 
-    @transaction.atomic
     def get_logfile_key(self):
         """Get the next key for a log file and update the ID-counter."""
-        crashreport = Crashreport.objects.select_for_update().get(id=self.id)
-        ret = crashreport.next_logfile_key
-        crashreport.next_logfile_key += 1
-        crashreport.save()
-        return ret
+        return _reserve_keys(self, "next_logfile_key", 1)[0]
 
     def save(
         self,
@@ -133,11 +388,22 @@ class Crashreport(models.Model):
         using=None,
         update_fields=None,
     ):
-        """Save the crashreport and set its local ID if it was not set."""
+        """Save the crashreport and set its local ID if it was not set.
+
+        New crashreports, including the ones created with `objects.create()`,
+        are inserted with `insert_or_ignore`, so that duplicates are dropped
+        without raising an exception to keep idempotency of the interface.
+        The `reports_created` signal is sent for new crashreports with a
+        given primary key as well.
+        """
+        if self.pk is None and not force_update:
+            self.insert_or_ignore()
+            return
+        if not self.device_local_id:
+            self.device_local_id = self.device.get_crashreport_key()
+        adding = self._state.adding
         try:
             with transaction.atomic():
-                if not self.device_local_id:
-                    self.device_local_id = self.device.get_crashreport_key()
                 super(Crashreport, self).save(
                     force_insert, force_update, using, update_fields
                 )
@@ -149,6 +415,44 @@ class Crashreport(models.Model):
                 "Duplicate Crashreport received and dropped: %s",
                 model_to_dict(self),
             )
+            return
+        if adding:
+            reports_created.send(
+                sender=Crashreport, device=self.device, reports=[self]
+            )
+
+    def insert_or_ignore(self):
+        """Insert the crashreport unless it duplicates a stored crashreport.
+
+        If the crashreport is a duplicate, it is not inserted and its local ID
+        is set to the one of the stored crashreport.
+
+        Returns: True if the crashreport has been inserted, False otherwise.
+
+        """
+        created, _ = _bulk_create_reports(
+            Crashreport, self.device, [self], self.device.get_crashreport_keys
+        )
+        return bool(created)
+
+    @staticmethod
+    def bulk_create_for_device(device, crashreports):
+        """Create multiple crashreports of a device at once.
+
+        Duplicate crashreports are dropped, see `_bulk_create_reports`.
+
+        Args:
+            device: The device that sent the crashreports.
+            crashreports: The unsaved crashreport instances.
+
+        Returns:
+            The list of created crashreports and the list of dropped
+            duplicates.
+
+        """
+        return _bulk_create_reports(
+            Crashreport, device, crashreports, device.get_crashreport_keys
+        )
 
     def _get_uuid(self):
         """Return the device UUID."""
@@ -161,10 +465,24 @@ class LogFile(models.Model):
     """A log file that was sent along with a crashreport."""
 
     logfile_type = models.TextField(max_length=36, default="last_kmsg")
+    # The crash report table is partitioned, see crashreports.partitioning,
+    # so no foreign key constraint can reference its ID alone.
     crashreport = models.ForeignKey(
-        Crashreport, related_name="logfiles", on_delete=models.CASCADE
+        Crashreport,
+        related_name="logfiles",
+        on_delete=models.CASCADE,
+        db_constraint=False,
+    )
+    # Uploaded files are stored by their content and shared by all log files
+    # with identical content, see crashreports.content_storage. The index
+    # is needed to count the references to a file.
+    logfile = models.FileField(
+        upload_to=crashreport_file_name, max_length=500, db_index=True
+    )
+    # Hex digest of the SHA-256 checksum of the file, computed on upload
+    sha256 = models.CharField(
+        max_length=64, blank=True, default="", db_index=True
     )
-    logfile = models.FileField(upload_to=crashreport_file_name, max_length=500)
     crashreport_local_id = models.PositiveIntegerField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -183,14 +501,111 @@ class LogFile(models.Model):
         )
 
 
+class LogFileText(models.Model):
+    """A part of the text of a log file member indexed for full-text search.
+
+    The text of log files with identical content is only stored once, see
+    `crashreports.logfile_search`.
+    """
+
+    sha256 = models.CharField(max_length=64)
+    member = models.CharField(max_length=255)
+    # Offset of the part in bytes from the start of the member
+    position = models.PositiveIntegerField()
+    text = models.TextField()
+    search_vector = SearchVectorField(null=True)
+
+    class Meta:  # noqa: D106
+        unique_together = ("sha256", "member", "position")
+        indexes = [
+            GinIndex(
+                fields=["search_vector"], name="logfiletext_search_vector_gin"
+            )
+        ]
+
+
+def delete_unreferenced_logfile(name):
+    """Delete a stored log file if no log file instance references it.
+
+    Args:
+        name: The name of the stored file.
+
+    Returns: True if the file has been deleted.
+
+    """
+    # pylint: disable=protected-access
+    storage = LogFile._meta.get_field("logfile").storage
+    with transaction.atomic():
+        content_storage.lock(name)
+        if LogFile.objects.filter(logfile=name).exists():
+            return False
+        if not os.path.isfile(storage.path(name)):
+            return False
+        storage.delete(name)
+    return True
+
+
 @receiver(models.signals.post_delete, sender=LogFile)
 def auto_delete_file_on_delete(sender, instance, **kwargs):
-    """Delete the file from the filesystem on deletion of the db instance."""
+    """Delete the file from the filesystem on deletion of the db instance.
+
+    Files that are still referenced by other log files are kept, as well as
+    their indexed text.
+    """
     # pylint: disable=unused-argument
 
     if instance.logfile:
-        if os.path.isfile(instance.logfile.path):
-            instance.logfile.delete(save=False)
+        delete_unreferenced_logfile(instance.logfile.name)
+    if instance.sha256:
+        delete_unreferenced_text(instance.sha256)
+
+
+def delete_unreferenced_text(sha256):
+    """Delete the indexed text of a log file content if it is not used.
+
+    Args:
+        sha256: The SHA-256 checksum of the log file content.
+
+    """
+    with transaction.atomic():
+        content_storage.lock(content_storage.content_file_name(sha256))
+        if not LogFile.objects.filter(sha256=sha256).exists():
+            LogFileText.objects.filter(sha256=sha256).delete()
+
+
+def _update_last_heartbeat(device, heartbeats):
+    """Update the date of the last heartbeat of a device.
+
+    The date is stored as midnight UTC of the latest heartbeat date. The
+    device row is only written if that date is after the stored one. As a
+    device sends at most one heartbeat per day, its row is written at most
+    once per day instead of once per request. Late heartbeats of past days do
+    not cause any write.
+
+    Args:
+        device: The device that sent the heartbeats.
+        heartbeats: The created heartbeats.
+
+    """
+    if not heartbeats:
+        return
+    latest_date = max(heartbeat.date for heartbeat in heartbeats)
+    last_heartbeat = datetime.datetime(
+        latest_date.year,
+        latest_date.month,
+        latest_date.day,
+        tzinfo=datetime.timezone.utc,
+    )
+    updated = (
+        Device.objects.filter(id=device.id)
+        .filter(
+            Q(last_heartbeat__isnull=True)
+            | Q(last_heartbeat__lt=last_heartbeat)
+        )
+        .update(last_heartbeat=last_heartbeat)
+    )
+    if updated:
+        device.last_heartbeat = last_heartbeat
 
 
 class HeartBeat(models.Model):
@@ -220,11 +635,23 @@ class HeartBeat(models.Model):
         using=None,
         update_fields=None,
     ):
-        """Save the heartbeat and set its local ID if it was not set."""
+        """Save the heartbeat and set its local ID if it was not set.
+
+        New heartbeats, including the ones created with `objects.create()`,
+        are inserted with `insert_or_ignore`, so that duplicates are dropped
+        without raising an exception to keep idempotency of the interface.
+        The last heartbeat of the device is updated and the
+        `reports_created` signal is sent for new heartbeats with a given
+        primary key as well.
+        """
+        if self.pk is None and not force_update:
+            self.insert_or_ignore()
+            return
+        if not self.device_local_id:
+            self.device_local_id = self.device.get_heartbeat_key()
+        adding = self._state.adding
         try:
             with transaction.atomic():
-                if not self.device_local_id:
-                    self.device_local_id = self.device.get_heartbeat_key()
                 super(HeartBeat, self).save(
                     force_insert, force_update, using, update_fields
                 )
@@ -236,6 +663,47 @@ class HeartBeat(models.Model):
                 "Duplicate HeartBeat received and dropped: %s",
                 model_to_dict(self),
             )
+            return
+        if adding:
+            reports_created.send(
+                sender=HeartBeat, device=self.device, reports=[self]
+            )
+            _update_last_heartbeat(self.device, [self])
+
+    def insert_or_ignore(self):
+        """Insert the heartbeat unless it duplicates a stored heartbeat.
+
+        If the heartbeat is a duplicate, it is not inserted and its local ID is
+        set to the one of the stored heartbeat.
+
+        Returns: True if the heartbeat has been inserted, False otherwise.
+
+        """
+        created, _ = _bulk_create_reports(
+            HeartBeat, self.device, [self], self.device.get_heartbeat_keys
+        )
+        _update_last_heartbeat(self.device, created)
+        return bool(created)
+
+    @staticmethod
+    def bulk_create_for_device(device, heartbeats):
+        """Create multiple heartbeats of a device at once.
+
+        Duplicate heartbeats are dropped, see `_bulk_create_reports`.
+
+        Args:
+            device: The device that sent the heartbeats.
+            heartbeats: The unsaved heartbeat instances.
+
+        Returns:
+            The list of created heartbeats and the list of dropped duplicates.
+
+        """
+        created, duplicates = _bulk_create_reports(
+            HeartBeat, device, heartbeats, device.get_heartbeat_keys
+        )
+        _update_last_heartbeat(device, created)
+        return created, duplicates
 
     def _get_uuid(self):
         """Return the device UUID."""
@@ -0,0 +1,477 @@
+"""Monthly range partitioning of the heartbeat and crash report tables.
+
+On PostgreSQL 11 and later, the heartbeat and crash report tables are
+partitioned by month on their `date` column. The partition key has to be part
+of every unique constraint of a partitioned table, so `date` is used rather
+than `created_at` to keep the unique `(device, date)` constraints. The
+primary keys of the partitioned tables consist of the ID and the date. IDs
+stay unique as they are still drawn from a single sequence per table.
+
+Reports with a date outside of all monthly partitions, for example because
+the clock of the device was wrong, are stored in a default partition. The
+`report_partitions` management command creates the partitions of upcoming
+months and has to run at least once a month. When a partition is created
+for a month that already has reports in the default partition, these reports
+are moved to the new partition.
+
+Old months can be removed with `drop_partition()` instead of deleting their
+reports row by row. No signals are sent for the dropped reports, and the log
+files of dropped crash reports are not deleted.
+
+Each partition has a BRIN index on `created_at`. As reports are usually
+created shortly after their date, the `created_at` ranges scanned by the
+stats command only match a few blocks of a few partitions.
+"""
+import datetime
+import logging
+import re
+
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+
+LOGGER = logging.getLogger(__name__)
+
+PARTITION_COLUMN = "date"
+
+DEFAULT_PARTITION_SUFFIX = "_default"
+
+_MONTH_SUFFIX_FORMAT = "_p%Y_%m"
+
+
+def is_supported(connection):
+    """Check whether a database supports the partitioning of the tables."""
+    return connection.vendor == "postgresql" and connection.pg_version >= 110000
+
+
+def is_partitioned(model, using=DEFAULT_DB_ALIAS):
+    """Check whether the table of a model is partitioned.
+
+    Args:
+        model: The model class.
+        using: The alias of the database.
+
+    Returns: True if the table is partitioned, False otherwise.
+
+    """
+    # pylint: disable=protected-access
+    connection = connections[using]
+    if not is_supported(connection):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return row is not None and row[0] == "p"
+
+
+def month_start(day):
+    """Get the first day of the month of a date or datetime."""
+    return datetime.date(day.year, day.month, 1)
+
+
+def next_month(month):
+    """Get the first day of the month following the given month."""
+    if month.month == 12:
+        return datetime.date(month.year + 1, 1, 1)
+    return datetime.date(month.year, month.month + 1, 1)
+
+
+def partition_name(model, month):
+    """Get the name of the partition of a model table for a month."""
+    # pylint: disable=protected-access
+    return model._meta.db_table + month.strftime(_MONTH_SUFFIX_FORMAT)
+
+
+def _bound(model, month):
+    """Get the literal of the lower partition bound of a month.
+
+    Partition bounds have to be literals, so they can not be passed as query
+    parameters. Bounds of datetime columns are midnight UTC.
+    """
+    # pylint: disable=protected-access
+    field = model._meta.get_field(PARTITION_COLUMN)
+    if field.get_internal_type() == "DateTimeField":
+        return "'{} 00:00:00+00'".format(month.isoformat())
+    return "'{}'".format(month.isoformat())
+
+
+def month_bound_value(model, month):
+    """Get the value of the lower partition bound of a month for queries.
+
+    Args:
+        model: The model class.
+        month: The first day of the month.
+
+    Returns:
+        The month as date for date columns and as midnight UTC for datetime
+        columns.
+
+    """
+    # pylint: disable=protected-access
+    field = model._meta.get_field(PARTITION_COLUMN)
+    if field.get_internal_type() == "DateTimeField":
+        return datetime.datetime.combine(
+            month, datetime.time(tzinfo=datetime.timezone.utc)
+        )
+    return month
+
+
+def get_partitions(model, using=DEFAULT_DB_ALIAS):
+    """Get the monthly partitions of the table of a model.
+
+    Args:
+        model: The model class.
+        using: The alias of the database.
+
+    Returns: The names of the partitions per month, ordered by month.
+
+    """
+    # pylint: disable=protected-access
+    table = model._meta.db_table
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(%s)",
+            [table],
+        )
+        names = [name for name, in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        try:
+            month = datetime.datetime.strptime(
+                name, table + _MONTH_SUFFIX_FORMAT
+            ).date()
+        except ValueError:
+            continue
+        partitions[month] = name
+    return dict(sorted(partitions.items()))
+
+
+def create_partition(model, month, using=DEFAULT_DB_ALIAS):
+    """Create the partition of the table of a model for a month.
+
+    Reports of that month that are stored in the default partition are moved
+    to the new partition.
+
+    Args:
+        model: The model class.
+        month: The first day of the month.
+        using: The alias of the database.
+
+    Returns: True if the partition has been created, False if it existed.
+
+    """
+    # pylint: disable=protected-access
+    if month in get_partitions(model, using):
+        return False
+
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    table = model._meta.db_table
+    partition = partition_name(model, month)
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TABLE {partition} (LIKE {table} INCLUDING DEFAULTS)".format(
+                partition=quote_name(partition), table=quote_name(table)
+            )
+        )
+        cursor.execute(
+            "WITH moved AS ("
+            "DELETE FROM {default} WHERE {column} >= %s AND {column} < %s "
+            "RETURNING *"
+            ") INSERT INTO {partition} SELECT * FROM moved".format(
+                default=quote_name(table + DEFAULT_PARTITION_SUFFIX),
+                column=quote_name(PARTITION_COLUMN),
+                partition=quote_name(partition),
+            ),
+            [
+                month_bound_value(model, month),
+                month_bound_value(model, next_month(month)),
+            ],
+        )
+        if cursor.rowcount:
+            LOGGER.info(
+                "Moved %d rows from the default partition to %s.",
+                cursor.rowcount,
+                partition,
+            )
+        cursor.execute(
+            "ALTER TABLE {table} ATTACH PARTITION {partition} "
+            "FOR VALUES FROM ({start}) TO ({end})".format(
+                table=quote_name(table),
+                partition=quote_name(partition),
+                start=_bound(model, month),
+                end=_bound(model, next_month(month)),
+            )
+        )
+    return True
+
+
+def ensure_partitions(model, until, using=DEFAULT_DB_ALIAS):
+    """Create the missing partitions of a model table up to a month.
+
+    Partitions are created from the month following the latest existing
+    partition. Gaps between existing partitions are not filled.
+
+    Args:
+        model: The model class.
+        until: A day of the last month to create a partition for.
+        using: The alias of the database.
+
+    Returns: The months for which a partition has been created.
+
+    """
+    partitions = get_partitions(model, using)
+    month = (
+        next_month(list(partitions)[-1])
+        if partitions
+        else month_start(datetime.date.today())
+    )
+    created = []
+    while month <= until:
+        if create_partition(model, month, using):
+            created.append(month)
+        month = next_month(month)
+    return created
+
+
+def drop_partition(model, month, using=DEFAULT_DB_ALIAS):
+    """Drop the partition of a model table for a month with all its rows.
+
+    No signals are sent for the dropped rows and no dependent objects are
+    deleted, see the module documentation.
+
+    Args:
+        model: The model class.
+        month: The first day of the month.
+        using: The alias of the database.
+
+    Returns: True if the partition has been dropped, False if it was missing.
+
+    """
+    partition = get_partitions(model, using).get(month)
+    if partition is None:
+        return False
+    quote_name = connections[using].ops.quote_name
+    with connections[using].cursor() as cursor:
+        cursor.execute("DROP TABLE {}".format(quote_name(partition)))
+    return True
+
+
+def drop_partition_if_empty(model, month, using=DEFAULT_DB_ALIAS):
+    """Drop the partition of a model table for a month if it has no rows.
+
+    The partition is locked while checking whether it is empty so that no
+    report can be inserted concurrently.
+
+    Args:
+        model: The model class.
+        month: The first day of the month.
+        using: The alias of the database.
+
+    Returns: True if the partition has been dropped, False otherwise.
+
+    """
+    partition = get_partitions(model, using).get(month)
+    if partition is None:
+        return False
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(
+            "LOCK TABLE {} IN ACCESS EXCLUSIVE MODE".format(
+                quote_name(partition)
+            )
+        )
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM {})".format(quote_name(partition))
+        )
+        if cursor.fetchone()[0]:
+            return False
+        cursor.execute("DROP TABLE {}".format(quote_name(partition)))
+    return True
+
+
+def _get_constraints(cursor, table):
+    """Get the primary key, unique and foreign key constraints of a table.
+
+    Returns: A list of the name, type and definition of each constraint.
+
+    """
+    cursor.execute(
+        "SELECT conname, contype, pg_get_constraintdef(oid) "
+        "FROM pg_constraint "
+        "WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u', 'f')",
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def _get_index_definitions(cursor, table):
+    """Get the definitions of the indexes of a table besides constraints."""
+    cursor.execute(
+        "SELECT pg_get_indexdef(pg_index.indexrelid) FROM pg_index "
+        "WHERE pg_index.indrelid = to_regclass(%s) AND NOT EXISTS ("
+        "SELECT 1 FROM pg_constraint "
+        "WHERE pg_constraint.conindid = pg_index.indexrelid"
+        ")",
+        [table],
+    )
+    return [definition for definition, in cursor.fetchall()]
+
+
+def _create_partitions_of_existing_rows(model, old_table, connection):
+    """Create the partitions for the existing rows of a table.
+
+    Partitions are created from the month of the earliest `created_at` value
+    up to the next month. Rows with an earlier date are stored in the default
+    partition.
+    """
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT MIN(created_at) FROM {}".format(quote_name(old_table))
+        )
+        first_created_at = cursor.fetchone()[0]
+    today = datetime.date.today()
+    month = month_start(first_created_at or today)
+    while month <= next_month(month_start(today)):
+        create_partition(model, month, connection.alias)
+        month = next_month(month)
+
+
+def _rebuild_table(model, connection, partitioned):
+    """Rebuild the table of a model as partitioned or as plain table.
+
+    The rows, the sequence of the primary key, the constraints and the
+    indexes are moved to the new table. The primary key of the partitioned
+    table includes the partition column.
+    """
+    # pylint: disable=protected-access
+    quote_name = connection.ops.quote_name
+    table = model._meta.db_table
+    pk_column = model._meta.pk.column
+    old_table = table + ("_unpartitioned" if partitioned else "_partitioned")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "ALTER TABLE {} RENAME TO {}".format(
+                quote_name(table), quote_name(old_table)
+            )
+        )
+        constraints = _get_constraints(cursor, old_table)
+        index_definitions = _get_index_definitions(cursor, old_table)
+        cursor.execute(
+            "SELECT pg_get_serial_sequence(%s, %s)", [old_table, pk_column]
+        )
+        sequence = cursor.fetchone()[0]
+
+        cursor.execute(
+            "CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS){}".format(
+                quote_name(table),
+                quote_name(old_table),
+                " PARTITION BY RANGE ({})".format(quote_name(PARTITION_COLUMN))
+                if partitioned
+                else "",
+            )
+        )
+        if partitioned:
+            cursor.execute(
+                "CREATE TABLE {} PARTITION OF {} DEFAULT".format(
+                    quote_name(table + DEFAULT_PARTITION_SUFFIX),
+                    quote_name(table),
+                )
+            )
+            _create_partitions_of_existing_rows(model, old_table, connection)
+        cursor.execute(
+            "INSERT INTO {} SELECT * FROM {}".format(
+                quote_name(table), quote_name(old_table)
+            )
+        )
+        if sequence:
+            cursor.execute(
+                "ALTER SEQUENCE {} OWNED BY {}.{}".format(
+                    sequence, quote_name(table), quote_name(pk_column)
+                )
+            )
+        cursor.execute("DROP TABLE {}".format(quote_name(old_table)))
+
+        for name, constraint_type, definition in constraints:
+            if constraint_type == "p":
+                definition = "PRIMARY KEY ({})".format(
+                    ", ".join(
+                        quote_name(column)
+                        for column in (
+                            [pk_column, PARTITION_COLUMN]
+                            if partitioned
+                            else [pk_column]
+                        )
+                    )
+                )
+            cursor.execute(
+                "ALTER TABLE {} ADD CONSTRAINT {} {}".format(
+                    quote_name(table), quote_name(name), definition
+                )
+            )
+        table_pattern = r" ON (ONLY )?(\S+\.)?{} USING ".format(
+            re.escape(old_table)
+        )
+        for definition in index_definitions:
+            cursor.execute(
+                re.sub(
+                    table_pattern,
+                    " ON {} USING ".format(quote_name(table)),
+                    definition,
+                )
+            )
+        if partitioned:
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS {} ON {} "
+                "USING brin (created_at)".format(
+                    quote_name(table + "_created_at_brin"), quote_name(table)
+                )
+            )
+
+
+def partition_table(model, connection):
+    """Convert the table of a model into a partitioned table.
+
+    The whole table is copied, so the conversion takes a while for large
+    tables and blocks all writes to the table.
+
+    Args:
+        model: The model class.
+        connection: The database connection.
+
+    Returns: True if the table has been converted, False otherwise.
+
+    """
+    # pylint: disable=protected-access
+    if not is_supported(connection):
+        LOGGER.warning(
+            "Not partitioning %s: PostgreSQL 11 or later is required.",
+            model._meta.db_table,
+        )
+        return False
+    if is_partitioned(model, connection.alias):
+        return False
+    _rebuild_table(model, connection, partitioned=True)
+    return True
+
+
+def unpartition_table(model, connection):
+    """Convert the partitioned table of a model into a plain table.
+
+    Args:
+        model: The model class.
+        connection: The database connection.
+
+    Returns: True if the table has been converted, False otherwise.
+
+    """
+    if not is_partitioned(model, connection.alias):
+        return False
+    _rebuild_table(model, connection, partitioned=False)
+    return True
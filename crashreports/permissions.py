@@ -7,6 +7,58 @@ from crashreports.models import Device
 from hiccup.allauth_adapters import FP_STAFF_GROUP_NAME
 
 
+# Names of the attributes used to cache the authorization details of a user.
+# The user instance is created anew for every request, so the cached values
+# live as long as the request, similarly to the permission cache of Django's
+# ModelBackend.
+_IS_HICCUP_STAFF_CACHE_NAME = "_hiccup_is_staff_cache"
+_OWNED_DEVICE_CACHE_NAME = "_hiccup_owned_device_cache"
+
+
+def cache_authorization_details(user, is_hiccup_staff, owned_device):
+    """Cache already known authorization details of a user.
+
+    Subsequent calls to `user_is_hiccup_staff` and `get_owned_device` for the
+    same user instance return the given values without querying them.
+
+    Args:
+        user: The user making the request.
+        is_hiccup_staff: Whether the user is part of the Hiccup staff.
+        owned_device: The device owned by the user or None.
+
+    """
+    setattr(user, _IS_HICCUP_STAFF_CACHE_NAME, is_hiccup_staff)
+    setattr(user, _OWNED_DEVICE_CACHE_NAME, owned_device)
+
+
+def get_owned_device(user):
+    """Get the device owned by a user.
+
+    The device is only looked up once per user instance, subsequent calls
+    return the cached result.
+
+    Args:
+        user: The user making the request.
+
+    Returns: The device owned by the user or None if there is none.
+
+    """
+    if not hasattr(user, _OWNED_DEVICE_CACHE_NAME):
+        try:
+            device = Device.objects.get(user=user)
+        except (ObjectDoesNotExist, TypeError):
+            # If the device does not exist or type of the given user is not
+            # correct, None is returned.
+            device = None
+        except Exception as exception:  # pylint: disable=broad-except
+            # All other exceptions are logged and None is returned without
+            # being cached.
+            logging.exception(exception)
+            return None
+        setattr(user, _OWNED_DEVICE_CACHE_NAME, device)
+    return getattr(user, _OWNED_DEVICE_CACHE_NAME)
+
+
 def user_owns_uuid(user, uuid):
     """Determine whether a user is owning the device with the given UUID.
 
@@ -17,26 +69,16 @@ def user_owns_uuid(user, uuid):
     Returns: True if the user owns the device.
 
     """
-    try:
-        device = Device.objects.get(user=user)
-    except (ObjectDoesNotExist, TypeError):
-        # If the device does not exist or type of the given user is not
-        # correct, False is returned.
-        return False
-    except Exception as exception:  # pylint: disable=broad-except
-        # All other exceptions are logged and False is returned.
-        logging.exception(exception)
-        return False
-    if uuid == device.uuid:
-        return True
-    return False
+    device = get_owned_device(user)
+    return device is not None and uuid == device.uuid
 
 
 def user_is_hiccup_staff(user):
     """Determine whether a user is part of the Hiccup staff.
 
     Returns true if either the user is part of the group
-    "FairphoneSoftwareTeam".
+    "FairphoneSoftwareTeam". The group membership is only queried once per
+    user instance, subsequent calls return the cached result.
 
     Args:
         user: The user making the request.
@@ -44,7 +86,13 @@ def user_is_hiccup_staff(user):
     Returns: True if user is part of the Hiccup staff.
 
     """
-    return user.groups.filter(name=FP_STAFF_GROUP_NAME).exists()
+    if not hasattr(user, _IS_HICCUP_STAFF_CACHE_NAME):
+        setattr(
+            user,
+            _IS_HICCUP_STAFF_CACHE_NAME,
+            user.groups.filter(name=FP_STAFF_GROUP_NAME).exists(),
+        )
+    return getattr(user, _IS_HICCUP_STAFF_CACHE_NAME)
 
 
 class HasStatsAccess(BasePermission):
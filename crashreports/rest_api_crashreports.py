@@ -2,7 +2,7 @@
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from django.utils.decorators import method_decorator
-from rest_framework import status, generics
+from rest_framework import status, generics, serializers
 from rest_framework.response import Response
 from rest_framework.exceptions import NotFound, ValidationError
 
@@ -10,7 +10,10 @@ from crashreports.permissions import (
     HasRightsOrIsDeviceOwnerDeviceCreation,
     SWAGGER_SECURITY_REQUIREMENTS_ALL,
 )
-from crashreports.serializers import CrashReportSerializer
+from crashreports.serializers import (
+    CrashReportBatchSerializer,
+    CrashReportSerializer,
+)
 from crashreports.utils import get_object_by_lookup_fields
 from crashreports.models import Crashreport
 from crashreports.response_descriptions import default_desc
@@ -93,6 +96,77 @@ class ListCreateView(generics.ListCreateAPIView):
         )
 
 
+class CreateCrashreportBatchResultSchema(serializers.Serializer):
+    """Response schema for the result of a crash report in a batch."""
+
+    # pylint: disable=abstract-method
+    # The schema is only used for documentation purposes.
+
+    status = serializers.ChoiceField(
+        choices=[
+            CrashReportBatchSerializer.RESULT_CREATED,
+            CrashReportBatchSerializer.RESULT_DUPLICATE,
+            CrashReportBatchSerializer.RESULT_INVALID,
+        ]
+    )
+    device_local_id = serializers.IntegerField(required=False)
+    errors = serializers.DictField(required=False)
+
+
+class CreateCrashreportBatchResponseSchema(serializers.Serializer):
+    """Response schema for successful crash report batch creation."""
+
+    # pylint: disable=abstract-method
+    # The schema is only used for documentation purposes.
+
+    results = CreateCrashreportBatchResultSchema(many=True)
+
+
+@method_decorator(
+    name="post",
+    decorator=swagger_auto_schema(
+        operation_description="Create multiple crash reports of a device",
+        security=SWAGGER_SECURITY_REQUIREMENTS_ALL,
+        request_body=CrashReportBatchSerializer,
+        responses=dict(
+            [
+                default_desc(ValidationError),
+                (
+                    status.HTTP_404_NOT_FOUND,
+                    openapi.Response(
+                        "No device with the given uuid could be found."
+                    ),
+                ),
+                (
+                    status.HTTP_201_CREATED,
+                    openapi.Response(
+                        "The batch has been processed. The results are in "
+                        "the same order as the crash reports of the batch.",
+                        CreateCrashreportBatchResponseSchema,
+                    ),
+                ),
+            ]
+        ),
+    ),
+)
+class BatchCreateView(generics.CreateAPIView):
+    """Endpoint for creating multiple crash reports of a device at once."""
+
+    permission_classes = (HasRightsOrIsDeviceOwnerDeviceCreation,)
+    serializer_class = CrashReportBatchSerializer
+
+    def create(self, request, *args, **kwargs):
+        """Create the crash reports of a batch.
+
+        The method is overridden in order to create a response containing the
+        result for each crash report of the batch.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save()
+        return Response({"results": results}, status.HTTP_201_CREATED)
+
+
 @method_decorator(
     name="get",
     decorator=swagger_auto_schema(
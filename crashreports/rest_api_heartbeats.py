@@ -3,16 +3,22 @@
 from django.utils.decorators import method_decorator
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework import generics, status
+from rest_framework import generics, serializers, status
 from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
 
+from crashreports import spool
 from crashreports.models import HeartBeat
 from crashreports.permissions import (
     HasRightsOrIsDeviceOwnerDeviceCreation,
     SWAGGER_SECURITY_REQUIREMENTS_ALL,
 )
 from crashreports.response_descriptions import default_desc
-from crashreports.serializers import HeartBeatSerializer
+from crashreports.serializers import (
+    HEARTBEAT_FAST_PATH,
+    HeartBeatBatchSerializer,
+    HeartBeatSerializer,
+)
 from crashreports.utils import get_object_by_lookup_fields
 
 
@@ -38,6 +44,13 @@ from crashreports.utils import get_object_by_lookup_fields
                         "No device with the given uuid could be found."
                     ),
                 ),
+                (
+                    status.HTTP_202_ACCEPTED,
+                    openapi.Response(
+                        "The heartbeat has been accepted and will be stored "
+                        "asynchronously."
+                    ),
+                ),
             ]
         ),
     ),
@@ -59,6 +72,106 @@ class ListCreateView(generics.ListCreateAPIView):
             )
         return generics.ListCreateAPIView.get(self, request, *args, **kwargs)
 
+    def create(self, request, *args, **kwargs):
+        """Create a heartbeat or append it to the ingestion spool.
+
+        The heartbeat is validated and represented through
+        `HEARTBEAT_FAST_PATH` instead of a new `HeartBeatSerializer`. It is
+        only spooled if asynchronous ingestion is enabled, see
+        `crashreports.spool`.
+        """
+        context = self.get_serializer_context()
+        validated_data = HEARTBEAT_FAST_PATH.validate(request.data)
+        if spool.is_enabled():
+            HEARTBEAT_FAST_PATH.append_to_spool(validated_data, context)
+            return Response(status=status.HTTP_202_ACCEPTED)
+        heartbeat = HEARTBEAT_FAST_PATH.create(validated_data, context)
+        return Response(
+            HEARTBEAT_FAST_PATH.to_representation(heartbeat, context),
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class CreateHeartbeatBatchResponseSchema(serializers.Serializer):
+    """Response schema for successful heartbeat batch creation."""
+
+    # pylint: disable=abstract-method
+    # The schema is only used for documentation purposes.
+
+    created = serializers.IntegerField()
+    duplicates = serializers.IntegerField()
+
+
+class AcceptHeartbeatBatchResponseSchema(serializers.Serializer):
+    """Response schema for heartbeat batches accepted for spooling."""
+
+    # pylint: disable=abstract-method
+    # The schema is only used for documentation purposes.
+
+    accepted = serializers.IntegerField()
+
+
+@method_decorator(
+    name="post",
+    decorator=swagger_auto_schema(
+        operation_description="Create multiple heartbeats of a device",
+        security=SWAGGER_SECURITY_REQUIREMENTS_ALL,
+        request_body=HeartBeatBatchSerializer,
+        responses=dict(
+            [
+                default_desc(ValidationError),
+                (
+                    status.HTTP_404_NOT_FOUND,
+                    openapi.Response(
+                        "No device with the given uuid could be found."
+                    ),
+                ),
+                (
+                    status.HTTP_201_CREATED,
+                    openapi.Response(
+                        "The heartbeats have been successfully created.",
+                        CreateHeartbeatBatchResponseSchema,
+                    ),
+                ),
+                (
+                    status.HTTP_202_ACCEPTED,
+                    openapi.Response(
+                        "The heartbeats have been accepted and will be stored "
+                        "asynchronously.",
+                        AcceptHeartbeatBatchResponseSchema,
+                    ),
+                ),
+            ]
+        ),
+    ),
+)
+class BatchCreateView(generics.CreateAPIView):
+    """Endpoint for creating multiple heartbeats of a device at once."""
+
+    permission_classes = (HasRightsOrIsDeviceOwnerDeviceCreation,)
+    serializer_class = HeartBeatBatchSerializer
+
+    def create(self, request, *args, **kwargs):
+        """Create the heartbeats of a batch.
+
+        The method is overridden in order to create a response containing only
+        the number of created heartbeats and dropped duplicates. If
+        asynchronous ingestion is enabled, the heartbeats are spooled instead
+        and the response contains the number of accepted heartbeats.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if spool.is_enabled():
+            return Response(
+                {"accepted": serializer.append_to_spool()},
+                status.HTTP_202_ACCEPTED,
+            )
+        created, duplicates = serializer.save()
+        return Response(
+            {"created": len(created), "duplicates": len(duplicates)},
+            status.HTTP_201_CREATED,
+        )
+
 
 @method_decorator(
     name="get",
@@ -1,5 +1,9 @@
 """REST API for accessing log files."""
+import logging
+
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
 from django.utils.decorators import method_decorator
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
@@ -19,6 +23,7 @@ from rest_framework.parsers import FileUploadParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from crashreports import content_storage, logfile_search, uploads
 from crashreports.response_descriptions import default_desc
 from crashreports.serializers import LogFileSerializer
 from crashreports.models import Crashreport, LogFile
@@ -29,6 +34,8 @@ from crashreports.permissions import (
     SWAGGER_SECURITY_REQUIREMENTS_ALL,
 )
 
+LOGGER = logging.getLogger(__name__)
+
 
 @method_decorator(
     name="get",
@@ -94,6 +101,7 @@ class RetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     responses=dict(
         [
             default_desc(ValidationError),
+            default_desc(uploads.LogFileTooLarge),
             (
                 status.HTTP_404_NOT_FOUND,
                 openapi.Response("Crashreport does not exist."),
@@ -107,6 +115,8 @@ class RetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
 @permission_classes([IsAuthenticated])
 def logfile_put(request, uuid, device_local_id, filename):
     """Upload a log file for a crash report."""
+    # The file name is part of the URL, but files are stored by content
+    # pylint: disable=unused-argument
     try:
         crashreport = Crashreport.objects.get(
             device__uuid=uuid, device_local_id=device_local_id
@@ -119,7 +129,89 @@ def logfile_put(request, uuid, device_local_id, filename):
         or user_is_hiccup_staff(request.user)
     ):
         raise PermissionDenied(detail="Not allowed.")
-    file = request.data["file"]
-    logfile = LogFile(crashreport=crashreport, logfile=file)
-    logfile.save()
+
+    logfile = LogFile(crashreport=crashreport)
+    _save_streamed_logfile(request, logfile)
+    if settings.HICCUP_LOGFILE_SEARCH_INDEX_ON_UPLOAD:
+        _index_logfile(logfile)
     return Response(status=201)
+
+
+def _index_logfile(logfile):
+    """Index the text of an uploaded log file for full-text search.
+
+    Failures are only logged, as the upload has been stored already and the
+    index_logfiles management command indexes log files left out.
+    """
+    try:
+        logfile_search.index_logfile(logfile)
+    except Exception:  # pylint: disable=broad-except
+        LOGGER.exception("Could not index log file %s.", logfile.id)
+
+
+def _save_streamed_logfile(request, logfile):
+    """Stream an uploaded log file to its storage path and save it.
+
+    The upload is written to disk chunk by chunk while the request body is
+    parsed, see `crashreports.uploads`. The log file instance is only saved
+    if the upload is a valid zip file.
+
+    Args:
+        request: The REST framework request.
+        logfile: The unsaved log file instance.
+
+    Raises:
+        LogFileTooLarge: If the upload exceeds the maximum size.
+        ValidationError: If the upload is missing or not a valid zip file.
+
+    """
+    max_size = settings.HICCUP_LOGFILE_MAX_SIZE
+    try:
+        content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        content_length = 0
+    if content_length > max_size:
+        raise uploads.LogFileTooLarge()
+
+    field = LogFile._meta.get_field(  # pylint: disable=protected-access
+        "logfile"
+    )
+    handler = uploads.LogFileUploadHandler(
+        request,
+        field.storage.path(content_storage.CONTENT_DIRECTORY),
+        max_size,
+    )
+    # The handlers have to be replaced before the request body is parsed
+    request._request.upload_handlers = [  # pylint: disable=protected-access
+        handler
+    ]
+    try:
+        uploaded_file = request.data.get("file")
+        if uploaded_file is None:
+            raise ValidationError("No log file uploaded.")
+        uploads.validate_zip(uploaded_file.temporary_file_path())
+        _save_logfile_content(logfile, uploaded_file, field.storage)
+    finally:
+        handler.discard()
+
+
+def _save_logfile_content(logfile, uploaded_file, storage):
+    """Save a log file referencing the stored file with the same content.
+
+    The uploaded file is only added to the storage if no file with the same
+    content is stored yet.
+    """
+    name = content_storage.content_file_name(uploaded_file.sha256)
+    with transaction.atomic():
+        content_storage.lock(name)
+        added = content_storage.add_file(
+            storage, uploaded_file.temporary_file_path(), name
+        )
+        logfile.logfile.name = name
+        logfile.sha256 = uploaded_file.sha256
+        try:
+            logfile.save()
+        except Exception:
+            if added:
+                storage.delete(name)
+            raise
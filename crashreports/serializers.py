@@ -1,13 +1,47 @@
 """Serializers for Crashreport-related models."""
+from collections import OrderedDict
+from collections.abc import Mapping
+
 from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.utils.dateparse import parse_datetime
 from rest_framework import serializers
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework import permissions
+from rest_framework.fields import SkipField, get_error_detail, set_value
+from rest_framework.settings import api_settings
 
+from crashreports import spool
 from crashreports.models import Crashreport, Device, HeartBeat, LogFile
-from crashreports.permissions import user_is_hiccup_staff
+from crashreports.permissions import get_owned_device, user_is_hiccup_staff
+
+
+def _get_device(uuid, context):
+    """Get the device with the given UUID.
+
+    If the device is owned by the requesting user, the device that has
+    already been resolved while checking the permissions is reused.
+
+    Args:
+        uuid: The UUID of the device.
+        context: The serializer context, including the request.
+
+    Returns: The device with the given UUID.
+
+    Raises:
+        NotFound: If there is no device with the given UUID.
+
+    """
+    request = context.get("request")
+    if request is not None and not user_is_hiccup_staff(request.user):
+        device = get_owned_device(request.user)
+        if device is not None and device.uuid == uuid:
+            return device
+    try:
+        return Device.objects.get(uuid=uuid)
+    except ObjectDoesNotExist:
+        raise NotFound(detail="uuid does not exist")
 
 
 class PrivateField(serializers.ReadOnlyField):
@@ -22,7 +56,13 @@ class PrivateField(serializers.ReadOnlyField):
         Given the *outgoing* object instance, return the primitive value
         that should be used for this field.
         """
-        if user_is_hiccup_staff(self.context["request"].user):
+        return self.get_attribute_for_user(
+            instance, self.context["request"].user
+        )
+
+    def get_attribute_for_user(self, instance, user):
+        """Get the private attribute as shown to the given user."""
+        if user_is_hiccup_staff(user):
             return super(PrivateField, self).get_attribute(instance)
         return -1
 
@@ -49,7 +89,7 @@ class CrashReportSerializer(serializers.ModelSerializer):
 
     class Meta:  # noqa: D106
         model = Crashreport
-        exclude = ("device",)
+        exclude = ("device", "signature")
 
     def create(self, validated_data):
         """Create a crashreport.
@@ -60,10 +100,7 @@ class CrashReportSerializer(serializers.ModelSerializer):
         Returns: The created report
 
         """
-        try:
-            device = Device.objects.get(uuid=validated_data["uuid"])
-        except ObjectDoesNotExist:
-            raise NotFound(detail="uuid does not exist")
+        device = _get_device(validated_data["uuid"], self.context)
         validated_data.pop("uuid", None)
         report = Crashreport(**validated_data)
         report.device = device
@@ -93,15 +130,11 @@ class HeartBeatSerializer(serializers.ModelSerializer):
         Returns: The created heartbeat
 
         """
-        try:
-            device = Device.objects.get(uuid=validated_data["uuid"])
-        except ObjectDoesNotExist:
-            raise NotFound(detail="uuid does not exist")
-        validated_data.pop("uuid", None)
-        heartbeat = HeartBeat(**validated_data)
-        heartbeat.device = device
-        heartbeat.save()
-        return heartbeat
+        return _create_heartbeat(validated_data, self.context)
+
+    def append_to_spool(self):
+        """Append the validated heartbeat to the ingestion spool."""
+        _append_heartbeat_to_spool(self.validated_data, self.context)
 
     def to_internal_value(self, data):
         """Parse serialized heartbeat representations.
@@ -110,16 +143,338 @@ class HeartBeatSerializer(serializers.ModelSerializer):
         changed so that only the date part of the value is deserialized.
         Initially, the date was a datetime field and Hiccup clients can still
         send datetime values.
+
+        Missing or invalid values, including dates that are not strings, are
+        reported as validation errors of the date field as usual.
         """
-        datetime = parse_datetime(data["date"])
-        if datetime:
+        value = data.get("date") if isinstance(data, Mapping) else None
+        date = _legacy_heartbeat_date(value) if isinstance(value, str) else None
+        if date is not None:
             updated_data = data.copy()
-            updated_data["date"] = datetime.date().isoformat()
+            updated_data["date"] = date
             data = updated_data
 
         return super(HeartBeatSerializer, self).to_internal_value(data)
 
 
+def _legacy_heartbeat_date(value):
+    """Get the date part of a legacy heartbeat datetime value.
+
+    Returns:
+        The date in ISO 8601 format or None if the value is not a datetime.
+
+    """
+    datetime = parse_datetime(value)
+    if datetime:
+        return datetime.date().isoformat()
+    return None
+
+
+def _create_heartbeat(validated_data, context):
+    """Create a heartbeat from validated data.
+
+    Args:
+        validated_data: Data of the heartbeat, including the device UUID
+        context: The serializer context, including the request.
+
+    Returns: The created heartbeat
+
+    """
+    device = _get_device(validated_data["uuid"], context)
+    validated_data.pop("uuid", None)
+    heartbeat = HeartBeat(**validated_data)
+    heartbeat.device = device
+    heartbeat.save()
+    return heartbeat
+
+
+def _append_heartbeat_to_spool(validated_data, context):
+    """Append a heartbeat to the ingestion spool.
+
+    Args:
+        validated_data: Data of the heartbeat, including the device UUID
+        context: The serializer context, including the request.
+
+    """
+    device = _get_device(validated_data["uuid"], context)
+    data = dict(validated_data)
+    data.pop("uuid", None)
+    spool.append(HeartBeat, device, [data])
+
+
+class HeartBeatFastPath:
+    """Fast path for validating, creating and representing single heartbeats.
+
+    Creating a `HeartBeatSerializer` builds its fields from the model for
+    every request, which takes most of the CPU time of a heartbeat request.
+    The fast path builds the fields of a `HeartBeatSerializer` once and
+    reuses them for all requests. Heartbeats are thus validated and
+    represented exactly as by `HeartBeatSerializer`, with the same error
+    responses and the same handling of legacy datetime values.
+    """
+
+    def __init__(self):
+        """Initialise the fast path, the fields are built on first use."""
+        self._fields = None
+
+    def _get_fields(self):
+        if self._fields is None:
+            self._fields = list(HeartBeatSerializer(context={}).fields.values())
+        return self._fields
+
+    def validate(self, data):
+        """Validate the data of a heartbeat.
+
+        Args:
+            data: The data of the heartbeat as sent in the request.
+
+        Returns: The validated data.
+
+        Raises:
+            ValidationError: If the data is invalid.
+
+        """
+        if not isinstance(data, Mapping):
+            raise ValidationError(
+                {
+                    api_settings.NON_FIELD_ERRORS_KEY: [
+                        serializers.Serializer.default_error_messages[
+                            "invalid"
+                        ].format(datatype=type(data).__name__)
+                    ]
+                },
+                code="invalid",
+            )
+
+        validated_data = OrderedDict()
+        errors = OrderedDict()
+        for field in self._get_fields():
+            if field.read_only:
+                continue
+            primitive_value = field.get_value(data)
+            if field.field_name == "date" and isinstance(primitive_value, str):
+                primitive_value = (
+                    _legacy_heartbeat_date(primitive_value) or primitive_value
+                )
+            try:
+                value = field.run_validation(primitive_value)
+            except ValidationError as exc:
+                errors[field.field_name] = exc.detail
+            except DjangoValidationError as exc:
+                errors[field.field_name] = get_error_detail(exc)
+            except SkipField:
+                pass
+            else:
+                set_value(validated_data, field.source_attrs, value)
+
+        if errors:
+            raise ValidationError(errors)
+        return validated_data
+
+    @staticmethod
+    def create(validated_data, context):
+        """Create a heartbeat, see `HeartBeatSerializer.create`."""
+        return _create_heartbeat(validated_data, context)
+
+    @staticmethod
+    def append_to_spool(validated_data, context):
+        """Append a heartbeat to the ingestion spool."""
+        _append_heartbeat_to_spool(validated_data, context)
+
+    def to_representation(self, heartbeat, context):
+        """Represent a heartbeat as `HeartBeatSerializer` does.
+
+        Args:
+            heartbeat: The heartbeat.
+            context: The serializer context, including the request.
+
+        Returns: The representation of the heartbeat.
+
+        """
+        representation = OrderedDict()
+        for field in self._get_fields():
+            if field.write_only:
+                continue
+            if isinstance(field, PrivateField):
+                attribute = field.get_attribute_for_user(
+                    heartbeat, context["request"].user
+                )
+            else:
+                try:
+                    attribute = field.get_attribute(heartbeat)
+                except SkipField:
+                    continue
+            if attribute is not None:
+                attribute = field.to_representation(attribute)
+            representation[field.field_name] = attribute
+        return representation
+
+
+HEARTBEAT_FAST_PATH = HeartBeatFastPath()
+
+
+class _ReportBatchSerializer(serializers.Serializer):
+    """Base serializer for a batch of reports sent by a single device.
+
+    Sub-classes MUST define the list field `reports_field_name` containing
+    the reports of the batch.
+    """
+
+    # pylint: disable=abstract-method
+    # Batches are only ever created, there is no instance to update.
+
+    MAX_BATCH_SIZE = 500
+
+    permission_classes = (permissions.IsAuthenticated,)
+    uuid = serializers.CharField(max_length=64)
+    reports_field_name = None
+
+    def _validate_batch_size(self, value):
+        """Validate the number of reports in the batch."""
+        if not value:
+            raise serializers.ValidationError("The batch is empty.")
+        if len(value) > self.MAX_BATCH_SIZE:
+            raise serializers.ValidationError(
+                "The batch contains more than {} {}.".format(
+                    self.MAX_BATCH_SIZE, self.reports_field_name
+                )
+            )
+        return value
+
+
+class HeartBeatBatchSerializer(_ReportBatchSerializer):
+    """Serializer for a batch of heartbeats sent by a single device."""
+
+    reports_field_name = "heartbeats"
+    heartbeats = HeartBeatSerializer(many=True)
+
+    def to_internal_value(self, data):
+        """Parse a serialized batch of heartbeats.
+
+        The UUID of the device is only sent once for the whole batch. It is
+        copied to each heartbeat so that the heartbeats can be validated the
+        same way as heartbeats that are sent one by one.
+        """
+        if (
+            isinstance(data, dict)
+            and "uuid" in data
+            and isinstance(data.get("heartbeats"), list)
+        ):
+            data = data.copy()
+            data["heartbeats"] = [
+                dict(heartbeat, uuid=data["uuid"])
+                if isinstance(heartbeat, dict)
+                else heartbeat
+                for heartbeat in data["heartbeats"]
+            ]
+
+        return super(HeartBeatBatchSerializer, self).to_internal_value(data)
+
+    def validate_heartbeats(self, value):
+        """Validate the number of heartbeats in the batch."""
+        return self._validate_batch_size(value)
+
+    def create(self, validated_data):
+        """Create the heartbeats of the batch.
+
+        Args:
+            validated_data: Data of the batch, including the device UUID
+
+        Returns:
+            The list of created heartbeats and the list of dropped duplicates.
+
+        """
+        device = _get_device(validated_data["uuid"], self.context)
+        heartbeats = []
+        for heartbeat_data in validated_data["heartbeats"]:
+            heartbeat_data.pop("uuid", None)
+            heartbeats.append(HeartBeat(**heartbeat_data))
+        return HeartBeat.bulk_create_for_device(device, heartbeats)
+
+    def append_to_spool(self):
+        """Append the validated heartbeats to the ingestion spool.
+
+        Returns: The number of spooled heartbeats.
+
+        """
+        device = _get_device(self.validated_data["uuid"], self.context)
+        heartbeats_data = []
+        for heartbeat_data in self.validated_data["heartbeats"]:
+            heartbeat_data = dict(heartbeat_data)
+            heartbeat_data.pop("uuid", None)
+            heartbeats_data.append(heartbeat_data)
+        spool.append(HeartBeat, device, heartbeats_data)
+        return len(heartbeats_data)
+
+
+class CrashReportBatchSerializer(_ReportBatchSerializer):
+    """Serializer for a batch of crash reports sent by a single device.
+
+    In contrast to heartbeat batches, the crash reports of a batch are
+    validated one by one so that a single invalid crash report does not
+    prevent the other ones from being stored.
+    """
+
+    RESULT_CREATED = "created"
+    RESULT_DUPLICATE = "duplicate"
+    RESULT_INVALID = "invalid"
+
+    reports_field_name = "crashreports"
+    crashreports = serializers.ListField(child=serializers.DictField())
+
+    def validate_crashreports(self, value):
+        """Validate the number of crash reports in the batch."""
+        return self._validate_batch_size(value)
+
+    def create(self, validated_data):
+        """Create the valid crash reports of the batch.
+
+        Args:
+            validated_data: Data of the batch, including the device UUID
+
+        Returns:
+            The result for each crash report, in the same order as in the
+            batch. Each result contains the `status` of the crash report
+            (`created`, `duplicate` or `invalid`) and either its
+            `device_local_id` or the validation `errors`.
+
+        """
+        device = _get_device(validated_data["uuid"], self.context)
+        results = []
+        crashreports = []
+        for crashreport_data in validated_data["crashreports"]:
+            serializer = CrashReportSerializer(
+                data=dict(crashreport_data, uuid=validated_data["uuid"])
+            )
+            if serializer.is_valid():
+                serializer.validated_data.pop("uuid", None)
+                crashreport = Crashreport(**serializer.validated_data)
+                crashreports.append(crashreport)
+                results.append(crashreport)
+            else:
+                results.append(
+                    {
+                        "status": self.RESULT_INVALID,
+                        "errors": serializer.errors,
+                    }
+                )
+
+        Crashreport.bulk_create_for_device(device, crashreports)
+
+        # Only the created crash reports have been assigned a primary key
+        return [
+            {
+                "status": self.RESULT_CREATED
+                if result.pk
+                else self.RESULT_DUPLICATE,
+                "device_local_id": result.device_local_id,
+            }
+            if isinstance(result, Crashreport)
+            else result
+            for result in results
+        ]
+
+
 class LogFileSerializer(serializers.ModelSerializer):
     """Serializer for LogFile instances."""
 
@@ -128,6 +483,7 @@ class LogFileSerializer(serializers.ModelSerializer):
     class Meta:  # noqa: D106
         model = LogFile
         fields = "__all__"
+        read_only_fields = ("sha256",)
 
 
 class DeviceSerializer(serializers.ModelSerializer):
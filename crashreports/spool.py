@@ -0,0 +1,247 @@
+"""Spool for storing heartbeats asynchronously.
+
+When `HICCUP_INGESTION_SPOOL_DIR` is set, validated heartbeats are not
+inserted into the database by the request that sent them.
+Instead, they are appended to a spool file in that directory and the request
+is answered right away. The `drain_spool` management command later inserts
+the spooled reports in bulk. Bursts of incoming reports thereby no longer
+wait for the database.
+
+Each worker process appends to its own spool file, one JSON record per line.
+Appending and draining are synchronised with file locks: The drain command
+renames a spool file before reading it, and writers re-open their spool file
+when they notice that it has been renamed.
+
+Reports are deduplicated when the spool is drained, exactly as if they had
+been sent synchronously, see `HeartBeat.save()`.
+
+Crash reports are not spooled: A device needs the local ID of a crash report
+to upload its log files, and a retried crash report must get the local ID of
+the stored one. Spool files may still contain crash reports appended by
+previous versions, which are drained like heartbeats. Spool files are read
+in chunks of `_CHUNK_SIZE` records, so that draining does not depend on the
+size of the spool files.
+"""
+import fcntl
+import glob
+import itertools
+import json
+import logging
+import os
+import socket
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from crashreports.models import Crashreport, Device, HeartBeat
+
+LOGGER = logging.getLogger(__name__)
+
+SPOOL_FILE_EXTENSION = ".spool"
+DRAINING_FILE_EXTENSION = ".draining"
+
+REPORT_TYPES = {"heartbeat": HeartBeat, "crashreport": Crashreport}
+
+_CHUNK_SIZE = 10000
+
+
+def is_enabled():
+    """Check whether incoming reports should be spooled."""
+    return bool(settings.HICCUP_INGESTION_SPOOL_DIR)
+
+
+class _SpoolWriter:
+    """Writer appending records to the spool file of the current process."""
+
+    def __init__(self):
+        """Initialise the writer."""
+        self._lock = threading.Lock()
+        self._file = None
+        self._path = None
+
+    def _get_path(self):
+        return os.path.join(
+            settings.HICCUP_INGESTION_SPOOL_DIR,
+            "{}-{}{}".format(
+                socket.gethostname(), os.getpid(), SPOOL_FILE_EXTENSION
+            ),
+        )
+
+    def _open(self):
+        """Open the spool file and lock it exclusively.
+
+        The spool file is re-opened if it has been renamed by the drain
+        command since it has been opened.
+        """
+        path = self._get_path()
+        while True:
+            if self._file is None or self._path != path:
+                if self._file is not None:
+                    self._file.close()
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._file = open(path, "ab")
+                self._path = path
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                if os.stat(path).st_ino == os.fstat(self._file.fileno()).st_ino:
+                    return
+            except FileNotFoundError:
+                pass
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+    def append(self, lines):
+        """Append lines to the spool file of the current process.
+
+        Args:
+            lines: The encoded lines, each ending with a newline.
+
+        """
+        with self._lock:
+            self._open()
+            try:
+                self._file.write(b"".join(lines))
+                self._file.flush()
+                if settings.HICCUP_INGESTION_SPOOL_FSYNC:
+                    os.fsync(self._file.fileno())
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+
+_WRITER = _SpoolWriter()
+
+
+def append(report_type, device, reports_data):
+    """Append reports of a device to the spool.
+
+    Args:
+        report_type: The class of the reports.
+        device: The device that sent the reports.
+        reports_data:
+            The validated data of each report, excluding the device.
+
+    """
+    type_name = next(
+        name for name, model in REPORT_TYPES.items() if model == report_type
+    )
+    _WRITER.append(
+        [
+            json.dumps(
+                {"type": type_name, "device": device.id, "data": data},
+                cls=DjangoJSONEncoder,
+            ).encode()
+            + b"\n"
+            for data in reports_data
+        ]
+    )
+
+
+def _to_report(report_type, data):
+    """Create an unsaved report instance from spooled data."""
+    # pylint: disable=protected-access
+    return report_type(
+        **{
+            name: report_type._meta.get_field(name).to_python(value)
+            for name, value in data.items()
+        }
+    )
+
+
+def _read_records(path):
+    """Read the records of a spool file.
+
+    Records that can not be decoded, for example because the writing process
+    has been killed while appending them, are logged and skipped.
+    """
+    with open(path, "rb") as spool_file:
+        for line_number, line in enumerate(spool_file, start=1):
+            try:
+                yield json.loads(line.decode())
+            except ValueError:
+                LOGGER.warning(
+                    "Skipping corrupt record in line %d of %s.",
+                    line_number,
+                    path,
+                )
+
+
+def _store_records(records, batch_size):
+    """Store a chunk of spooled reports, grouped by type and device.
+
+    Returns:
+        The number of created reports and the number of dropped duplicates.
+
+    """
+    reports = defaultdict(list)
+    for record in records:
+        reports[(record["type"], record["device"])].append(record["data"])
+
+    devices = Device.objects.in_bulk({device_id for _, device_id in reports})
+    created_count = duplicates_count = 0
+    for (type_name, device_id), reports_data in reports.items():
+        device = devices.get(device_id)
+        if device is None:
+            LOGGER.warning(
+                "Dropping %d spooled %s reports of deleted device %d.",
+                len(reports_data),
+                type_name,
+                device_id,
+            )
+            continue
+        report_type = REPORT_TYPES[type_name]
+        for start in range(0, len(reports_data), batch_size):
+            end = start + batch_size
+            batch = reports_data[start:end]
+            created, duplicates = report_type.bulk_create_for_device(
+                device, [_to_report(report_type, data) for data in batch]
+            )
+            created_count += len(created)
+            duplicates_count += len(duplicates)
+    return created_count, duplicates_count
+
+
+def drain(batch_size=500):
+    """Insert all spooled reports into the database.
+
+    Spool files are renamed before they are drained so that writers start a
+    new spool file. Files that have been renamed but not deleted by a
+    previous, interrupted run are drained again. As duplicates are dropped,
+    this does not create any report twice. Only a single drain may run at a
+    time.
+
+    Args:
+        batch_size: The maximum number of reports inserted at once.
+
+    Returns:
+        The number of created reports and the number of dropped duplicates.
+
+    """
+    spool_dir = settings.HICCUP_INGESTION_SPOOL_DIR
+    for path in glob.glob(os.path.join(spool_dir, "*" + SPOOL_FILE_EXTENSION)):
+        os.rename(path, path + DRAINING_FILE_EXTENSION)
+
+    created_count = duplicates_count = 0
+    for path in sorted(
+        glob.glob(
+            os.path.join(
+                spool_dir,
+                "*" + SPOOL_FILE_EXTENSION + DRAINING_FILE_EXTENSION,
+            )
+        )
+    ):
+        with open(path, "rb") as spool_file:
+            # Wait for writers that are still appending to the renamed file
+            fcntl.flock(spool_file, fcntl.LOCK_EX)
+            records = _read_records(path)
+            while True:
+                chunk = list(itertools.islice(records, _CHUNK_SIZE))
+                if not chunk:
+                    break
+                created, duplicates = _store_records(chunk, batch_size)
+                created_count += created
+                duplicates_count += duplicates
+            os.remove(path)
+    return created_count, duplicates_count
@@ -0,0 +1,166 @@
+"""Tests for the archival of old reports."""
+import datetime
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+import pytz
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from crashreports import archive, logfile_search
+from crashreports.models import Crashreport, HeartBeat, LogFile, LogFileText
+from crashreports.tests.utils import Dummy
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(".hiccup-tests"))
+class ArchiveTestCase(TestCase):
+    """Test archiving and restoring the reports of a month."""
+
+    MONTH = datetime.date(2018, 3, 1)
+
+    def setUp(self):
+        """Create a device with reports in and after the archived month."""
+        self.archive_dir = tempfile.mkdtemp(".hiccup-archive")
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+        self.device = Dummy.create_device(Dummy.create_user())
+        self.heartbeat = Dummy.create_report(
+            HeartBeat, self.device, date=datetime.date(2018, 3, 31)
+        )
+        self.crashreport = Dummy.create_report(
+            Crashreport,
+            self.device,
+            date=datetime.datetime(2018, 3, 2, 10, tzinfo=pytz.utc),
+        )
+        self.crashreport.tags.add("reviewed")
+        (
+            self.logfile,
+            self.logfile_path,
+        ) = Dummy.create_log_file_with_actual_file(self.crashreport)
+        self.later_heartbeat = Dummy.create_report(
+            HeartBeat, self.device, date=datetime.date(2018, 4, 1)
+        )
+
+    def _archive(self, counted_until=None):
+        return archive.archive_month(
+            self.archive_dir,
+            self.MONTH,
+            counted_until or timezone.now(),
+            chunk_size=1,
+        )
+
+    def test_get_archivable_months(self):
+        """Test that only months ending before the given date are listed."""
+        self.assertEqual(
+            archive.get_archivable_months(datetime.date(2018, 4, 30)),
+            [self.MONTH],
+        )
+
+    def test_archive_month(self):
+        """Test that the reports of a month are archived and deleted."""
+        path, deleted = self._archive()
+
+        self.assertEqual(
+            deleted, {"heartbeat": 1, "crashreport": 1, "logfile": 1}
+        )
+        with gzip.open(path, "rt") as archive_file:
+            records = [json.loads(line) for line in archive_file]
+        self.assertEqual(
+            [record["type"] for record in records],
+            ["heartbeat", "logfile", "crashreport"],
+        )
+        self.assertEqual(records[2]["tags"], ["reviewed"])
+        [(_, manifest)] = archive.get_archives(self.archive_dir, self.MONTH)
+        self.assertEqual(manifest["month"], "2018-03")
+        archive.verify(path, manifest)
+
+        self.assertEqual(
+            list(HeartBeat.objects.values_list("id", flat=True)),
+            [self.later_heartbeat.id],
+        )
+        self.assertFalse(Crashreport.objects.exists())
+        self.assertFalse(LogFile.objects.exists())
+        self.assertFalse(os.path.exists(self.logfile_path))
+
+    def test_archive_month_deletes_indexed_texts(self):
+        """Test that archived log files are no longer found by searches."""
+        logfile_search.index_logfile(self.logfile)
+
+        self._archive()
+
+        self.assertFalse(LogFileText.objects.exists())
+
+    def test_archive_month_keeps_shared_indexed_texts(self):
+        """Test that texts shared with log files that are kept are kept."""
+        later_crashreport = Dummy.create_report(
+            Crashreport,
+            self.device,
+            date=datetime.datetime(2018, 4, 2, 10, tzinfo=pytz.utc),
+        )
+        later_logfile, _ = Dummy.create_log_file_with_actual_file(
+            later_crashreport
+        )
+        logfile_search.index_logfile(self.logfile)
+        logfile_search.index_logfile(later_logfile)
+
+        self._archive()
+
+        self.assertTrue(LogFileText.objects.exists())
+
+    def test_uncounted_reports_not_archived(self):
+        """Test that reports created after the given time are kept."""
+        path, deleted = self._archive(
+            counted_until=self.heartbeat.created_at - datetime.timedelta(1)
+        )
+
+        self.assertIsNone(path)
+        self.assertFalse(deleted)
+        self.assertEqual(HeartBeat.objects.count(), 2)
+
+    def test_late_reports_archived_to_additional_part(self):
+        """Test that archiving a month again creates another part."""
+        self._archive()
+        Dummy.create_report(
+            HeartBeat, self.device, date=datetime.date(2018, 3, 15)
+        )
+
+        self._archive()
+
+        archives = archive.get_archives(self.archive_dir, self.MONTH)
+        self.assertEqual(len(archives), 2)
+        self.assertEqual(archives[1][1]["counts"], {"heartbeat": 1})
+
+    def test_restore_month(self):
+        """Test that archived reports are restored with their IDs."""
+        self._archive()
+
+        restored = archive.restore_month(
+            self.archive_dir, self.MONTH, chunk_size=1
+        )
+
+        self.assertEqual(
+            restored, {"heartbeat": 1, "crashreport": 1, "logfile": 1}
+        )
+        crashreport = Crashreport.objects.get(id=self.crashreport.id)
+        self.assertEqual(
+            crashreport.device_local_id, self.crashreport.device_local_id
+        )
+        self.assertEqual(list(crashreport.tags.names()), ["reviewed"])
+        self.assertTrue(HeartBeat.objects.filter(id=self.heartbeat.id))
+        self.assertEqual(crashreport.logfiles.get().id, self.logfile.id)
+        self.assertTrue(os.path.isfile(self.logfile_path))
+
+        # Restoring again does not duplicate any report
+        restored = archive.restore_month(self.archive_dir, self.MONTH)
+        self.assertEqual(sum(restored.values()), 0)
+
+    def test_restore_corrupt_archive(self):
+        """Test that archives not matching their manifest are rejected."""
+        path, _ = self._archive()
+        with open(path, "ab") as archive_file:
+            archive_file.write(b"garbage")
+
+        with self.assertRaises(archive.ArchiveError):
+            archive.restore_month(self.archive_dir, self.MONTH)
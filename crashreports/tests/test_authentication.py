@@ -0,0 +1,97 @@
+"""Tests for the cached token authentication."""
+
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from crashreports.models import Device
+from crashreports.tests.utils import Dummy, HiccupCrashreportsAPITestCase
+from hiccup.allauth_adapters import FP_STAFF_GROUP_NAME
+
+
+class CachedTokenAuthenticationTestCase(HiccupCrashreportsAPITestCase):
+    """Test cases for caching the details of device tokens."""
+
+    # pylint: disable=too-many-ancestors
+
+    LIST_CREATE_URL = "api_v1_heartbeats"
+
+    def setUp(self):
+        """Register a device."""
+        super(CachedTokenAuthenticationTestCase, self).setUp()
+        self.uuid, self.user, self.token = self._register_device()
+
+    def _create_heartbeat(self, **kwargs):
+        return self.user.post(
+            reverse(self.LIST_CREATE_URL),
+            Dummy.heartbeat_data(uuid=self.uuid, **kwargs),
+        )
+
+    @staticmethod
+    def _queries_from(queries, table):
+        return [
+            query
+            for query in queries.captured_queries
+            if 'FROM "{}"'.format(table) in query["sql"]
+        ]
+
+    def test_cached_across_requests(self):
+        """Test that the token is only resolved by the first request."""
+        response = self._create_heartbeat(date=Dummy.DATES[0])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self._create_heartbeat(date=Dummy.DATES[1])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        for table in ["authtoken_token", "auth_user", "auth_group"]:
+            self.assertEqual(self._queries_from(queries, table), [])
+
+    def test_token_deleted(self):
+        """Test that deleting a token invalidates the cached details."""
+        self._create_heartbeat(date=Dummy.DATES[0])
+        Token.objects.filter(key=self.token).delete()
+
+        response = self._create_heartbeat(date=Dummy.DATES[1])
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_deactivated(self):
+        """Test that deactivating a user invalidates the cached details."""
+        self._create_heartbeat(date=Dummy.DATES[0])
+        user = Token.objects.get(key=self.token).user
+        user.is_active = False
+        user.save()
+
+        response = self._create_heartbeat(date=Dummy.DATES[1])
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_device_deleted(self):
+        """Test that deleting a device invalidates the cached details."""
+        self._create_heartbeat(date=Dummy.DATES[0])
+        Device.objects.filter(uuid=self.uuid).delete()
+
+        response = self._create_heartbeat(date=Dummy.DATES[1])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_staff_group_membership_changed(self):
+        """Test that changing the group membership invalidates the cache."""
+        other_uuid, _, _ = self._register_device()
+        response = self.user.get(
+            reverse("api_v1_heartbeats_by_uuid", args=[other_uuid])
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        fp_staff_group = Group.objects.get(name=FP_STAFF_GROUP_NAME)
+        Token.objects.get(key=self.token).user.groups.add(fp_staff_group)
+        response = self.user.get(
+            reverse("api_v1_heartbeats_by_uuid", args=[other_uuid])
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        fp_staff_group.user_set.clear()
+        response = self.user.get(
+            reverse("api_v1_heartbeats_by_uuid", args=[other_uuid])
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
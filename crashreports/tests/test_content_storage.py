@@ -0,0 +1,57 @@
+"""Tests for the content-addressed storage of log files."""
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from crashreports.content_storage import content_file_name, file_sha256
+from crashreports.models import Crashreport, LogFile
+from crashreports.tests.utils import Dummy
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(".hiccup-tests"))
+class DedupeLogfilesCommandTestCase(TestCase):
+    """Test the command moving log files to the content-addressed storage."""
+
+    def setUp(self):
+        """Create a device."""
+        self.addCleanup(shutil.rmtree, settings.MEDIA_ROOT, True)
+        self.device = Dummy.create_device(Dummy.create_user())
+
+    def _create_stored_logfile(self):
+        """Create a log file stored in the directory of its crash report."""
+        crashreport = Dummy.create_report(Crashreport, self.device)
+        logfile, path = Dummy.create_log_file_with_actual_file(crashreport)
+        logfile.logfile.name = os.path.relpath(path, settings.MEDIA_ROOT)
+        logfile.save()
+        return logfile, path
+
+    def test_identical_logfiles_deduplicated(self):
+        """Test that log files with identical content share one file."""
+        logfile_1, path_1 = self._create_stored_logfile()
+        logfile_2, path_2 = self._create_stored_logfile()
+        sha256 = file_sha256(path_1)
+
+        call_command("dedupe_logfiles", jobs=2, verbosity=0)
+
+        for logfile in [logfile_1, logfile_2]:
+            logfile.refresh_from_db()
+            self.assertEqual(logfile.logfile.name, content_file_name(sha256))
+            self.assertEqual(logfile.sha256, sha256)
+        self.assertTrue(os.path.isfile(logfile_1.logfile.path))
+        self.assertFalse(os.path.exists(path_1))
+        self.assertFalse(os.path.exists(path_2))
+
+    def test_unreferenced_files_kept(self):
+        """Test that files not referenced by any log file are kept."""
+        logfile, path = self._create_stored_logfile()
+        logfile.delete()
+        shutil.copy(Dummy.DEFAULT_LOG_FILE_PATHS[0], path)
+
+        call_command("dedupe_logfiles", verbosity=0)
+
+        self.assertTrue(os.path.isfile(path))
+        self.assertFalse(LogFile.objects.exists())
@@ -0,0 +1,103 @@
+"""Tests for the extraction of crash signatures from log files."""
+import os
+import shutil
+import tempfile
+import zipfile
+
+from django.test import TestCase
+
+from crashreports import crash_signatures
+from crashreports.tests.utils import Dummy
+
+KERNEL_PANIC_LINES = [
+    b"[  100.101] Unable to handle kernel NULL pointer dereference at "
+    b"virtual address 00000008",
+    b"[  100.102] Internal error: Oops: 17 [#1] PREEMPT SMP ARM",
+    b"[  100.103] PC is at msm_vidc_open+0x1c/0x30",
+    b"[  100.104] Kernel panic - not syncing: Fatal exception",
+]
+
+
+class CrashSignaturesTestCase(TestCase):
+    """Test parsing the crash signatures of logs."""
+
+    def _assert_signature_is(self, lines, kind, signature):
+        self.assertEqual(
+            crash_signatures.parse_lines(line + b"\n" for line in lines),
+            (kind, signature),
+        )
+
+    def test_kernel_panic(self):
+        """Test that kernel panics are identified by the faulting function."""
+        self._assert_signature_is(
+            KERNEL_PANIC_LINES,
+            crash_signatures.KIND_KERNEL_PANIC,
+            "NULL pointer dereference at msm_vidc_open",
+        )
+
+    def test_kernel_panic_without_program_counter(self):
+        """Test that kernel panics are identified by their reason."""
+        self._assert_signature_is(
+            [b"<0>[ 12.5] Kernel panic - not syncing: Out of memory [1234]."],
+            crash_signatures.KIND_KERNEL_PANIC,
+            "Out of memory [<n>]",
+        )
+
+    def test_watchdog(self):
+        """Test that watchdogs take precedence over kernel panics."""
+        self._assert_signature_is(
+            [
+                b"[ 3.1] BUG: soft lockup - CPU#2 stuck for 22s! [swapper:0]",
+                b"[ 3.2] PC is at _raw_spin_lock+0x10/0x20",
+                b"[ 3.3] Kernel panic - not syncing: softlockup: hung tasks",
+            ],
+            crash_signatures.KIND_WATCHDOG,
+            "soft lockup at _raw_spin_lock",
+        )
+
+    def test_modem_crash(self):
+        """Test that modem crashes take precedence over kernel panics."""
+        self._assert_signature_is(
+            [
+                b"[ 5.0] pil-q6v5-mss fc880000.qcom,mss: modem subsystem "
+                b"failure reason: mcfg_nv.c:1090:Assertion fail.",
+                b"[ 5.1] Kernel panic - not syncing: subsys-restart: "
+                b"Resetting the SoC - modem crashed.",
+            ],
+            crash_signatures.KIND_MODEM_CRASH,
+            "mcfg_nv.c:<n>:Assertion fail",
+        )
+
+    def test_same_signature_for_different_addresses(self):
+        """Test that addresses and numbers are normalised."""
+        self.assertEqual(
+            crash_signatures.normalise("bad page at 0xc0ffee42 (pid 1234)"),
+            crash_signatures.normalise("bad page at 0xdeadbeef (pid 42)"),
+        )
+
+    def test_unknown(self):
+        """Test that logs without crash are given the unknown signature."""
+        self._assert_signature_is(
+            [b"[ 1.0] Booting Linux"], crash_signatures.KIND_UNKNOWN, ""
+        )
+
+    def test_parse_logfile(self):
+        """Test parsing the members of a log file archive."""
+        directory = tempfile.mkdtemp(".hiccup-tests")
+        self.addCleanup(shutil.rmtree, directory, True)
+        path = os.path.join(directory, "logfile.zip")
+        shutil.copy(Dummy.DEFAULT_LOG_FILE_PATHS[0], path)
+        self.assertEqual(
+            crash_signatures.parse_logfile(path),
+            (crash_signatures.KIND_UNKNOWN, ""),
+        )
+
+        with zipfile.ZipFile(path, "a") as zip_file:
+            zip_file.writestr("last_kmsg", b"\n".join(KERNEL_PANIC_LINES))
+        self.assertEqual(
+            crash_signatures.parse_logfile(path),
+            (
+                crash_signatures.KIND_KERNEL_PANIC,
+                "NULL pointer dereference at msm_vidc_open",
+            ),
+        )
@@ -0,0 +1,97 @@
+"""Tests for the full-text search over log files."""
+import shutil
+import tempfile
+import zipfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from crashreports import logfile_search
+from crashreports.models import Crashreport, LogFileText
+from crashreports.tests.utils import Dummy
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(".hiccup-tests"))
+class LogFileSearchTestCase(TestCase):
+    """Test indexing and searching the text of log files."""
+
+    # A line of the dmesg.log member of the default log file
+    LINE = "KPI: Kernel MPM Clock frequency = 32768"
+
+    def setUp(self):
+        """Create a device with a crash report and a log file."""
+        self.addCleanup(shutil.rmtree, settings.MEDIA_ROOT, True)
+        self.device = Dummy.create_device(Dummy.create_user())
+        self.logfile, self.path = self._create_logfile()
+
+    def _create_logfile(self):
+        crashreport = Dummy.create_report(Crashreport, self.device)
+        return Dummy.create_log_file_with_actual_file(crashreport)
+
+    def test_iter_text_parts(self):
+        """Test that the text of a member is split up into parts."""
+        parts = list(logfile_search.iter_text_parts(self.path, part_size=1024))
+
+        self.assertTrue(all(len(text) <= 1024 for _, _, text in parts))
+        self.assertEqual(
+            "".join(text for _, _, text in parts),
+            Dummy.read_logfile_contents(
+                self.path, Dummy.DEFAULT_LOG_FILE_NAME
+            ).decode(),
+        )
+
+    def test_search(self):
+        """Test that log files containing a text are found."""
+        self.assertTrue(logfile_search.index_logfile(self.logfile))
+
+        for text in [self.LINE, self.LINE.lower(), "MPM Clock"]:
+            self.assertEqual(
+                list(logfile_search.search(text)), [self.logfile], text
+            )
+        for text in ["Clock MPM", "kernel panic"]:
+            self.assertFalse(logfile_search.search(text).exists(), text)
+
+    def test_identical_logfiles_indexed_once(self):
+        """Test that the text of identical log files is shared."""
+        other_logfile, _ = self._create_logfile()
+        logfile_search.index_logfile(self.logfile)
+        parts = LogFileText.objects.count()
+
+        self.assertFalse(logfile_search.index_logfile(other_logfile))
+
+        self.assertEqual(LogFileText.objects.count(), parts)
+        self.assertEqual(
+            set(logfile_search.search(self.LINE)),
+            {self.logfile, other_logfile},
+        )
+
+    def test_texts_deleted_with_last_logfile(self):
+        """Test that the text is deleted with the last log file using it."""
+        other_logfile, _ = self._create_logfile()
+        logfile_search.index_logfile(self.logfile)
+        logfile_search.index_logfile(other_logfile)
+
+        self.logfile.delete()
+        self.assertTrue(LogFileText.objects.exists())
+        other_logfile.delete()
+        self.assertFalse(LogFileText.objects.exists())
+
+    def test_index_logfiles_command(self):
+        """Test that the command indexes log files not indexed yet."""
+        call_command("index_logfiles", jobs=1, verbosity=0)
+
+        self.assertEqual(
+            list(logfile_search.search(self.LINE)), [self.logfile]
+        )
+
+    def test_index_logfiles_command_skips_invalid_files(self):
+        """Test that log files that are not zip files are skipped."""
+        with open(self.path, "wb") as logfile:
+            logfile.write(b"not a zip file")
+
+        call_command("index_logfiles", jobs=1, verbosity=0)
+
+        self.assertFalse(LogFileText.objects.exists())
+        with self.assertRaises(zipfile.BadZipFile):
+            logfile_search.index_logfile(self.logfile)
@@ -1,17 +1,67 @@
 """Tests for the Django database migrations."""
 import logging
 import os
+import shutil
 import tempfile
 from datetime import datetime, date
 
 import pytz
+from django.conf import settings
 from django.test import TransactionTestCase, override_settings
 from django.db.migrations.executor import MigrationExecutor
 from django.db import connection
 
-from crashreports.models import Crashreport, HeartBeat, LogFile
+from crashreports.models import crashreport_file_name
 from crashreports.tests.utils import Dummy
 
+# Heartbeat dates are timestamps before the migrations are applied
+_REPORT_DATE = datetime(2018, 3, 19, 12, 0, 0, tzinfo=pytz.utc)
+
+
+def _create_device(apps):
+    """Create a dummy device with the historical models."""
+    user = apps.get_model("auth", "User").objects.create(
+        **Dummy.DEFAULT_USER_VALUES
+    )
+    return apps.get_model("crashreports", "Device").objects.create(
+        user=user, **Dummy.DEFAULT_DEVICE_VALUES
+    )
+
+
+def _create_report(apps, model_name, device, device_local_id, **kwargs):
+    """Create a dummy report with the historical models.
+
+    The current models cannot be used as their tables have columns that do
+    not exist before the migrations are applied.
+    """
+    if model_name == "HeartBeat":
+        data = Dummy.heartbeat_data(**kwargs)
+    else:
+        data = Dummy.crashreport_data(**kwargs)
+    return apps.get_model("crashreports", model_name).objects.create(
+        device=device, device_local_id=device_local_id, **data
+    )
+
+
+def _create_log_file_with_actual_file(apps, crashreport, source_path):
+    """Create a dummy log file along with a file with the historical models.
+
+    Returns: The path to the copied file.
+
+    """
+    logfile = apps.get_model("crashreports", "LogFile")(
+        crashreport=crashreport, crashreport_local_id=1
+    )
+    logfile.logfile = crashreport_file_name(
+        logfile, os.path.basename(source_path)
+    )
+    logfile.save()
+
+    path = os.path.join(settings.MEDIA_ROOT, logfile.logfile.name)
+    os.makedirs(os.path.dirname(path))
+    shutil.copy(source_path, path)
+    return path
+
 
 class MigrationTestCase(TransactionTestCase):
     """Test for Django database migrations."""
@@ -29,11 +79,14 @@ class MigrationTestCase(TransactionTestCase):
 
         self.executor = MigrationExecutor(connection)
         self.executor.migrate(self.migrate_from)
+        # The historical models matching the current state of the database
+        self.apps = self.executor.loader.project_state(self.migrate_from).apps
 
     def migrate_to_dest(self):
         """Migrate the database to the desired destination migration."""
         self.executor.loader.build_graph()
         self.executor.migrate(self.migrate_to)
+        self.apps = self.executor.loader.project_state(self.migrate_to).apps
 
 
 @override_settings(MEDIA_ROOT=tempfile.mkdtemp(".hiccup-tests"))
@@ -47,20 +100,22 @@ class DropDuplicatesMigrationTestCase(MigrationTestCase):
 
     def test_duplicate_heartbeats_are_deleted(self):
         """Test that duplicate heartbeats are deleted after migrating."""
-        self._assert_duplicates_are_deleted(HeartBeat)
+        self._assert_duplicates_are_deleted("HeartBeat")
 
     def test_duplicate_crashreports_are_deleted(self):
         """Test that duplicate crashreports are deleted after migrating."""
-        self._assert_duplicates_are_deleted(Crashreport)
+        self._assert_duplicates_are_deleted("Crashreport")
 
-    def _assert_duplicates_are_deleted(self, object_type):
+    def _assert_duplicates_are_deleted(self, model_name):
         # Create a user, device and two duplicate reports
-        user = Dummy.create_user()
-        device = Dummy.create_device(user)
-        report_1 = Dummy.create_report(object_type, device)
-        Dummy.create_report(object_type, device)
+        device = _create_device(self.apps)
+        report_1 = _create_report(
+            self.apps, model_name, device, 1, date=_REPORT_DATE
+        )
+        _create_report(self.apps, model_name, device, 2, date=_REPORT_DATE)
 
         # Assert that 2 instances have been created
+        object_type = self.apps.get_model("crashreports", model_name)
         self.assertEqual(object_type.objects.count(), 2)
 
         # Run the migration
@@ -68,20 +123,23 @@ class DropDuplicatesMigrationTestCase(MigrationTestCase):
         with self.assertLogs(logger, "DEBUG") as logging_watcher:
             self.migrate_to_dest()
 
-        # Assert the correct message is logged
+        # Assert the correct message is logged, with the date as converted by
+        # the migration
+        object_type = self.apps.get_model("crashreports", model_name)
+        report_date = object_type.objects.get(id=report_1.id).date
         self.assertTrue(
             {
                 "INFO:crashreports.migrations."
                 "0006_add_unique_constraints_and_drop_duplicates:"
                 "Found 1 {} instances that have duplicates. "
-                "These will be removed.".format(object_type.__name__),
+                "These will be removed.".format(model_name),
                 "DEBUG:crashreports.migrations"
                 ".0006_add_unique_constraints_and_drop_duplicates:Removing "
                 "duplicates: {}".format(
                     str(
                         {
                             "device": device.id,
-                            "date": report_1.date,
+                            "date": report_date,
                             "min_id": report_1.id,
                             "num_duplicates": 2,
                         }
@@ -96,20 +154,21 @@ class DropDuplicatesMigrationTestCase(MigrationTestCase):
     def test_delete_duplicate_crashreport_with_logfile(self):
         """Test deletion of a duplicate crashreport with logfile."""
         # Create a user, device and two duplicate reports with logfiles
-        user = Dummy.create_user()
-        device = Dummy.create_device(user)
-        crashreport_1 = Dummy.create_report(Crashreport, device)
-        crashreport_2 = Dummy.create_report(Crashreport, device)
-        _, logfile_1_path = Dummy.create_log_file_with_actual_file(
-            crashreport_1
+        device = _create_device(self.apps)
+        crashreport_1 = _create_report(self.apps, "Crashreport", device, 1)
+        crashreport_2 = _create_report(self.apps, "Crashreport", device, 2)
+        logfile_1_path = _create_log_file_with_actual_file(
+            self.apps, crashreport_1, Dummy.DEFAULT_LOG_FILE_PATHS[0]
         )
-        _, logfile_2_path = Dummy.create_log_file_with_actual_file(
-            crashreport_2, logfile=Dummy.DEFAULT_LOG_FILE_PATHS[1]
+        logfile_2_path = _create_log_file_with_actual_file(
+            self.apps, crashreport_2, Dummy.DEFAULT_LOG_FILE_PATHS[1]
         )
 
         # Assert that 2 crashreports and logfiles have been created
-        self.assertEqual(Crashreport.objects.count(), 2)
-        self.assertEqual(LogFile.objects.count(), 2)
+        crashreport_type = self.apps.get_model("crashreports", "Crashreport")
+        logfile_type = self.apps.get_model("crashreports", "LogFile")
+        self.assertEqual(crashreport_type.objects.count(), 2)
+        self.assertEqual(logfile_type.objects.count(), 2)
         self.assertTrue(os.path.isfile(logfile_1_path))
         self.assertTrue(os.path.isfile(logfile_2_path))
 
@@ -118,9 +177,11 @@ class DropDuplicatesMigrationTestCase(MigrationTestCase):
 
         # Assert that only one crashreport and one logfile is left in the
         # database
-        self.assertEqual(Crashreport.objects.count(), 1)
-        self.assertEqual(Crashreport.objects.first().logfiles.count(), 1)
-        self.assertEqual(LogFile.objects.count(), 1)
+        crashreport_type = self.apps.get_model("crashreports", "Crashreport")
+        logfile_type = self.apps.get_model("crashreports", "LogFile")
+        self.assertEqual(crashreport_type.objects.count(), 1)
+        self.assertEqual(crashreport_type.objects.get().logfiles.count(), 1)
+        self.assertEqual(logfile_type.objects.count(), 1)
 
         # Assert that the correct log file has been deleted
         self.assertTrue(os.path.isfile(logfile_1_path))
@@ -129,12 +190,11 @@ class DropDuplicatesMigrationTestCase(MigrationTestCase):
     def test_change_of_date_field_type(self):
         """Test that the 'date' field of heartbeats is changed to a date."""
         # Create a user, device and a heartbeat
-        user = Dummy.create_user()
-        device = Dummy.create_device(user)
+        device = _create_device(self.apps)
         heartbeat_timestamp = datetime(2015, 12, 15, 1, 23, 45, tzinfo=pytz.utc)
 
-        heartbeat = Dummy.create_report(
-            HeartBeat, device, date=heartbeat_timestamp
+        heartbeat = _create_report(
+            self.apps, "HeartBeat", device, 1, date=heartbeat_timestamp
         )
 
         # Assert that the date is of type datetime
@@ -144,6 +204,7 @@ class DropDuplicatesMigrationTestCase(MigrationTestCase):
         self.migrate_to_dest()
 
         # Assert that the date is now of type date and has the correct value
-        heartbeat = HeartBeat.objects.first()
+        heartbeat_type = self.apps.get_model("crashreports", "HeartBeat")
+        heartbeat = heartbeat_type.objects.get()
         self.assertIsInstance(heartbeat.date, date)
         self.assertEqual(heartbeat.date, heartbeat_timestamp.date())
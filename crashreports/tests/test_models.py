@@ -1,10 +1,11 @@
 """Tests for the crashreports models."""
 import logging
+import threading
 
-from django.forms import model_to_dict
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
 
-from crashreports.models import HeartBeat, Crashreport
+from crashreports.models import Device, HeartBeat, Crashreport
 from crashreports.tests.utils import Dummy
 
 
@@ -23,20 +24,135 @@ class DuplicatesTestCase(TestCase):
         # Create a user, device and a report
         user = Dummy.create_user()
         device = Dummy.create_device(user)
-        Dummy.create_report(object_type, device)
+        report = Dummy.create_report(object_type, device)
 
         # Assert creating a duplicate report fails
         logger = logging.getLogger("crashreports")
         with self.assertLogs(logger, "DEBUG") as logging_watcher:
-            report = Dummy.create_report(object_type, device)
+            duplicate = Dummy.create_report(object_type, device)
         self.assertEqual(
             logging_watcher.output,
             [
                 "DEBUG:crashreports.models:"
-                "Duplicate {} received and dropped: {}".format(
-                    object_type.__name__, str(model_to_dict(report))
+                "Duplicate {} received and dropped: device {}, date {}".format(
+                    object_type.__name__, device.uuid, duplicate.date
                 )
             ],
         )
 
         self.assertEqual(object_type.objects.count(), 1)
+
+        # Assert that the duplicate refers to the stored report and that no
+        # local ID has been wasted
+        self.assertIsNone(duplicate.pk)
+        self.assertEqual(duplicate.device_local_id, report.device_local_id)
+        device.refresh_from_db()
+        self.assertEqual(
+            device.next_per_heartbeat_key
+            if object_type == HeartBeat
+            else device.next_per_crashreport_key,
+            2,
+        )
+
+    def test_insert_or_ignore(self):
+        """Test that insert_or_ignore reports whether it inserted a report."""
+        device = Dummy.create_device(Dummy.create_user())
+        heartbeat = HeartBeat(device=device, **Dummy.heartbeat_data())
+        self.assertTrue(heartbeat.insert_or_ignore())
+        self.assertIsNotNone(heartbeat.pk)
+
+        duplicate = HeartBeat(device=device, **Dummy.heartbeat_data())
+        self.assertFalse(duplicate.insert_or_ignore())
+        self.assertIsNone(duplicate.pk)
+        self.assertEqual(HeartBeat.objects.count(), 1)
+
+
+class LocalIdAllocationTestCase(TransactionTestCase):
+    """Test cases for the allocation of local IDs."""
+
+    # Make data from migrations available in the test cases
+    serialized_rollback = True
+
+    def setUp(self):
+        """Create a device."""
+        self.device = Dummy.create_device(Dummy.create_user())
+
+    def test_reserve_range_of_keys(self):
+        """Test that consecutive ranges of keys are reserved."""
+        self.assertEqual(self.device.get_heartbeat_keys(3), range(1, 4))
+        self.assertEqual(self.device.get_heartbeat_key(), 4)
+        self.assertEqual(self.device.get_crashreport_keys(2), range(1, 3))
+
+        # Assert that the counters are persisted and kept in sync
+        self.assertEqual(self.device.next_per_heartbeat_key, 5)
+        device = Device.objects.get(id=self.device.id)
+        self.assertEqual(device.next_per_heartbeat_key, 5)
+        self.assertEqual(device.next_per_crashreport_key, 3)
+
+    def test_reserve_keys_concurrently(self):
+        """Test that concurrent reservations never hand out the same key."""
+        keys = []
+
+        def reserve_keys():
+            device = Device.objects.get(id=self.device.id)
+            for _ in range(10):
+                keys.extend(device.get_heartbeat_keys(3))
+            connection.close()
+
+        threads = [threading.Thread(target=reserve_keys) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(keys), list(range(1, 301)))
+
+    def test_logfile_keys(self):
+        """Test the reservation of log file keys of a crashreport."""
+        crashreport = Dummy.create_report(Crashreport, self.device)
+        self.assertEqual(crashreport.get_logfile_key(), 1)
+        self.assertEqual(crashreport.get_logfile_key(), 2)
+        self.assertEqual(
+            Crashreport.objects.get(id=crashreport.id).next_logfile_key, 3
+        )
+
+
+class LastHeartbeatTestCase(TestCase):
+    """Test cases for keeping the last heartbeat of devices up to date."""
+
+    def setUp(self):
+        """Create a device."""
+        self.device = Dummy.create_device(Dummy.create_user())
+
+    def _get_last_heartbeat(self):
+        return Device.objects.get(id=self.device.id).last_heartbeat
+
+    def test_last_heartbeat_set(self):
+        """Test that the last heartbeat is set when creating heartbeats."""
+        self.assertIsNone(self._get_last_heartbeat())
+        Dummy.create_report(HeartBeat, self.device, date=Dummy.DATES[1])
+        self.assertEqual(self._get_last_heartbeat().date(), Dummy.DATES[1])
+
+    def test_last_heartbeat_not_moved_back(self):
+        """Test that late heartbeats do not change the last heartbeat."""
+        Dummy.create_report(HeartBeat, self.device, date=Dummy.DATES[1])
+        Dummy.create_report(HeartBeat, self.device, date=Dummy.DATES[0])
+        self.assertEqual(self._get_last_heartbeat().date(), Dummy.DATES[1])
+
+    def test_last_heartbeat_set_by_objects_create(self):
+        """Test that heartbeats created by the manager set it as well."""
+        HeartBeat.objects.create(
+            device=self.device, **Dummy.heartbeat_data(date=Dummy.DATES[1])
+        )
+        self.assertEqual(self._get_last_heartbeat().date(), Dummy.DATES[1])
+
+    def test_last_heartbeat_of_batch(self):
+        """Test that the last heartbeat is set to the latest of a batch."""
+        HeartBeat.bulk_create_for_device(
+            self.device,
+            [
+                HeartBeat(**Dummy.heartbeat_data(date=date))
+                for date in reversed(Dummy.DATES)
+            ],
+        )
+        self.assertEqual(self._get_last_heartbeat().date(), Dummy.DATES[-1])
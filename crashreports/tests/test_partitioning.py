@@ -0,0 +1,148 @@
+"""Tests for the partitioning of the report tables."""
+import datetime
+import unittest
+
+import pytz
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from crashreports import partitioning
+from crashreports.models import Crashreport, HeartBeat
+from crashreports.tests.utils import Dummy
+
+
+class MonthTestCase(unittest.TestCase):
+    """Test the month helper functions."""
+
+    def test_month_start(self):
+        """Test getting the first day of the month of a datetime."""
+        self.assertEqual(
+            partitioning.month_start(datetime.datetime(2019, 2, 28, 23, 59)),
+            datetime.date(2019, 2, 1),
+        )
+
+    def test_next_month_end_of_year(self):
+        """Test getting the month following December."""
+        self.assertEqual(
+            partitioning.next_month(datetime.date(2019, 12, 1)),
+            datetime.date(2020, 1, 1),
+        )
+
+
+class PartitioningTestCase(TestCase):
+    """Test the monthly partitions of the report tables."""
+
+    # Far enough in the future to not have a partition yet
+    FUTURE_MONTH = datetime.date(2099, 5, 1)
+
+    def setUp(self):
+        """Create a device."""
+        if not partitioning.is_supported(connection):
+            self.skipTest("Partitioning is not supported by the database.")
+        self.device = Dummy.create_device(Dummy.create_user())
+
+    def _get_partition_of(self, report):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT tableoid::regclass::text FROM {} WHERE id = %s".format(
+                    report._meta.db_table  # pylint: disable=protected-access
+                ),
+                [report.id],
+            )
+            return cursor.fetchone()[0]
+
+    def test_tables_are_partitioned(self):
+        """Test that the report tables have been partitioned."""
+        for report_type in [HeartBeat, Crashreport]:
+            self.assertTrue(partitioning.is_partitioned(report_type))
+
+    def test_report_without_partition_in_default_partition(self):
+        """Test that reports of a month without partition are stored."""
+        heartbeat = Dummy.create_report(
+            HeartBeat, self.device, date=self.FUTURE_MONTH
+        )
+
+        self.assertEqual(
+            self._get_partition_of(heartbeat),
+            HeartBeat._meta.db_table  # pylint: disable=protected-access
+            + partitioning.DEFAULT_PARTITION_SUFFIX,
+        )
+
+    def test_create_partition_moves_reports(self):
+        """Test that reports are moved from the default partition."""
+        heartbeat = Dummy.create_report(
+            HeartBeat, self.device, date=self.FUTURE_MONTH
+        )
+        crashreport = Dummy.create_report(
+            Crashreport,
+            self.device,
+            date=datetime.datetime(2099, 5, 31, 23, 0, tzinfo=pytz.utc),
+        )
+
+        for report_type, report in [
+            (HeartBeat, heartbeat),
+            (Crashreport, crashreport),
+        ]:
+            self.assertTrue(
+                partitioning.create_partition(report_type, self.FUTURE_MONTH)
+            )
+            self.assertEqual(
+                self._get_partition_of(report),
+                partitioning.partition_name(report_type, self.FUTURE_MONTH),
+            )
+            self.assertFalse(
+                partitioning.create_partition(report_type, self.FUTURE_MONTH)
+            )
+
+    def test_duplicates_in_partition_dropped(self):
+        """Test that the unique constraint holds in a new partition."""
+        partitioning.create_partition(HeartBeat, self.FUTURE_MONTH)
+        Dummy.create_report(HeartBeat, self.device, date=self.FUTURE_MONTH)
+        Dummy.create_report(HeartBeat, self.device, date=self.FUTURE_MONTH)
+
+        self.assertEqual(
+            HeartBeat.objects.filter(date=self.FUTURE_MONTH).count(), 1
+        )
+
+    def test_ensure_partitions(self):
+        """Test that the partitions of upcoming months are created."""
+        latest = list(partitioning.get_partitions(HeartBeat))[-1]
+        until = partitioning.next_month(partitioning.next_month(latest))
+
+        created = partitioning.ensure_partitions(HeartBeat, until)
+
+        self.assertEqual(created, [partitioning.next_month(latest), until])
+        self.assertEqual(
+            list(partitioning.get_partitions(HeartBeat))[-1], until
+        )
+
+    def test_creation_time_ranges_use_brin_index(self):
+        """Test that creation time ranges are scanned with the BRIN index.
+
+        The tables are partitioned on the report date, so the creation time
+        ranges counted by the stats command do not prune any partition.
+        """
+        up_to = timezone.now()
+        for report_type in [HeartBeat, Crashreport]:
+            sql, params = report_type.objects.filter(
+                created_at__gt=up_to - datetime.timedelta(days=1),
+                created_at__lte=up_to,
+            ).query.sql_with_params()
+            with connection.cursor() as cursor:
+                # The test tables are too small for an index scan otherwise
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute("EXPLAIN " + sql, params)
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+            self.assertIn("Bitmap Index Scan", plan)
+            self.assertNotIn("Seq Scan", plan)
+
+    def test_drop_partition(self):
+        """Test that dropping a partition deletes its reports."""
+        partitioning.create_partition(HeartBeat, self.FUTURE_MONTH)
+        Dummy.create_report(HeartBeat, self.device, date=self.FUTURE_MONTH)
+
+        self.assertTrue(
+            partitioning.drop_partition(HeartBeat, self.FUTURE_MONTH)
+        )
+        self.assertFalse(HeartBeat.objects.filter(date=self.FUTURE_MONTH))
@@ -6,7 +6,11 @@ from django.urls import reverse
 from rest_framework import status
 
 from crashreports.models import Crashreport
-from crashreports.tests.utils import Dummy, RaceConditionsTestCase
+from crashreports.tests.utils import (
+    Dummy,
+    HiccupCrashreportsAPITestCase,
+    RaceConditionsTestCase,
+)
 from crashreports.tests.test_rest_api_heartbeats import HeartbeatsTestCase
 
 
@@ -53,6 +57,95 @@ class CrashreportsTestCase(HeartbeatsTestCase):
         pass
 
 
+class CrashreportsBatchTestCase(HiccupCrashreportsAPITestCase):
+    """Test cases for creating batches of crash reports."""
+
+    # pylint: disable=too-many-ancestors
+
+    BATCH_CREATE_URL = "api_v1_crashreports_batch"
+
+    def setUp(self):
+        """Set up a device."""
+        super().setUp()
+        self.uuid, self.user, self.token = self._register_device()
+
+    @staticmethod
+    def _crashreports_data(count):
+        data = Dummy.crashreport_data()
+        return [
+            dict(data, date=data["date"] + timedelta(minutes=i))
+            for i in range(count)
+        ]
+
+    def _post_batch(self, client, crashreports, uuid=None):
+        return client.post(
+            reverse(self.BATCH_CREATE_URL),
+            {"uuid": uuid or self.uuid, "crashreports": crashreports},
+            format="json",
+        )
+
+    def test_create_batch_as_uuid_owner(self):
+        """Test creation of a batch as device owner."""
+        response = self._post_batch(self.user, self._crashreports_data(3))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            response.data["results"],
+            [
+                {"status": "created", "device_local_id": 1},
+                {"status": "created", "device_local_id": 2},
+                {"status": "created", "device_local_id": 3},
+            ],
+        )
+        self.assertEqual(Crashreport.objects.count(), 3)
+
+    def test_create_batch_as_uuid_not_owner(self):
+        """Test creation of a batch as non-owner."""
+        uuid, _, _ = self._register_device()
+        response = self._post_batch(
+            self.user, self._crashreports_data(3), uuid
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(Crashreport.objects.count(), 0)
+
+    def test_create_batch_not_existing_device(self):
+        """Test creation of a batch for a non-existing device."""
+        response = self._post_batch(
+            self.fp_staff_client, self._crashreports_data(3), Dummy.UUIDs[0]
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_create_empty_batch(self):
+        """Test creation of a batch without crash reports."""
+        response = self._post_batch(self.user, [])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_batch_with_duplicates_and_invalid(self):
+        """Test the results of duplicate and invalid crash reports."""
+        crashreports = self._crashreports_data(3)
+        response = self._post_batch(self.user, crashreports[:1])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        crashreports[1].pop("boot_reason")
+        crashreports.append(crashreports[2])
+        response = self._post_batch(self.user, crashreports)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        results = response.data["results"]
+        self.assertEqual(len(results), 4)
+        self.assertEqual(
+            results[0], {"status": "duplicate", "device_local_id": 1}
+        )
+        self.assertEqual(results[1]["status"], "invalid")
+        self.assertIn("boot_reason", results[1]["errors"])
+        self.assertEqual(
+            results[2], {"status": "created", "device_local_id": 2}
+        )
+        self.assertEqual(
+            results[3], {"status": "duplicate", "device_local_id": 2}
+        )
+        self.assertEqual(Crashreport.objects.count(), 2)
+
+
 class CrashreportRaceConditionsTestCase(RaceConditionsTestCase):
     """Test cases for crashreport race conditions."""
 
@@ -3,6 +3,7 @@ from datetime import timedelta, datetime
 
 import pytz
 from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
@@ -14,6 +15,7 @@ from crashreports.tests.utils import (
     HiccupCrashreportsAPITestCase,
 )
 from crashreports.models import HeartBeat
+from crashreports.serializers import HeartBeatSerializer
 
 
 class HeartbeatsTestCase(HiccupCrashreportsAPITestCase):
@@ -133,6 +135,36 @@ class HeartbeatsTestCase(HiccupCrashreportsAPITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data["results"]), count)
 
+    def test_list_queries_staff_group_once(self):
+        """Test that the staff membership is only queried once per request."""
+        count = 5
+        self._post_multiple(self.user, self.data, count)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.fp_staff_client.get(reverse(self.LIST_CREATE_URL))
+        self.assertEqual(len(response.data["results"]), count)
+        group_queries = [
+            query
+            for query in queries.captured_queries
+            if 'FROM "auth_group"' in query["sql"]
+        ]
+        self.assertEqual(len(group_queries), 1)
+
+    def test_create_as_uuid_owner_queries(self):
+        """Test that the device of the owner is only looked up once."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.user.post(
+                reverse(self.LIST_CREATE_URL),
+                self._create_dummy_data(uuid=self.uuid),
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        device_queries = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith("SELECT")
+            and 'FROM "crashreports_device"' in query["sql"]
+        ]
+        self.assertEqual(len(device_queries), 1)
+
     def test_retrieve_single_fp_staff(self):
         """Test retrieval as Fairphone staff."""
         self.assertEqual(
@@ -321,6 +353,203 @@ class HeartbeatsTestCase(HiccupCrashreportsAPITestCase):
         self.assertEqual(response.data["date"], str(data["date"].date()))
 
 
+class HeartbeatsBatchTestCase(HiccupCrashreportsAPITestCase):
+    """Test cases for creating batches of heartbeats."""
+
+    # pylint: disable=too-many-ancestors
+
+    BATCH_CREATE_URL = "api_v1_heartbeats_batch"
+    LIST_CREATE_URL = "api_v1_heartbeats"
+
+    def setUp(self):
+        """Set up a device."""
+        super().setUp()
+        self.uuid, self.user, self.token = self._register_device()
+
+    def _batch_data(self, count, uuid=None):
+        data = Dummy.heartbeat_data()
+        return {
+            "uuid": uuid or self.uuid,
+            "heartbeats": [
+                dict(data, date=data["date"] + timedelta(days=i))
+                for i in range(count)
+            ],
+        }
+
+    def _post_batch(self, client, data):
+        return client.post(reverse(self.BATCH_CREATE_URL), data, format="json")
+
+    def test_create_batch_as_uuid_owner(self):
+        """Test creation of a batch as device owner."""
+        response = self._post_batch(self.user, self._batch_data(5))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {"created": 5, "duplicates": 0})
+
+        # Assert that the local IDs have been assigned consecutively
+        self.assertEqual(
+            list(
+                HeartBeat.objects.filter(device__uuid=self.uuid)
+                .order_by("date")
+                .values_list("device_local_id", flat=True)
+            ),
+            [1, 2, 3, 4, 5],
+        )
+
+    def test_create_batch_as_fp_staff(self):
+        """Test creation of a batch as Fairphone staff."""
+        response = self._post_batch(self.fp_staff_client, self._batch_data(5))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(HeartBeat.objects.count(), 5)
+
+    def test_create_batch_no_auth(self):
+        """Test creation of a batch without authentication."""
+        response = self._post_batch(APIClient(), self._batch_data(5))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_create_batch_as_uuid_not_owner(self):
+        """Test creation of a batch as non-owner."""
+        uuid, _, _ = self._register_device()
+        response = self._post_batch(self.user, self._batch_data(5, uuid))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(HeartBeat.objects.count(), 0)
+
+    def test_create_batch_not_existing_device(self):
+        """Test creation of a batch for a non-existing device."""
+        response = self._post_batch(
+            self.fp_staff_client, self._batch_data(5, Dummy.UUIDs[0])
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_create_empty_batch(self):
+        """Test creation of a batch without heartbeats."""
+        response = self._post_batch(self.user, self._batch_data(0))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_batch_with_invalid_heartbeat(self):
+        """Test that no heartbeat is created if one of them is invalid."""
+        data = self._batch_data(5)
+        data["heartbeats"][3].pop("build_fingerprint")
+        response = self._post_batch(self.user, data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(HeartBeat.objects.count(), 0)
+
+    def test_create_batch_with_missing_and_invalid_dates(self):
+        """Test that heartbeats without valid dates are reported per item."""
+        data = self._batch_data(3)
+        data["heartbeats"][0].pop("date")
+        data["heartbeats"][1]["date"] = 20180319
+        response = self._post_batch(self.user, data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.data["heartbeats"]
+        self.assertIn("date", errors[0])
+        self.assertIn("date", errors[1])
+        self.assertEqual(errors[2], {})
+        self.assertEqual(HeartBeat.objects.count(), 0)
+
+    def test_create_batch_with_duplicates(self):
+        """Test that duplicates in and across batches are dropped."""
+        data = self._batch_data(3)
+        response = self.user.post(
+            reverse(self.LIST_CREATE_URL),
+            dict(data["heartbeats"][0], uuid=self.uuid),
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        data["heartbeats"].append(data["heartbeats"][1])
+        response = self._post_batch(self.user, data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {"created": 2, "duplicates": 2})
+        self.assertEqual(HeartBeat.objects.count(), 3)
+
+    def test_create_batch_with_datetime(self):
+        """Test creation of a batch with datetime instead of date values."""
+        data = self._batch_data(1)
+        data["heartbeats"][0]["date"] = datetime(
+            2018, 3, 19, 12, 0, 0, tzinfo=pytz.utc
+        )
+        response = self._post_batch(self.user, data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            HeartBeat.objects.get().date,
+            data["heartbeats"][0]["date"].date(),
+        )
+
+
+class HeartbeatFastPathTestCase(HiccupCrashreportsAPITestCase):
+    """Test cases for the fast path of creating single heartbeats."""
+
+    # pylint: disable=too-many-ancestors
+
+    LIST_CREATE_URL = "api_v1_heartbeats"
+
+    def setUp(self):
+        """Set up a device."""
+        super().setUp()
+        self.uuid, self.user, self.token = self._register_device()
+
+    def _assert_same_errors_as_serializer(self, data):
+        serializer = HeartBeatSerializer(data=data)
+        self.assertFalse(serializer.is_valid())
+
+        response = self.fp_staff_client.post(
+            reverse(self.LIST_CREATE_URL), data, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, serializer.errors)
+
+    def test_create_with_invalid_values(self):
+        """Test that invalid values result in the same errors."""
+        data = Dummy.heartbeat_data(uuid=self.uuid, date="2018-03-19")
+        for field_name, value in [
+            ("app_version", "not a number"),
+            ("app_version", 2 ** 40),
+            ("uptime", ""),
+            ("build_fingerprint", "x" * 201),
+            ("build_fingerprint", None),
+            ("radio_version", ""),
+            ("date", "not a date"),
+            ("device_local_id", "not a number"),
+        ]:
+            with self.subTest(field_name=field_name, value=value):
+                self._assert_same_errors_as_serializer(
+                    dict(data, **{field_name: value})
+                )
+
+    def test_create_with_missing_values(self):
+        """Test that missing values result in the same errors."""
+        data = Dummy.heartbeat_data(uuid=self.uuid, date="2018-03-19")
+        required_fields = ["uuid", "app_version", "uptime", "build_fingerprint"]
+        for field_name in required_fields:
+            with self.subTest(field_name=field_name):
+                invalid_data = data.copy()
+                invalid_data.pop(field_name)
+                self._assert_same_errors_as_serializer(invalid_data)
+
+    def test_create_without_radio_version(self):
+        """Test that the radio version is optional."""
+        data = Dummy.heartbeat_data(uuid=self.uuid, radio_version=None)
+        response = self.user.post(
+            reverse(self.LIST_CREATE_URL), data, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsNone(response.data["radio_version"])
+
+    def test_same_representation_as_serializer(self):
+        """Test that the created heartbeat is represented the same way."""
+        response = self.fp_staff_client.post(
+            reverse(self.LIST_CREATE_URL),
+            Dummy.heartbeat_data(uuid=self.uuid),
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        retrieved = self.fp_staff_client.get(
+            reverse(self.LIST_CREATE_URL + "_by_uuid", args=[self.uuid])
+        )
+        self.assertEqual(
+            list(response.data.items()),
+            list(retrieved.data["results"][0].items()),
+        )
+
+
 class HeartBeatRaceConditionsTestCase(RaceConditionsTestCase):
     """Test cases for heartbeat race conditions."""
 
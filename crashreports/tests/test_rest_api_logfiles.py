@@ -1,5 +1,6 @@
 """Tests for the logfiles REST API."""
 
+import hashlib
 import os
 import shutil
 import tempfile
@@ -13,11 +14,12 @@ from django.urls import reverse
 
 from rest_framework import status
 
+from crashreports.content_storage import content_file_name
 from crashreports.models import (
-    crashreport_file_name,
     Device,
     Crashreport,
     LogFile,
+    LogFileText,
 )
 from crashreports.tests.utils import (
     Dummy,
@@ -102,10 +104,9 @@ class LogfileUploadTest(HiccupCrashreportsAPITestCase):
             .crashreports.get(device_local_id=device_local_id)
             .logfiles.last()
         )
-        uploaded_logfile_path = crashreport_file_name(
-            logfile_instance, os.path.basename(Dummy.DEFAULT_LOG_FILE_PATHS[0])
-        )
+        uploaded_logfile_path = content_file_name(logfile_instance.sha256)
 
+        self.assertEqual(logfile_instance.logfile.name, uploaded_logfile_path)
         self.assertTrue(default_storage.exists(uploaded_logfile_path))
         # The files are not 100% equal, because the server adds some extra
         # bytes. However, we mainly care that the contents are equal:
@@ -122,6 +123,84 @@ class LogfileUploadTest(HiccupCrashreportsAPITestCase):
         """Test upload of logfiles as Fairphone staff user."""
         self._test_logfile_upload(self.fp_staff_client, self.device_uuid)
 
+    def test_logfile_upload_stores_checksum(self):
+        """Test that the SHA-256 checksum of the upload is stored."""
+        device_local_id = self.upload_crashreport(self.user, self.device_uuid)
+
+        self.upload_logfile(self.user, self.device_uuid, device_local_id)
+
+        logfile = LogFile.objects.get()
+        with open(logfile.logfile.path, "rb") as stored_file:
+            self.assertEqual(
+                logfile.sha256, hashlib.sha256(stored_file.read()).hexdigest()
+            )
+
+    def test_logfile_upload_not_indexed(self):
+        """Test that uploaded log files are left to the index command."""
+        device_local_id = self.upload_crashreport(self.user, self.device_uuid)
+
+        self.upload_logfile(self.user, self.device_uuid, device_local_id)
+
+        self.assertFalse(LogFileText.objects.exists())
+
+    @override_settings(HICCUP_LOGFILE_SEARCH_INDEX_ON_UPLOAD=True)
+    def test_logfile_upload_indexed(self):
+        """Test that uploaded log files can be indexed right away."""
+        device_local_id = self.upload_crashreport(self.user, self.device_uuid)
+
+        self.upload_logfile(self.user, self.device_uuid, device_local_id)
+
+        self.assertTrue(LogFileText.objects.exists())
+
+    def _post_raw_logfile(self, content):
+        device_local_id = self.upload_crashreport(self.user, self.device_uuid)
+        return self.user.post(
+            reverse(
+                PUT_LOGFILE_URL,
+                args=[self.device_uuid, device_local_id, "logfile.zip"],
+            ),
+            content,
+            content_type="application/zip",
+        )
+
+    @override_settings(HICCUP_LOGFILE_MAX_SIZE=16)
+    def test_logfile_upload_too_large(self):
+        """Test that uploads exceeding the maximum size are rejected."""
+        with open(Dummy.DEFAULT_LOG_FILE_PATHS[0], "rb") as logfile:
+            response = self._post_raw_logfile(logfile.read())
+
+        self.assertEqual(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, response.status_code
+        )
+        self.assertFalse(LogFile.objects.exists())
+
+    def test_logfile_upload_invalid_zip(self):
+        """Test that uploads that are not zip files are not stored."""
+        response = self._post_raw_logfile(b"not a zip file")
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertFalse(LogFile.objects.exists())
+        for _, _, file_names in os.walk(settings.MEDIA_ROOT):
+            self.assertEqual(file_names, [])
+
+    def test_identical_logfiles_share_file(self):
+        """Test that log files with identical content share one file."""
+        with open(Dummy.DEFAULT_LOG_FILE_PATHS[0], "rb") as logfile:
+            content = logfile.read()
+        for _ in range(2):
+            response = self._post_raw_logfile(content)
+            self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+
+        logfile_1, logfile_2 = LogFile.objects.all()
+        self.assertEqual(logfile_1.logfile.name, logfile_2.logfile.name)
+        path = logfile_1.logfile.path
+
+        # The file is only deleted with the last log file referencing it
+        logfile_1.delete()
+        self.assertTrue(os.path.isfile(path))
+        logfile_2.delete()
+        self.assertFalse(os.path.isfile(path))
+
     def test_logfile_deletion(self):
         """Test deletion of logfile instances."""
         # Create a user, device and crashreport with logfile
@@ -0,0 +1,116 @@
+"""Tests for the asynchronous ingestion of reports through the spool."""
+
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from crashreports.models import Crashreport, HeartBeat
+from crashreports.tests.utils import Dummy, HiccupCrashreportsAPITestCase
+
+
+class SpoolTestCase(HiccupCrashreportsAPITestCase):
+    """Test cases for spooling incoming reports."""
+
+    # pylint: disable=too-many-ancestors
+
+    def setUp(self):
+        """Create a spool directory and register a device."""
+        super(SpoolTestCase, self).setUp()
+        self.spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spool_dir)
+        settings_override = override_settings(
+            HICCUP_INGESTION_SPOOL_DIR=self.spool_dir
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.uuid, self.user, _ = self._register_device()
+
+    def _drain(self):
+        call_command("drain_spool", verbosity=0)
+
+    def test_heartbeat_spooled(self):
+        """Test that a heartbeat is only stored once the spool is drained."""
+        response = self.user.post(
+            reverse("api_v1_heartbeats"), Dummy.heartbeat_data(uuid=self.uuid)
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(HeartBeat.objects.count(), 0)
+
+        self._drain()
+        heartbeat = HeartBeat.objects.get()
+        self.assertEqual(heartbeat.device.uuid, self.uuid)
+        self.assertEqual(heartbeat.date, Dummy.DEFAULT_HEARTBEAT_VALUES["date"])
+        self.assertEqual(heartbeat.device_local_id, 1)
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+    def test_heartbeat_duplicates_dropped(self):
+        """Test that spooled duplicates are dropped when draining."""
+        data = Dummy.heartbeat_data(uuid=self.uuid)
+        self.user.post(reverse("api_v1_heartbeats"), data)
+        self._drain()
+        self.user.post(reverse("api_v1_heartbeats"), data)
+        self.user.post(reverse("api_v1_heartbeats"), data)
+        self._drain()
+        self.assertEqual(HeartBeat.objects.count(), 1)
+
+    def test_heartbeat_invalid(self):
+        """Test that invalid heartbeats are rejected before spooling."""
+        data = Dummy.heartbeat_data(uuid=self.uuid)
+        data.pop("build_fingerprint")
+        response = self.user.post(reverse("api_v1_heartbeats"), data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+    def test_heartbeat_batch_spooled(self):
+        """Test that heartbeat batches are spooled."""
+        response = self.user.post(
+            reverse("api_v1_heartbeats_batch"),
+            {
+                "uuid": self.uuid,
+                "heartbeats": [
+                    Dummy.heartbeat_data(date=date) for date in Dummy.DATES
+                ],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data, {"accepted": len(Dummy.DATES)})
+
+        self._drain()
+        self.assertEqual(
+            set(HeartBeat.objects.values_list("date", flat=True)),
+            set(Dummy.DATES),
+        )
+
+    def test_crashreport_stored_synchronously(self):
+        """Test that crash reports are stored when they are accepted."""
+        data = Dummy.crashreport_data(uuid=self.uuid)
+        response = self.user.post(reverse("api_v1_crashreports"), data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        device_local_id = response.data["device_local_id"]
+        crashreport = Crashreport.objects.get()
+        self.assertEqual(crashreport.device_local_id, device_local_id)
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+        # Retried crash reports get the local ID of the stored crash report
+        response = self.user.post(reverse("api_v1_crashreports"), data)
+        self.assertEqual(response.data["device_local_id"], device_local_id)
+        self.assertEqual(Crashreport.objects.count(), 1)
+
+    def test_drain_interrupted(self):
+        """Test that files of an interrupted drain are drained again."""
+        self.user.post(
+            reverse("api_v1_heartbeats"), Dummy.heartbeat_data(uuid=self.uuid)
+        )
+        (spool_file,) = os.listdir(self.spool_dir)
+        path = os.path.join(self.spool_dir, spool_file)
+        os.rename(path, path + ".draining")
+
+        self._drain()
+        self.assertEqual(HeartBeat.objects.count(), 1)
+        self.assertEqual(os.listdir(self.spool_dir), [])
@@ -15,6 +15,7 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
 
+from crashreports.authentication import clear_cache
 from crashreports.models import (
     Crashreport,
     Device,
@@ -371,6 +372,7 @@ class HiccupCrashreportsTransactionTestCase(TransactionTestCase):
         The APIClient that can be used to make authenticated requests to the
         server is stored in self.fp_staff_client.
         """
+        clear_cache()
         fp_staff_group = Group.objects.get(name=FP_STAFF_GROUP_NAME)
         fp_staff_user = User.objects.create_user(
             "fp_staff", "somebody@fairphone.com", "thepassword"
@@ -0,0 +1,177 @@
+"""Streaming uploads of log files.
+
+Uploaded log files are written to the storage directory chunk by chunk
+while the request body is read, so that only a single chunk is held in
+memory at once. The size of the upload is limited to
+`HICCUP_LOGFILE_MAX_SIZE` bytes and its SHA-256 checksum is computed on the
+way. Once the upload is complete, the zip structure is validated by reading
+the file from disk and the file is added to the content-addressed storage,
+see `crashreports.content_storage`.
+"""
+import hashlib
+import os
+import uuid
+import zipfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+_TEMPORARY_FILE_PREFIX = ".upload-"
+
+
+class LogFileTooLarge(APIException):
+    """The uploaded log file exceeds the maximum size."""
+
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Log file too large."
+    default_code = "logfile_too_large"
+
+
+class StreamedLogFile(UploadedFile):
+    """A log file that has been streamed to a temporary file on disk.
+
+    Attributes:
+        sha256: The hex digest of the SHA-256 checksum of the file.
+
+    """
+
+    def __init__(self, file, name, size, sha256, path):
+        """Initialise the uploaded file.
+
+        Args:
+            file: The temporary file object.
+            name: The file name sent by the client.
+            size: The size of the file in bytes.
+            sha256: The hex digest of the SHA-256 checksum of the file.
+            path: The path of the temporary file.
+
+        """
+        # pylint: disable=too-many-arguments
+        super(StreamedLogFile, self).__init__(file, name, size=size)
+        self.sha256 = sha256
+        self._path = path
+
+    def temporary_file_path(self):
+        """Get the path of the temporary file."""
+        return self._path
+
+
+class LogFileUploadHandler(FileUploadHandler):
+    """Upload handler streaming a log file to a temporary file on disk.
+
+    The temporary file is created within the storage location, so that it
+    can be linked to its final path without copying it.
+    """
+
+    chunk_size = 64 * 2 ** 10
+
+    def __init__(self, request, directory, max_size):
+        """Initialise the upload handler.
+
+        Args:
+            request: The Django request.
+            directory: The directory to store the temporary file in.
+            max_size: The maximum size of the upload in bytes.
+
+        """
+        super(LogFileUploadHandler, self).__init__(request)
+        self.directory = directory
+        self.max_size = max_size
+        self.path = None
+        self._file = None
+        self._checksum = None
+        self._size = 0
+
+    def new_file(self, *args, **kwargs):
+        """Open a new temporary file for the upload."""
+        super(LogFileUploadHandler, self).new_file(*args, **kwargs)
+        self.discard()
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(
+            self.directory, _TEMPORARY_FILE_PREFIX + uuid.uuid4().hex
+        )
+        # Create the file like the file system storage does, respecting the
+        # umask of the process
+        self._file = os.fdopen(
+            os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666),
+            "w+b",
+        )
+        self._checksum = hashlib.sha256()
+        self._size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        """Write a chunk of the upload to the temporary file.
+
+        Raises:
+            LogFileTooLarge: If the upload exceeds the maximum size.
+
+        """
+        self._size += len(raw_data)
+        if self._size > self.max_size:
+            raise LogFileTooLarge()
+        self._checksum.update(raw_data)
+        self._file.write(raw_data)
+
+    def file_complete(self, file_size):
+        """Finish writing the temporary file.
+
+        Returns: The uploaded file.
+
+        """
+        self._file.flush()
+        self._file.seek(0)
+        return StreamedLogFile(
+            self._file,
+            self.file_name,
+            file_size,
+            self._checksum.hexdigest(),
+            self.path,
+        )
+
+    def discard(self):
+        """Close and delete the temporary file, if it still exists."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+
+def validate_zip(path):
+    """Validate the structure of a zip file on disk.
+
+    The members are decompressed one chunk at a time to verify their
+    checksums. The total uncompressed size declared in the zip file is
+    limited to `HICCUP_LOGFILE_MAX_UNCOMPRESSED_SIZE` bytes.
+
+    Args:
+        path: The path of the zip file.
+
+    Raises:
+        ValidationError: If the file is not a valid zip file.
+
+    """
+    try:
+        with zipfile.ZipFile(path) as zip_file:
+            members = zip_file.infolist()
+            if not members:
+                raise ValidationError("The log file archive is empty.")
+            max_size = settings.HICCUP_LOGFILE_MAX_UNCOMPRESSED_SIZE
+            if sum(member.file_size for member in members) > max_size:
+                raise ValidationError(
+                    "The log file archive is too large when decompressed."
+                )
+            corrupt_member = zip_file.testzip()
+    except (zipfile.BadZipFile, NotImplementedError, OSError, EOFError):
+        raise ValidationError("The log file is not a valid zip file.")
+    if corrupt_member is not None:
+        raise ValidationError(
+            "The log file archive member {} is corrupt.".format(corrupt_member)
+        )
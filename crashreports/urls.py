@@ -14,6 +14,11 @@ urlpatterns = [
         rest_api_crashreports.ListCreateView.as_view(),
         name="api_v1_crashreports",
     ),
+    url(
+        r"^api/v1/crashreports/batch/$",
+        rest_api_crashreports.BatchCreateView.as_view(),
+        name="api_v1_crashreports_batch",
+    ),
     url(
         r"^api/v1/devices/(?P<uuid>[a-f0-9-]+)/crashreports/$",
         rest_api_crashreports.ListCreateView.as_view(),
@@ -53,6 +58,11 @@ urlpatterns = [
         rest_api_heartbeats.ListCreateView.as_view(),
         name="api_v1_heartbeats",
     ),
+    url(
+        r"^api/v1/heartbeats/batch/$",
+        rest_api_heartbeats.BatchCreateView.as_view(),
+        name="api_v1_heartbeats_batch",
+    ),
     url(
         r"^api/v1/devices/(?P<uuid>[a-f0-9-]+)/heartbeats/$",
         rest_api_heartbeats.ListCreateView.as_view(),
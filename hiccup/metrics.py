@@ -0,0 +1,430 @@
+"""Request latency and SQL metrics per endpoint.
+
+`MetricsMiddleware` records for every request the latency, the number of SQL
+queries and the time spent in these queries. The measurements are aggregated
+per resolved URL name and HTTP method, for example per
+`api_v1_heartbeats` and `POST`. Collecting them only takes a few counter
+updates per request and query so that it can stay enabled in production.
+
+The metrics are exposed by a staff-only endpoint in the Prometheus text
+format, see `render()`.
+
+The metrics are collected by each process on its own. If the application is
+served by several worker processes, set `HICCUP_METRICS_DIR` to a directory
+shared by all of them. Each process then dumps its metrics to its own file in
+that directory every `HICCUP_METRICS_DUMP_INTERVAL` seconds, and the endpoint
+exposes the sum of the metrics of all processes. Files of processes that have
+exited are kept so that the exposed counters never decrease. They can be
+removed when all processes are restarted, for example on deployment.
+"""
+import bisect
+import glob
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.utils import CursorDebugWrapper, CursorWrapper
+from django.utils.deprecation import MiddlewareMixin
+
+LOGGER = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+UNRESOLVED_URL_NAME = "<unresolved>"
+
+# Other methods are recorded as "OTHER" to bound the number of label values
+HTTP_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+METRICS_FILE_EXTENSION = ".metrics.json"
+
+_QUERIES = threading.local()
+
+
+class _QueryTimingMixin:
+    """Cursor wrapper mixin counting and timing the queries of a request."""
+
+    def execute(self, sql, params=None):
+        """Execute a query, recording its duration."""
+        start = time.perf_counter()
+        try:
+            return super(_QueryTimingMixin, self).execute(sql, params)
+        finally:
+            _record_query(time.perf_counter() - start)
+
+    def executemany(self, sql, param_list):
+        """Execute a query for each set of parameters as a single query."""
+        start = time.perf_counter()
+        try:
+            return super(_QueryTimingMixin, self).executemany(sql, param_list)
+        finally:
+            _record_query(time.perf_counter() - start)
+
+
+class _TimedCursorWrapper(_QueryTimingMixin, CursorWrapper):
+    pass
+
+
+class _TimedCursorDebugWrapper(_QueryTimingMixin, CursorDebugWrapper):
+    pass
+
+
+def _record_query(duration):
+    """Add a query to the queries of the current request, if any."""
+    queries = getattr(_QUERIES, "current", None)
+    if queries is not None:
+        queries[0] += 1
+        queries[1] += duration
+
+
+def _instrument_connection(connection):
+    """Make a database connection wrap its cursors in timing wrappers.
+
+    Connections are thread-local, so this is done once per connection and
+    thread, independent of the database backend.
+    """
+    # pylint: disable=protected-access
+    if getattr(connection, "_hiccup_metrics_instrumented", False):
+        return
+    connection.make_cursor = lambda cursor: _TimedCursorWrapper(
+        cursor, connection
+    )
+    connection.make_debug_cursor = lambda cursor: _TimedCursorDebugWrapper(
+        cursor, connection
+    )
+    connection._hiccup_metrics_instrumented = True
+
+
+class _EndpointMetrics:
+    """The aggregated measurements of the requests to a single endpoint."""
+
+    __slots__ = (
+        "buckets",
+        "duration_sum",
+        "count",
+        "sql_queries",
+        "sql_duration",
+        "responses",
+    )
+
+    def __init__(self):
+        """Initialise the metrics without any request."""
+        # Non-cumulative counts per latency bucket; the last one is +Inf
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.duration_sum = 0.0
+        self.count = 0
+        self.sql_queries = 0
+        self.sql_duration = 0.0
+        self.responses = Counter()
+
+    def to_dict(self):
+        """Get the metrics as JSON-serialisable dictionary."""
+        return {
+            "buckets": list(self.buckets),
+            "duration_sum": self.duration_sum,
+            "count": self.count,
+            "sql_queries": self.sql_queries,
+            "sql_duration": self.sql_duration,
+            "responses": dict(self.responses),
+        }
+
+    def merge(self, values):
+        """Add the metrics of a dictionary created by `to_dict()`."""
+        if len(values["buckets"]) == len(self.buckets):
+            self.buckets = [
+                own + other
+                for own, other in zip(self.buckets, values["buckets"])
+            ]
+        self.duration_sum += values["duration_sum"]
+        self.count += values["count"]
+        self.sql_queries += values["sql_queries"]
+        self.sql_duration += values["sql_duration"]
+        self.responses.update(values["responses"])
+
+
+class MetricsRegistry:
+    """Thread-safe registry of the request metrics of the current process."""
+
+    def __init__(self):
+        """Initialise the registry without any request."""
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._next_dump = 0.0
+
+    def observe(self, url_name, method, status_code, duration, sql):
+        """Record a request.
+
+        Args:
+            url_name: The resolved URL name of the request.
+            method: The HTTP method of the request.
+            status_code: The status code of the response.
+            duration: The number of seconds it took to handle the request.
+            sql: The number of SQL queries and their total duration.
+
+        """
+        # pylint: disable=too-many-arguments
+        key = (url_name, method)
+        with self._lock:
+            metrics = self._metrics.get(key)
+            if metrics is None:
+                metrics = self._metrics[key] = _EndpointMetrics()
+            metrics.buckets[bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+            metrics.duration_sum += duration
+            metrics.count += 1
+            metrics.sql_queries += sql[0]
+            metrics.sql_duration += sql[1]
+            metrics.responses[str(status_code)] += 1
+            dump = (
+                settings.HICCUP_METRICS_DIR
+                and time.monotonic() >= self._next_dump
+            )
+            if dump:
+                self._next_dump = (
+                    time.monotonic() + settings.HICCUP_METRICS_DUMP_INTERVAL
+                )
+        if dump:
+            self.dump()
+
+    def snapshot(self):
+        """Get a JSON-serialisable copy of the metrics."""
+        with self._lock:
+            return [
+                {"url_name": url_name, "method": method, **metrics.to_dict()}
+                for (url_name, method), metrics in self._metrics.items()
+            ]
+
+    def reset(self):
+        """Delete all recorded metrics."""
+        with self._lock:
+            self._metrics.clear()
+            self._next_dump = 0.0
+
+    @staticmethod
+    def _get_dump_path():
+        return os.path.join(
+            settings.HICCUP_METRICS_DIR,
+            "{}-{}{}".format(
+                socket.gethostname(), os.getpid(), METRICS_FILE_EXTENSION
+            ),
+        )
+
+    def dump(self):
+        """Write the metrics to the file of this process, replacing it."""
+        path = self._get_dump_path()
+        temp_path = "{}.{}.tmp".format(path, threading.get_ident())
+        try:
+            os.makedirs(settings.HICCUP_METRICS_DIR, exist_ok=True)
+            with open(temp_path, "w") as metrics_file:
+                json.dump(self.snapshot(), metrics_file)
+            os.replace(temp_path, path)
+        except OSError:
+            LOGGER.exception("Could not dump the metrics to %s.", path)
+
+    def collect(self):
+        """Get the metrics of all processes.
+
+        Returns:
+            The metrics per URL name and HTTP method. Only the metrics of
+            the current process are included unless `HICCUP_METRICS_DIR` is
+            set.
+
+        """
+        snapshots = [self.snapshot()]
+        if settings.HICCUP_METRICS_DIR:
+            own_path = self._get_dump_path()
+            for path in glob.glob(
+                os.path.join(
+                    settings.HICCUP_METRICS_DIR, "*" + METRICS_FILE_EXTENSION
+                )
+            ):
+                if path == own_path:
+                    continue
+                try:
+                    with open(path) as metrics_file:
+                        snapshots.append(json.load(metrics_file))
+                except (OSError, ValueError):
+                    LOGGER.warning("Skipping unreadable metrics file %s.", path)
+
+        merged = {}
+        for snapshot in snapshots:
+            for values in snapshot:
+                key = (values["url_name"], values["method"])
+                merged.setdefault(key, _EndpointMetrics()).merge(values)
+        return merged
+
+
+REGISTRY = MetricsRegistry()
+
+
+def _escape(value):
+    return (
+        value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    )
+
+
+def _labels(**labels):
+    return "{{{}}}".format(
+        ",".join(
+            '{}="{}"'.format(name, _escape(str(value)))
+            for name, value in labels.items()
+        )
+    )
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _render_histogram(lines, name, metrics):
+    for (url_name, method), endpoint_metrics in metrics:
+        cumulative_count = 0
+        for bound, count in zip(
+            LATENCY_BUCKETS + ("+Inf",), endpoint_metrics.buckets
+        ):
+            cumulative_count += count
+            lines.append(
+                "{}_bucket{} {}".format(
+                    name,
+                    _labels(url_name=url_name, method=method, le=bound),
+                    cumulative_count,
+                )
+            )
+        labels = _labels(url_name=url_name, method=method)
+        lines.append(
+            "{}_sum{} {}".format(
+                name, labels, _format_value(endpoint_metrics.duration_sum)
+            )
+        )
+        lines.append(
+            "{}_count{} {}".format(name, labels, endpoint_metrics.count)
+        )
+
+
+def render(metrics):
+    """Render metrics in the Prometheus text exposition format.
+
+    Args:
+        metrics: The metrics per URL name and HTTP method.
+
+    Returns: The metrics as text.
+
+    """
+    metrics = sorted(metrics.items(), key=lambda item: item[0])
+    lines = [
+        "# HELP hiccup_http_request_duration_seconds "
+        "Latency of the HTTP requests.",
+        "# TYPE hiccup_http_request_duration_seconds histogram",
+    ]
+    _render_histogram(lines, "hiccup_http_request_duration_seconds", metrics)
+
+    lines += [
+        "# HELP hiccup_http_responses_total "
+        "Number of HTTP responses per status code.",
+        "# TYPE hiccup_http_responses_total counter",
+    ]
+    for (url_name, method), endpoint_metrics in metrics:
+        for status_code, count in sorted(endpoint_metrics.responses.items()):
+            lines.append(
+                "hiccup_http_responses_total{} {}".format(
+                    _labels(
+                        url_name=url_name, method=method, status=status_code
+                    ),
+                    count,
+                )
+            )
+
+    for name, description, attribute in (
+        (
+            "hiccup_http_request_sql_queries_total",
+            "Number of SQL queries run while handling HTTP requests.",
+            "sql_queries",
+        ),
+        (
+            "hiccup_http_request_sql_duration_seconds_total",
+            "Time spent in SQL queries while handling HTTP requests.",
+            "sql_duration",
+        ),
+    ):
+        lines += [
+            "# HELP {} {}".format(name, description),
+            "# TYPE {} counter".format(name),
+        ]
+        for (url_name, method), endpoint_metrics in metrics:
+            lines.append(
+                "{}{} {}".format(
+                    name,
+                    _labels(url_name=url_name, method=method),
+                    _format_value(getattr(endpoint_metrics, attribute)),
+                )
+            )
+    return "\n".join(lines) + "\n"
+
+
+def render_gauge(name, description, value):
+    """Render a single gauge in the Prometheus text exposition format.
+
+    Args:
+        name: The name of the metric.
+        description: The help text of the metric.
+        value: The current value of the gauge.
+
+    Returns: The metric as text.
+
+    """
+    return "# HELP {0} {1}\n# TYPE {0} gauge\n{0} {2}\n".format(
+        name, description, _format_value(value)
+    )
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """Middleware recording the metrics of each request.
+
+    The middleware should be the first one so that the time spent in all
+    other middlewares is included. The latency of streaming responses only
+    covers the time until the response has been created.
+    """
+
+    def process_request(self, request):
+        """Start measuring a request."""
+        # pylint: disable=no-self-use
+        for connection in connections.all():
+            _instrument_connection(connection)
+        _QUERIES.current = [0, 0.0]
+        request.hiccup_metrics_start = time.perf_counter()
+
+    def process_response(self, request, response):
+        """Record the metrics of a request."""
+        # pylint: disable=no-self-use
+        start = getattr(request, "hiccup_metrics_start", None)
+        if start is None:
+            return response
+        duration = time.perf_counter() - start
+        queries, _QUERIES.current = _QUERIES.current, None
+        resolver_match = getattr(request, "resolver_match", None)
+        REGISTRY.observe(
+            resolver_match.view_name if resolver_match else UNRESOLVED_URL_NAME,
+            request.method if request.method in HTTP_METHODS else "OTHER",
+            response.status_code,
+            duration,
+            queries or (0, 0.0),
+        )
+        return response
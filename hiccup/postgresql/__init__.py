@@ -0,0 +1 @@
+"""PostgreSQL database backend supporting partitioned tables."""
@@ -0,0 +1,43 @@
+"""PostgreSQL database backend supporting partitioned tables.
+
+The introspection of the PostgreSQL backend of Django only lists plain tables
+and views. Partitioned tables, such as the heartbeat and crash report tables,
+see `crashreports.partitioning`, would therefore be ignored when flushing the
+database or checking which tables exist. This backend lists partitioned
+tables instead of their partitions.
+"""
+from django.db.backends.base.introspection import TableInfo
+from django.db.backends.postgresql import base, introspection
+
+
+class DatabaseIntrospection(introspection.DatabaseIntrospection):
+    """Introspection listing partitioned tables but not their partitions."""
+
+    def get_table_list(self, cursor):
+        """Get the names of the tables and views in the current database."""
+        cursor.execute(
+            """
+            SELECT c.relname, c.relkind
+            FROM pg_catalog.pg_class c
+            LEFT JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+            WHERE c.relkind IN ('r', 'v', 'p')
+                AND {}
+                AND n.nspname NOT IN ('pg_catalog', 'pg_toast')
+                AND pg_catalog.pg_table_is_visible(c.oid)
+            """.format(
+                "NOT c.relispartition"
+                if self.connection.pg_version >= 100000
+                else "TRUE"
+            )
+        )
+        return [
+            TableInfo(name, "v" if kind == "v" else "t")
+            for name, kind in cursor.fetchall()
+            if name not in self.ignored_tables
+        ]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Database wrapper using the partition-aware introspection."""
+
+    introspection_class = DatabaseIntrospection
@@ -58,6 +58,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE_CLASSES = [
+    "hiccup.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -103,7 +104,7 @@ AUTHENTICATION_BACKENDS = (
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql_psycopg2",
+        "ENGINE": "hiccup.postgresql",
         "HOST": "",  # Connect to database through UNIX domain sockets
         "PORT": "",  # Not needed for UNIX domain sockets
         "NAME": os.environ.get("USER"),
@@ -148,7 +149,7 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework.authentication.BasicAuthentication",
         "rest_framework.authentication.SessionAuthentication",
-        "rest_framework.authentication.TokenAuthentication",
+        "crashreports.authentication.CachedTokenAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
@@ -162,6 +163,64 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 100,
 }
 
+# Cache for the details of device tokens, see crashreports.authentication.
+# By default, an in-process LRU cache is used whose entries expire after
+# HICCUP_AUTH_CACHE_TIMEOUT seconds. Set HICCUP_AUTH_CACHE_ALIAS to the alias
+# of a cache defined in CACHES to share the cached details between processes.
+HICCUP_AUTH_CACHE_ALIAS = None
+HICCUP_AUTH_CACHE_MAX_SIZE = 10000
+HICCUP_AUTH_CACHE_TIMEOUT = 60
+
+# Asynchronous ingestion of heartbeats, see crashreports.spool. If set to a
+# directory, incoming heartbeats are appended to spool files in that directory
+# and answered with 202 Accepted. The drain_spool management command stores
+# them in the database. Crash reports are always stored synchronously. Disable
+# HICCUP_INGESTION_SPOOL_FSYNC to trade durability for lower latency.
+HICCUP_INGESTION_SPOOL_DIR = None
+HICCUP_INGESTION_SPOOL_FSYNC = True
+
+# Real-time stats, see crashreport_stats.realtime. If enabled, the stats of
+# created reports are accumulated by each process and added to the stats
+# models every HICCUP_STATS_REALTIME_FLUSH_INTERVAL seconds instead of by the
+# stats update management command. Run "stats reset" after enabling it.
+HICCUP_STATS_REALTIME = False
+HICCUP_STATS_REALTIME_FLUSH_INTERVAL = 10
+
+# Request metrics, see hiccup.metrics. The metrics are collected per process.
+# Set HICCUP_METRICS_DIR to a directory shared by all worker processes to
+# expose the sum of the metrics of all processes. Each process dumps its
+# metrics to that directory every HICCUP_METRICS_DUMP_INTERVAL seconds.
+HICCUP_METRICS_DIR = None
+HICCUP_METRICS_DUMP_INTERVAL = 10
+
+# Archival of old reports, see crashreports.archive. The archive_reports
+# management command moves the reports of months that ended more than
+# HICCUP_REPORTS_RETENTION_DAYS ago to HICCUP_REPORTS_ARCHIVE_DIR.
+HICCUP_REPORTS_ARCHIVE_DIR = None
+HICCUP_REPORTS_RETENTION_DAYS = 365
+
+# Limits of uploaded log files, see crashreports.uploads. Uploads are
+# streamed to disk and rejected once they exceed HICCUP_LOGFILE_MAX_SIZE
+# bytes. Zip archives declaring more than HICCUP_LOGFILE_MAX_UNCOMPRESSED_SIZE
+# bytes of content are rejected as well.
+HICCUP_LOGFILE_MAX_SIZE = 16 * 2 ** 20
+HICCUP_LOGFILE_MAX_UNCOMPRESSED_SIZE = 256 * 2 ** 20
+
+# Raw log file downloads, see crashreport_stats.logfiles.file_response. Set
+# HICCUP_LOGFILE_SENDFILE_HEADER to "X-Accel-Redirect" (nginx) or "X-Sendfile"
+# (Apache, lighttpd) to let the front-end web server send the files. For
+# nginx, HICCUP_LOGFILE_SENDFILE_PREFIX is the URL of an internal location
+# serving MEDIA_ROOT.
+HICCUP_LOGFILE_SENDFILE_HEADER = None
+HICCUP_LOGFILE_SENDFILE_PREFIX = "/protected-logfiles/"
+
+# Full-text search over log files, see crashreports.logfile_search. Log files
+# are indexed by the index_logfiles management command, which has to be run
+# regularly. Setting HICCUP_LOGFILE_SEARCH_INDEX_ON_UPLOAD indexes uploaded
+# log files right away instead, at the cost of decompressing them within the
+# upload requests.
+HICCUP_LOGFILE_SEARCH_INDEX_ON_UPLOAD = False
+
 SITE_ID = 1
 
 SOCIALACCOUNT_ADAPTER = "hiccup.allauth_adapters.FairphoneAccountAdapter"
@@ -0,0 +1,149 @@
+"""Tests for the metrics module."""
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from crashreport_stats.tests.utils import Dummy, HiccupStatsAPITestCase
+from hiccup import metrics
+
+
+class MetricsRegistryTestCase(SimpleTestCase):
+    """Test the aggregation and rendering of the metrics."""
+
+    def test_render_histogram(self):
+        """Test that latencies are counted in cumulative buckets."""
+        registry = metrics.MetricsRegistry()
+        registry.observe("api_v1_heartbeats", "POST", 201, 0.003, (2, 0.001))
+        registry.observe("api_v1_heartbeats", "POST", 400, 0.2, (1, 0.5))
+
+        text = metrics.render(registry.collect())
+
+        labels = 'url_name="api_v1_heartbeats",method="POST"'
+        self.assertIn(
+            "hiccup_http_request_duration_seconds_bucket{%s,le=\"0.005\"} 1"
+            % labels,
+            text,
+        )
+        self.assertIn(
+            "hiccup_http_request_duration_seconds_bucket{%s,le=\"0.25\"} 2"
+            % labels,
+            text,
+        )
+        self.assertIn(
+            "hiccup_http_request_duration_seconds_bucket{%s,le=\"+Inf\"} 2"
+            % labels,
+            text,
+        )
+        self.assertIn(
+            "hiccup_http_request_duration_seconds_count{%s} 2" % labels, text
+        )
+        self.assertIn(
+            "hiccup_http_request_sql_queries_total{%s} 3" % labels, text
+        )
+        self.assertIn(
+            "hiccup_http_request_sql_duration_seconds_total{%s} 0.501"
+            % labels,
+            text,
+        )
+        self.assertIn(
+            'hiccup_http_responses_total{%s,status="400"} 1' % labels, text
+        )
+
+    def test_escape_label_values(self):
+        """Test that quotes in label values are escaped."""
+        registry = metrics.MetricsRegistry()
+        registry.observe('a"b', "GET", 200, 0.1, (0, 0.0))
+
+        self.assertIn(
+            'url_name="a\\"b"', metrics.render(registry.collect())
+        )
+
+    def test_collect_from_metrics_dir(self):
+        """Test that the metrics dumped by other processes are summed up."""
+        # pylint: disable=protected-access
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir)
+        with override_settings(HICCUP_METRICS_DIR=metrics_dir):
+            other_process = metrics.MetricsRegistry()
+            other_process.observe("device", "GET", 200, 0.1, (4, 0.2))
+            other_process.dump()
+            os.rename(
+                other_process._get_dump_path(),
+                os.path.join(
+                    metrics_dir, "other" + metrics.METRICS_FILE_EXTENSION
+                ),
+            )
+            registry = metrics.MetricsRegistry()
+            registry.observe("device", "GET", 500, 0.1, (1, 0.1))
+
+            collected = registry.collect()
+
+        device_metrics = collected[("device", "GET")]
+        self.assertEqual(device_metrics.count, 2)
+        self.assertEqual(device_metrics.sql_queries, 5)
+        self.assertEqual(device_metrics.responses, {"200": 1, "500": 1})
+
+
+class MetricsEndpointTestCase(HiccupStatsAPITestCase):
+    """Test the metrics endpoint and middleware."""
+
+    metrics_url = reverse("hiccup_stats_api_v1_metrics")
+
+    def setUp(self):
+        """Reset the metrics of the current process."""
+        metrics.REGISTRY.reset()
+
+    def test_metrics_url_as_fp_staff(self):
+        """Test that Fairphone staff users can access the metrics URL."""
+        self._assert_get_as_fp_staff_succeeds(self.metrics_url)
+
+    def test_metrics_url_as_device_owner(self):
+        """Test that device owner users can not access the metrics URL."""
+        self._assert_get_as_device_owner_fails(self.metrics_url)
+
+    def test_metrics_url_no_auth(self):
+        """Test that non-authenticated users can not access the metrics."""
+        self._assert_get_without_authentication_fails(self.metrics_url)
+
+    def test_requests_are_recorded(self):
+        """Test that the latency and SQL queries of requests are recorded."""
+        self.fp_staff_client.get(reverse("hiccup_stats_api_v1_status"))
+
+        response = self.fp_staff_client.get(self.metrics_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        recorded = metrics.REGISTRY.collect()
+        status_metrics = recorded[("hiccup_stats_api_v1_status", "GET")]
+        self.assertEqual(status_metrics.count, 1)
+        # The status endpoint counts the devices, crash reports and heartbeats
+        self.assertGreaterEqual(status_metrics.sql_queries, 3)
+        self.assertGreater(status_metrics.sql_duration, 0)
+        self.assertIn(
+            'hiccup_http_request_duration_seconds_count{url_name="'
+            'hiccup_stats_api_v1_status",method="GET"} 1',
+            response.content.decode(),
+        )
+
+    def test_stats_lag(self):
+        """Test that the time since the last stats update is exposed."""
+        Dummy.create_stats_metadata()
+
+        response = self.fp_staff_client.get(self.metrics_url)
+
+        self.assertIn("hiccup_stats_lag_seconds ", response.content.decode())
+
+    def test_unresolved_requests_are_recorded(self):
+        """Test that requests to unknown URLs are recorded together."""
+        self.client.get("/does/not/exist/")
+        self.client.get("/does/not/exist/either/")
+
+        recorded = metrics.REGISTRY.collect()
+        self.assertEqual(
+            recorded[(metrics.UNRESOLVED_URL_NAME, "GET")].responses,
+            {"404": 2},
+        )
@@ -1,54 +1,510 @@
-import json, requests
-from multiprocessing import Pool
-
-clients = []
-
-
-BASE_URL = "http://127.0.0.1:8000/hiccup/"
-
-
-def create_client():
-    ret_client = {}
-    register_url = "api/v1/devices/register/"
-    params = {"board_date": "2017-01-01", "chipset": "HICCUPBENCH"}
-    resp = requests.post(BASE_URL + register_url, params)
-    data = json.loads(resp.text)
-    ret_client["token"] = data["token"]
-    ret_client["uuid"] = data["uuid"]
-    return ret_client
-
-
-def send_heartbeat(client):
-    heartbeat_url = "api/v1/heartbeats/"
-    params = {
-        "uuid": client["uuid"],
-        "build_fingerprint": "HICCUPBENCH",
-        "uptime": "string",
-        "date": "1984-06-02T19:05:00.000Z",
-        "app_version": 2000000,
-    }
-    resp = requests.post(
-        BASE_URL + heartbeat_url,
-        params,
-        headers={"Authorization": "Token " + client["token"]},
-    )
-    return resp
+#!/usr/bin/env python
+"""Benchmark the Hiccup ingestion endpoints with a realistic load.
+
+A population of devices is registered first. Each device then sends a mix of
+heartbeats, duplicate heartbeats, heartbeats with legacy datetime values,
+crash reports and log file uploads, as real devices do. The first requests
+are sent as warm-up and are not measured.
 
+The benchmark reports the latency percentiles, the throughput and, when run
+in-process, the number of SQL queries per request for each kind of request.
+The results are written as JSON so that they can be compared across builds.
 
+By default, requests are handled in-process by the Django WSGI handler,
+against the database configured in the Django settings. The registered
+devices are deleted afterwards. With `--url`, requests are sent to a running
+server instead:
+
+    (hiccupenv) $ python tools/bench.py --devices 50 --requests 5000
+    (hiccupenv) $ python tools/bench.py --url http://127.0.0.1:8000/hiccup/
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import random
+import sys
+import threading
 import time
+import zipfile
+from collections import defaultdict
+
+BUILD_FINGERPRINTS = [
+    "Fairphone/FP2/FP2:7.1.2/18.07.2/gms-7480c31d:user/release-keys",
+    "Fairphone/FP2/FP2:7.1.2/19.02.1/gms-5e3b2ab3:user/release-keys",
+    "Fairphone/FP2/FP2:7.1.2/19.04.1/gms-b3e3fd44:user/release-keys",
+]
+RADIO_VERSIONS = ["4437.1-FP2-0-07", "4437.1-FP2-0-08"]
+BOOT_REASONS = ["UNKNOWN", "keyboard power on", "RTC alarm", "reboot"]
+
+DEFAULT_MIX = {
+    "heartbeat": 60,
+    "duplicate_heartbeat": 10,
+    "legacy_heartbeat": 10,
+    "crashreport": 15,
+    "logfile": 5,
+}
+
+FIRST_HEARTBEAT_DATE = datetime.date(2018, 1, 1)
+
+
+class _InProcessTransport:
+    """Transport handling requests with the Django WSGI handler."""
+
+    prefix = "/hiccup/"
+    counts_queries = True
+
+    def __init__(self):
+        """Set up Django."""
+        sys.path.insert(
+            0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        )
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "hiccup.settings")
+        # pylint: disable=import-outside-toplevel
+        import django
+
+        django.setup()
+        from django.db import connection
+        from django.test import Client
+        from django.test.utils import CaptureQueriesContext
+
+        self._connection = connection
+        self._capture_queries = CaptureQueriesContext
+        self._local = threading.local()
+        self._client_class = Client
+
+    def request(self, path, data=None, token=None, body=None, headers=None):
+        """Send a POST request.
+
+        Returns:
+            The status code, the response data and the number of queries.
+
+        """
+        if not hasattr(self._local, "client"):
+            self._local.client = self._client_class()
+        extra = {}
+        if token:
+            extra["HTTP_AUTHORIZATION"] = "Token " + token
+        for name, value in (headers or {}).items():
+            extra["HTTP_" + name.upper().replace("-", "_")] = value
+        with self._capture_queries(self._connection) as queries:
+            if body is not None:
+                response = self._local.client.post(
+                    self.prefix + path,
+                    body,
+                    content_type="application/octet-stream",
+                    **extra
+                )
+            else:
+                response = self._local.client.post(
+                    self.prefix + path, data, **extra
+                )
+        return (
+            response.status_code,
+            _decode(response.content),
+            len(queries.captured_queries),
+        )
+
+    def close(self):
+        """Close the database connection of the current thread."""
+        self._connection.close()
+
+    def delete_devices(self, uuids):
+        """Delete the users of the given devices and thereby the devices."""
+        # pylint: disable=import-outside-toplevel
+        from django.contrib.auth.models import User
+
+        User.objects.filter(Hiccup_Device__uuid__in=uuids).delete()
+
+
+class _HttpTransport:
+    """Transport sending requests to a running server."""
+
+    counts_queries = False
+
+    def __init__(self, url):
+        """Initialise the transport for the given base URL."""
+        # pylint: disable=import-outside-toplevel
+        import requests
+
+        self.prefix = url if url.endswith("/") else url + "/"
+        self._session_class = requests.Session
+        self._local = threading.local()
+
+    def request(self, path, data=None, token=None, body=None, headers=None):
+        """Send a POST request.
+
+        Returns:
+            The status code, the response data and None as the number of
+            queries is unknown.
+
+        """
+        if not hasattr(self._local, "session"):
+            self._local.session = self._session_class()
+        headers = dict(headers or {})
+        if token:
+            headers["Authorization"] = "Token " + token
+        response = self._local.session.post(
+            self.prefix + path,
+            data=body if body is not None else data,
+            headers=headers,
+        )
+        return response.status_code, _decode(response.content), None
+
+    def close(self):
+        """Close the session of the current thread."""
+        if hasattr(self._local, "session"):
+            self._local.session.close()
+
+    @staticmethod
+    def delete_devices(uuids):
+        """Keep the devices, they can not be deleted through the API."""
+        # pylint: disable=unused-argument
+
+
+def _decode(content):
+    try:
+        return json.loads(content.decode())
+    except ValueError:
+        return None
+
+
+class _Device:
+    """State of a simulated device."""
 
+    def __init__(self, uuid, token, rng):
+        """Initialise the state of a registered device."""
+        self.uuid = uuid
+        self.token = token
+        self.rng = rng
+        self.build_fingerprint = rng.choice(BUILD_FINGERPRINTS)
+        self.radio_version = rng.choice(RADIO_VERSIONS)
+        self.next_heartbeat_date = FIRST_HEARTBEAT_DATE
+        self.sent_heartbeat_dates = []
+        self.crashreport_ids = []
+        self.next_crashreport_time = datetime.datetime(
+            2018, 1, 1, tzinfo=datetime.timezone.utc
+        )
+
+    def heartbeat_data(self, date):
+        """Get the data of a heartbeat for the given date value."""
+        return {
+            "uuid": self.uuid,
+            "app_version": 10100,
+            "uptime": "up time: 16 days, 21:49:56, idle time: 5 days",
+            "build_fingerprint": self.build_fingerprint,
+            "radio_version": self.radio_version,
+            "date": date,
+        }
+
+    def new_heartbeat_date(self):
+        """Get the date of the next new heartbeat."""
+        date = self.next_heartbeat_date
+        self.next_heartbeat_date += datetime.timedelta(days=1)
+        self.sent_heartbeat_dates.append(date)
+        return date
+
+    def crashreport_data(self):
+        """Get the data of a new crash report."""
+        self.next_crashreport_time += datetime.timedelta(
+            minutes=self.rng.randint(1, 600)
+        )
+        return {
+            "uuid": self.uuid,
+            "is_fake_report": False,
+            "boot_reason": self.rng.choice(BOOT_REASONS),
+            "power_on_reason": "it was powered on",
+            "power_off_reason": "something happened and it went off",
+            "date": self.next_crashreport_time.isoformat(),
+            "app_version": 10100,
+            "uptime": "up time: 2 days, 12:39:13",
+            "build_fingerprint": self.build_fingerprint,
+            "radio_version": self.radio_version,
+        }
+
+
+class _Benchmark:
+    """Benchmark sending a mix of requests from a population of devices."""
+
+    def __init__(self, transport, args):
+        """Initialise the benchmark."""
+        self.transport = transport
+        self.args = args
+        self.kinds = list(args.mix)
+        self.weights = [args.mix[kind] for kind in self.kinds]
+        self.logfile = _create_logfile(args.logfile_size)
+        self.results = defaultdict(
+            lambda: {"latencies": [], "queries": [], "status_codes": {}}
+        )
+        self.lock = threading.Lock()
+
+    def register_devices(self):
+        """Register the device population."""
+        rng = random.Random(self.args.seed)
+        devices = []
+        for _ in range(self.args.devices):
+            status_code, data, _ = self.transport.request(
+                "api/v1/devices/register/",
+                {"board_date": "2017-01-01", "chipset": "HICCUPBENCH"},
+            )
+            if status_code != 200:
+                raise RuntimeError(
+                    "Could not register a device: {}".format(status_code)
+                )
+            devices.append(
+                _Device(
+                    data["uuid"],
+                    data["token"],
+                    random.Random(rng.getrandbits(64)),
+                )
+            )
+        return devices
+
+    def _send(self, kind, device, measure):
+        """Send a request of the given kind from the given device."""
+        if kind == "duplicate_heartbeat" and not device.sent_heartbeat_dates:
+            kind = "heartbeat"
+        if kind == "logfile" and not device.crashreport_ids:
+            kind = "crashreport"
+
+        body = headers = data = None
+        if kind == "heartbeat":
+            path = "api/v1/heartbeats/"
+            data = device.heartbeat_data(device.new_heartbeat_date())
+        elif kind == "duplicate_heartbeat":
+            path = "api/v1/heartbeats/"
+            data = device.heartbeat_data(
+                device.rng.choice(device.sent_heartbeat_dates)
+            )
+        elif kind == "legacy_heartbeat":
+            path = "api/v1/heartbeats/"
+            data = device.heartbeat_data(
+                "{}T12:00:00.000Z".format(device.new_heartbeat_date())
+            )
+        elif kind == "crashreport":
+            path = "api/v1/crashreports/"
+            data = device.crashreport_data()
+        else:
+            path = "api/v1/devices/{}/crashreports/{}/logfile_put/{}/".format(
+                device.uuid,
+                device.rng.choice(device.crashreport_ids),
+                "bench.zip",
+            )
+            body = self.logfile
+            headers = {"Content-Disposition": "attachment; filename=bench.zip"}
+
+        start_time = time.perf_counter()
+        status_code, response_data, queries = self.transport.request(
+            path, data=data, token=device.token, body=body, headers=headers
+        )
+        latency = time.perf_counter() - start_time
+
+        if (
+            kind == "crashreport"
+            and isinstance(response_data, dict)
+            and "device_local_id" in response_data
+        ):
+            device.crashreport_ids.append(response_data["device_local_id"])
+        if measure:
+            with self.lock:
+                result = self.results[kind]
+                result["latencies"].append(latency)
+                if queries is not None:
+                    result["queries"].append(queries)
+                result["status_codes"][status_code] = (
+                    result["status_codes"].get(status_code, 0) + 1
+                )
+
+    def _run_worker(self, worker, devices, warmup, requests, barrier):
+        rng = random.Random("{}-{}".format(self.args.seed, worker))
+        try:
+            for i in range(warmup):
+                kind = rng.choices(self.kinds, self.weights)[0]
+                self._send(kind, devices[i % len(devices)], measure=False)
+            barrier.wait()
+            for i in range(requests):
+                kind = rng.choices(self.kinds, self.weights)[0]
+                self._send(kind, devices[i % len(devices)], measure=True)
+        finally:
+            self.transport.close()
+
+    def run(self, devices):
+        """Send the warm-up and measured requests.
+
+        Returns: The duration of the measured part in seconds.
+
+        """
+        concurrency = min(self.args.concurrency, len(devices))
+        barrier = threading.Barrier(concurrency + 1)
+        threads = []
+        for worker in range(concurrency):
+            requests = self.args.requests // concurrency
+            if worker < self.args.requests % concurrency:
+                requests += 1
+            warmup = self.args.warmup // concurrency
+            threads.append(
+                threading.Thread(
+                    target=self._run_worker,
+                    args=(
+                        worker,
+                        devices[worker::concurrency],
+                        warmup,
+                        requests,
+                        barrier,
+                    ),
+                )
+            )
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start_time
+
+    def report(self, duration):
+        """Summarise the results of the measured requests."""
+        endpoints = {}
+        for kind, result in sorted(self.results.items()):
+            latencies = sorted(result["latencies"])
+            endpoints[kind] = {
+                "requests": len(latencies),
+                "throughput_rps": len(latencies) / duration,
+                "status_codes": {
+                    str(code): count
+                    for code, count in sorted(result["status_codes"].items())
+                },
+                "latency_ms": {
+                    "mean": 1000 * sum(latencies) / len(latencies),
+                    "p50": 1000 * _percentile(latencies, 50),
+                    "p95": 1000 * _percentile(latencies, 95),
+                    "p99": 1000 * _percentile(latencies, 99),
+                    "max": 1000 * latencies[-1],
+                },
+                "sql_queries_per_request": {
+                    "mean": sum(result["queries"]) / len(result["queries"]),
+                    "max": max(result["queries"]),
+                }
+                if result["queries"]
+                else None,
+            }
+        total = sum(endpoint["requests"] for endpoint in endpoints.values())
+        return {
+            "config": {
+                "transport": "http" if self.args.url else "in-process",
+                "url": self.args.url,
+                "devices": self.args.devices,
+                "requests": self.args.requests,
+                "warmup": self.args.warmup,
+                "concurrency": self.args.concurrency,
+                "mix": self.args.mix,
+                "logfile_size": self.args.logfile_size,
+                "seed": self.args.seed,
+            },
+            "duration_s": duration,
+            "requests": total,
+            "throughput_rps": total / duration,
+            "endpoints": endpoints,
+        }
+
+
+def _percentile(sorted_values, percentile):
+    """Get a percentile of sorted values using the nearest-rank method."""
+    rank = max(1, -(-percentile * len(sorted_values) // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def _create_logfile(size):
+    """Create a zipped log file with roughly the given uncompressed size."""
+    rng = random.Random(0)
+    lines = []
+    length = 0
+    while length < size:
+        line = "01-01 12:00:00.000 {:5d} {:5d} I bench: {:08x}\n".format(
+            rng.randint(1, 32767), rng.randint(1, 32767), rng.getrandbits(32)
+        )
+        lines.append(line)
+        length += len(line)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("logcat.txt", "".join(lines))
+    return buffer.getvalue()
+
+
+def _parse_mix(value):
+    """Parse a request mix like `heartbeat=60,crashreport=40`."""
+    mix = {}
+    for item in value.split(","):
+        kind, _, weight = item.partition("=")
+        if kind not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(
+                "Unknown request kind: {}".format(kind)
+            )
+        mix[kind] = float(weight)
+    return mix
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--url",
+        help="Base URL of a running server, e.g. http://127.0.0.1:8000/hiccup/."
+        " Requests are handled in-process if omitted.",
+    )
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument(
+        "--requests", type=int, default=1000, help="Number of measured requests"
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=100, help="Number of warm-up requests"
+    )
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--mix",
+        type=_parse_mix,
+        default=DEFAULT_MIX,
+        help="Relative weights of the request kinds, e.g. {}".format(
+            ",".join("{}={}".format(*item) for item in DEFAULT_MIX.items())
+        ),
+    )
+    parser.add_argument(
+        "--logfile-size",
+        type=int,
+        default=64 * 1024,
+        help="Uncompressed size of uploaded log files in bytes",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--keep-devices",
+        action="store_true",
+        help="Do not delete the registered devices when run in-process",
+    )
+    parser.add_argument(
+        "--output", help="File to write the JSON results to instead of stdout"
+    )
+    args = parser.parse_args()
 
-def bench(client):
-    start_time = time.time()
-    for i in range(50):
-        send_heartbeat(client)
-    end_time = time.time()
-    print(end_time - start_time)
+    if args.url:
+        transport = _HttpTransport(args.url)
+    else:
+        transport = _InProcessTransport()
+    benchmark = _Benchmark(transport, args)
+    devices = benchmark.register_devices()
+    try:
+        duration = benchmark.run(devices)
+    finally:
+        if not args.keep_devices:
+            transport.delete_devices([device.uuid for device in devices])
 
+    results = json.dumps(benchmark.report(duration), indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(results + "\n")
+    else:
+        print(results)
 
-clients = []
-for i in range(20):
-    clients = clients + [create_client()]
 
-with Pool(20) as p:
-    p.map(bench, clients)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""Benchmark the heartbeat fast path against the heartbeat serializer.
+
+Both paths validate the data of a single heartbeat, as it is sent by devices,
+and represent the resulting heartbeat for the response. Creating the
+heartbeat in the database is not part of the benchmark as it is the same for
+both paths, so no database is needed. The benchmark reports the number of
+handled heartbeats per second and per path.
+
+    (hiccupenv) $ python tools/bench_heartbeat_parser.py --iterations 20000
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "hiccup.settings")
+django.setup()
+
+# pylint: disable=wrong-import-position
+from django.contrib.auth.models import User  # noqa: E402
+from django.http import QueryDict  # noqa: E402
+
+from crashreports.models import HeartBeat  # noqa: E402
+from crashreports.permissions import cache_authorization_details  # noqa: E402
+from crashreports.serializers import (  # noqa: E402
+    HEARTBEAT_FAST_PATH,
+    HeartBeatSerializer,
+)
+
+
+_CREATED_AT = datetime.datetime(2018, 3, 19, 12, tzinfo=datetime.timezone.utc)
+
+
+class _Request:
+    """Minimal stand-in for a request of a device owner."""
+
+    def __init__(self):
+        self.user = User(id=1, username="device_bench")
+        cache_authorization_details(self.user, False, None)
+
+
+def _heartbeat(validated_data):
+    data = dict(validated_data)
+    data.pop("uuid")
+    return HeartBeat(id=1, device_local_id=1, created_at=_CREATED_AT, **data)
+
+
+def _serializer_path(data, context):
+    serializer = HeartBeatSerializer(data=data, context=context)
+    serializer.is_valid(raise_exception=True)
+    return HeartBeatSerializer(
+        _heartbeat(serializer.validated_data), context=context
+    ).data
+
+
+def _fast_path(data, context):
+    validated_data = HEARTBEAT_FAST_PATH.validate(data)
+    return HEARTBEAT_FAST_PATH.to_representation(
+        _heartbeat(validated_data), context
+    )
+
+
+def _measure(function, data, context, iterations):
+    for _ in range(min(iterations, 100)):
+        function(data, context)
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        function(data, context)
+    return iterations / (time.perf_counter() - start_time)
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--iterations", type=int, default=10000)
+    parser.add_argument(
+        "--legacy-datetime",
+        action="store_true",
+        help="Send the date as datetime value like legacy clients do",
+    )
+    args = parser.parse_args()
+
+    date = datetime.date(2018, 3, 19).isoformat()
+    if args.legacy_datetime:
+        date = "2018-03-19T12:00:00Z"
+    data = QueryDict(mutable=True)
+    data.update(
+        {
+            "uuid": "e1c0cc95-ab8d-461a-a768-cb8d9d7fdb04",
+            "app_version": "10100",
+            "uptime": "up time: 16 days, 21:49:56",
+            "build_fingerprint": "Fairphone/FP2/FP2:7.1.2/18.07.2/gms-7480c31d"
+            ":user/release-keys",
+            "radio_version": "4437.1-FP2-0-07",
+            "date": date,
+        }
+    )
+    context = {"request": _Request()}
+
+    if _serializer_path(data, context) != _fast_path(data, context):
+        print("ERROR: the representations of both paths differ")
+        sys.exit(1)
+
+    serializer_rate = _measure(
+        _serializer_path, data, context, args.iterations
+    )
+    fast_path_rate = _measure(_fast_path, data, context, args.iterations)
+    print("iterations:  {}".format(args.iterations))
+    print("serializer:  {:.0f} heartbeats/s".format(serializer_rate))
+    print("fast path:   {:.0f} heartbeats/s".format(fast_path_rate))
+    print("speedup:     {:.2f}x".format(fast_path_rate / serializer_rate))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""Benchmark the allocation of local IDs under contention.
+
+Many threads reserve heartbeat keys of a single device at the same time. The
+benchmark reports the throughput of the reservations and validates that no key
+has been handed out twice.
+
+The benchmark runs against the database configured in the Django settings. A
+temporary device is created and deleted afterwards.
+
+    (hiccupenv) $ python tools/bench_local_ids.py --threads 32 --iterations 200
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "hiccup.settings")
+django.setup()
+
+# pylint: disable=wrong-import-position
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+
+from crashreports.models import Device  # noqa: E402
+
+
+def _hammer(device_id, iterations, block_size, keys, barrier):
+    device = Device.objects.get(id=device_id)
+    reserved = []
+    barrier.wait()
+    for _ in range(iterations):
+        reserved.extend(device.get_heartbeat_keys(block_size))
+    keys.extend(reserved)
+    connection.close()
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument(
+        "--block-size",
+        type=int,
+        default=1,
+        help="Number of keys reserved at once",
+    )
+    args = parser.parse_args()
+
+    user = User.objects.create_user("device_bench_local_ids_%d" % os.getpid())
+    device = Device.objects.create(user=user)
+    try:
+        keys = []
+        barrier = threading.Barrier(args.threads + 1)
+        threads = [
+            threading.Thread(
+                target=_hammer,
+                args=(
+                    device.id,
+                    args.iterations,
+                    args.block_size,
+                    keys,
+                    barrier,
+                ),
+            )
+            for _ in range(args.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - start_time
+    finally:
+        user.delete()
+
+    reservations = args.threads * args.iterations
+    print("threads:      {}".format(args.threads))
+    print("reservations: {}".format(reservations))
+    print("keys:         {}".format(len(keys)))
+    print("duration:     {:.3f}s".format(duration))
+    print("throughput:   {:.0f} reservations/s".format(reservations / duration))
+    if len(set(keys)) != len(keys):
+        print("ERROR: duplicate keys have been handed out")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()